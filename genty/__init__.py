@@ -7,3 +7,12 @@
 from .genty_dataset import genty_dataprovider
 from .genty_repeat import genty_repeat
 from .genty_args import genty_args
+from .genty_benchmark import genty_benchmark
+from .genty_budget import genty_budget
+from .genty_cache import genty_cached
+from .genty_lazy import genty_lazy
+from .genty_load import genty_load
+from .genty_resource import genty_resource
+from .genty_shared import genty_shared
+from .genty_suite import genty_isolated, genty_threadsafe
+from .genty_tags import genty_tags
@@ -0,0 +1,18 @@
+# coding: utf-8
+
+"""
+Run tests like 'python -m unittest' does, but load them with
+:class:`genty.genty_loader.GentyTestLoader`:
+    python -m genty discover -s test
+"""
+
+from __future__ import absolute_import, unicode_literals
+import sys
+import unittest
+
+from genty.genty_loader import GentyTestLoader
+
+
+if __name__ == '__main__':
+    sys.argv[0] = 'python -m genty'
+    unittest.main(module=None, testLoader=GentyTestLoader())
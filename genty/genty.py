@@ -5,6 +5,7 @@
 import functools
 from itertools import chain
 import math
+import os
 import re
 import sys
 import types
@@ -12,7 +13,24 @@
 import six
 
 from .genty_args import GentyArgs
-from .private import encode_non_ascii_string
+from .genty_benchmark import _build_benchmark_method
+from .genty_budget import _build_budget_method, _get_budget
+from .genty_dataset import GentyNestedDataset, _call_memoized, _get_duplicate_policy, _get_memo_key, _is_duplicate_dataset
+from .genty_instrument import _get_instrument_settings, _instrument_test_method
+from .genty_lazy import GentyLazy
+from .genty_load import _build_load_method
+from .genty_manifest import MANIFEST_ENV_VAR, _build_manifest_entry, _get_baseline, is_changed
+from .genty_repeat import (
+    _build_concurrent_repeat_method,
+    _build_leak_check_method,
+    _build_repeat_until_failure_method,
+)
+from .genty_report import record
+from .genty_resource import _build_resource_method
+from .genty_shared import GentyShared, _created as shared_values_created
+from .genty_suite import PREFETCHED_ATTRIBUTE
+from .genty_tags import _get_dataset_tags, _get_tag_filter
+from .private import GentyTestInfo, encode_non_ascii_string
 
 
 REPLACE_FOR_PERIOD_CHAR = '\xb7'
@@ -21,19 +39,56 @@
 def genty(target_cls):
     """
     This decorator takes the information provided by @genty_dataset,
-    @genty_dataprovider, and @genty_repeat and generates the corresponding
-    test methods.
+    @genty_dataprovider, @genty_repeat, @genty_benchmark, @genty_load and
+    @genty_budget and generates the corresponding test methods.
+
+    When the GENTY_TAGS environment variable is set, only the tests whose
+    tags match it are generated. See :func:`genty.genty_tags.genty_tags`.
+    The GENTY_DUPLICATES environment variable sets what to do about
+    identical datasets. See :func:`genty.genty_dataset.genty_dataset`.
+
+    Setting the GENTY_MANIFEST environment variable to a file path records
+    the hashes of the dataset and code of each generated test in that file
+    at exit. Setting GENTY_ONLY_CHANGED to the path of such a manifest,
+    e.g. from the main branch, only generates the tests that are new, or
+    whose dataset or code changed since.
+
+    The names of the test methods, in the order they were generated, are
+    kept in the 'genty_generated_tests' attribute of the class, so that
+    :class:`genty.genty_loader.GentyTestLoader` doesn't need to scan the
+    class for them.
 
     :param target_cls:
         Test class whose test methods have been decorated.
     :type target_cls:
         `class`
     """
-    tests = _expand_tests(target_cls)
-    tests_with_datasets = _expand_datasets(tests)
+    tests = list(_expand_tests(target_cls))
+    tests_with_datasets = _expand_datasets(tests, _get_tag_filter(), _get_duplicate_policy())
     tests_with_datasets_and_repeats = _expand_repeats(tests_with_datasets)
+    baseline = _get_baseline()
+    if baseline is not None or os.environ.get(MANIFEST_ENV_VAR):
+        tests_with_datasets_and_repeats = _filter_unchanged_tests(
+            target_cls,
+            tests_with_datasets_and_repeats,
+            baseline,
+        )
 
-    _add_new_test_methods(target_cls, tests_with_datasets_and_repeats)
+    test_names = _add_new_test_methods(
+        target_cls,
+        tests_with_datasets_and_repeats,
+        _get_instrument_settings(),
+    )
+
+    # Remove the original methods whose tests were all excluded by tags,
+    # or left out for being unchanged.
+    for name, _ in tests:
+        _delete_original_test_method(target_cls, name)
+
+    target_cls.genty_generated_tests = (
+        tuple(target_cls.__dict__.get('genty_generated_tests', ())) +
+        tuple(test_names)
+    )
 
     return target_cls
 
@@ -59,7 +114,7 @@ def _expand_tests(target_cls):
                 yield key, value
 
 
-def _expand_datasets(test_functions):
+def _expand_datasets(test_functions, tag_filter=None, duplicate_policy='keep'):
     """
     Generator producing test_methods, with an optional dataset.
 
@@ -67,6 +122,16 @@ def _expand_datasets(test_functions):
         Iterator over tuples of test name and test unbound function.
     :type test_functions:
         `iterator` of `tuple` of (`unicode`, `function`)
+    :param tag_filter:
+        Function taking the tags of a test, and returning whether to
+        generate it, or None to generate all the tests.
+    :type tag_filter:
+        `function` or None
+    :param duplicate_policy:
+        What to do about datasets of a method identical to an earlier one:
+        'keep', 'dedupe', 'warn' or 'error'.
+    :type duplicate_policy:
+        `unicode`
     :return:
         Generator yielding a tuple of
         - method_name      : Name of the test method
@@ -92,11 +157,21 @@ def _expand_datasets(test_functions):
 
         no_datasets = True
         for dataprovider, datasets in dataset_tuples:
+            dataset_names_by_hash = {}
             for dataset_name, dataset in six.iteritems(datasets):
                 no_datasets = False
-                yield name, func, dataset_name, dataset, dataprovider
-
-        if no_datasets:
+                if duplicate_policy != 'keep' and _is_duplicate_dataset(
+                        dataset_names_by_hash,
+                        name,
+                        dataset_name,
+                        dataset,
+                        duplicate_policy,
+                ):
+                    continue
+                if tag_filter is None or tag_filter(_get_dataset_tags(func, dataset)):
+                    yield name, func, dataset_name, dataset, dataprovider
+
+        if no_datasets and (tag_filter is None or tag_filter(_get_dataset_tags(func, None))):
             # yield the original test method, unaltered
             yield name, func, None, None, None
 
@@ -139,7 +214,46 @@ def _expand_repeats(test_functions):
             yield name, func, dataset_name, dataset, dataprovider, None
 
 
-def _add_new_test_methods(target_cls, tests_with_datasets_and_repeats):
+def _filter_unchanged_tests(target_cls, tests_with_datasets_and_repeats, baseline):
+    """
+    Generator recording the manifest entry of each test, and leaving out
+    the tests that didn't change since the baseline.
+
+    :param target_cls:
+        Test class where the tests will be defined.
+    :type target_cls:
+        `class`
+    :param tests_with_datasets_and_repeats:
+        Sequence of tuples describing the new tests.
+        (method_name, unbound function, dataset name, dataset,
+         dataprovider, repeat_suffix)
+    :type tests_with_datasets_and_repeats:
+        Sequence of `tuple` of  (`unicode`, `function`,
+        `unicode` or None, `tuple` or None, `function`, `unicode`)
+    :param baseline:
+        The manifest to compare the tests to, or None to keep them all.
+    :type baseline:
+        `dict` or None
+    :return:
+        Generator yielding the tuples describing the tests to add.
+    :rtype:
+        `generator` of `tuple`
+    """
+    for test_info in tests_with_datasets_and_repeats:
+        method_name, func, dataset_name, dataset, dataprovider, repeat_suffix = test_info
+        test_id = _build_test_id(target_cls, encode_non_ascii_string(_build_final_method_name(
+            method_name,
+            dataset_name,
+            dataprovider.__name__ if dataprovider else None,
+            repeat_suffix,
+        )))
+        entry = _build_manifest_entry(func, dataset, dataprovider)
+        record('manifest', test_id, entry)
+        if baseline is None or is_changed(baseline.get(test_id), entry):
+            yield test_info
+
+
+def _add_new_test_methods(target_cls, tests_with_datasets_and_repeats, instrument_settings=None):
     """Define the given tests in the given class.
 
     :param target_cls:
@@ -153,7 +267,16 @@ def _add_new_test_methods(target_cls, tests_with_datasets_and_repeats):
     :type tests_with_datasets_and_repeats:
         Sequence of `tuple` of  (`unicode`, `function`,
         `unicode` or None, `tuple` or None, `function`, `unicode`)
+    :param instrument_settings:
+        The instrumentation enabled for this run, or None if none is.
+    :type instrument_settings:
+        :class:`genty.genty_instrument._InstrumentSettings` or None
+    :return:
+        The names of the methods added to the class, in order.
+    :rtype:
+        `list` of `unicode`
     """
+    test_names = []
     for test_info in tests_with_datasets_and_repeats:
         (
             method_name,
@@ -163,6 +286,7 @@ def _add_new_test_methods(target_cls, tests_with_datasets_and_repeats):
             dataprovider,
             repeat_suffix,
         ) = test_info
+        memo_key = _get_memo_key(func, dataprovider, dataset_name)
 
         # Remove the original test_method as it's superseded by this
         # generated method.
@@ -179,7 +303,7 @@ def _add_new_test_methods(target_cls, tests_with_datasets_and_repeats):
             dataset_name = None
             repeat_suffix = None
 
-        _add_method_to_class(
+        test_names.append(_add_method_to_class(
             target_cls,
             method_name,
             func,
@@ -187,7 +311,11 @@ def _add_new_test_methods(target_cls, tests_with_datasets_and_repeats):
             dataset,
             dataprovider,
             repeat_suffix,
-        )
+            memo_key,
+            instrument_settings,
+        ))
+
+    return test_names
 
 
 def _is_referenced_in_argv(method_name):
@@ -335,6 +463,95 @@ def _build_final_method_name(
     return test_method_name_for_dataset
 
 
+def _build_test_id(target_cls, test_method_name):
+    """
+    Return a stable identifier for a generated test, made of the module and
+    class it belongs to and its final method name. The final method name
+    already encodes the original method name, the dataprovider, the dataset
+    name and the repeat suffix.
+
+    :param target_cls:
+        Test class the method is added to.
+    :type target_cls:
+        `class`
+    :param test_method_name:
+        Final name of the generated test method, encoded to a native
+        string as by :func:`encode_non_ascii_string`.
+    :type test_method_name:
+        `str`
+    :return:
+        The test id, e.g. "my_module.MyTests.test_something(5, 'hello')".
+    :rtype:
+        `unicode`
+    """
+    if isinstance(test_method_name, six.binary_type):
+        # Python 2 method names are UTF-8 encoded byte strings.
+        test_method_name = test_method_name.decode('utf-8')
+    return '{0}.{1}.{2}'.format(
+        target_cls.__module__,
+        target_cls.__name__,
+        test_method_name,
+    )
+
+
+def _get_dataset_args(dataset):
+    """
+    :param dataset:
+        Tuple or GentyArgs instance containing the args of the dataset.
+    :type dataset:
+        `tuple` or :class:`GentyArgs`
+    :return:
+        The positional and keyword arguments of the dataset.
+    :rtype:
+        `tuple` of (`tuple`, `dict`)
+    """
+    if isinstance(dataset, GentyArgs):
+        return dataset.args, dataset.kwargs
+    return dataset, {}
+
+
+def _has_shared_values(dataset):
+    """
+    :param dataset:
+        Tuple or GentyArgs instance containing the args of the dataset.
+    :type dataset:
+        `tuple` or :class:`GentyArgs`
+    :return:
+        Whether any of the args is a :class:`GentyShared`.
+    :rtype:
+        `bool`
+    """
+    if not shared_values_created:
+        # The common case, where no test uses shared values at all.
+        return False
+    args, kwargs = _get_dataset_args(dataset)
+    return any(isinstance(value, GentyShared) for value in chain(args, kwargs.values()))
+
+
+def _resolve_shared_values(args, kwargs):
+    """
+    :param args:
+        The positional arguments of a dataset.
+    :type args:
+        `tuple`
+    :param kwargs:
+        The keyword arguments of a dataset.
+    :type kwargs:
+        `dict`
+    :return:
+        The arguments, with each :class:`GentyShared` replaced by a view of
+        its shared buffer.
+    :rtype:
+        `tuple` of (`tuple`, `dict`)
+    """
+    def resolve(value):
+        return value.resolve() if isinstance(value, GentyShared) else value
+    return (
+        tuple(resolve(value) for value in args),
+        dict((key, resolve(value)) for key, value in six.iteritems(kwargs)),
+    )
+
+
 def _build_dataset_method(method, dataset):
     """
     Return a fabricated method that marshals the dataset into parameters
@@ -344,15 +561,24 @@ def _build_dataset_method(method, dataset):
     :type method:
         `callable`
     :param dataset:
-        Tuple or GentyArgs instance containing the args of the dataset.
+        Tuple or GentyArgs instance containing the args of the dataset, or
+        GentyLazy instance building it.
     :type dataset:
-        `tuple` or :class:`GentyArgs`
+        `tuple` or :class:`GentyArgs` or :class:`GentyLazy`
     :return:
         Return an unbound function that will become a test method
     :rtype:
         `function`
     """
-    if isinstance(dataset, GentyArgs):
+    if isinstance(dataset, GentyLazy):
+        def test_method(my_self):
+            args, kwargs = _get_dataset_args(dataset.resolve())
+            return method(my_self, *args, **kwargs)
+    elif _has_shared_values(dataset):
+        def test_method(my_self):
+            args, kwargs = _resolve_shared_values(*_get_dataset_args(dataset))
+            return method(my_self, *args, **kwargs)
+    elif isinstance(dataset, GentyArgs):
         test_method = lambda my_self: method(
             my_self,
             *dataset.args,
@@ -366,41 +592,53 @@ def _build_dataset_method(method, dataset):
     return test_method
 
 
-def _build_dataprovider_method(method, dataset, dataprovider):
+def _build_dataprovider_call(dataset, dataprovider, memo_key=None):
     """
-    Return a fabricated method that calls the dataprovider with the given
-    dataset, and marshals the return value from that into params to the
-    underlying test 'method'.
-    :param method:
-        The underlying test method.
-    :type method:
-        `callable`
+    Return a function that calls the dataprovider with the given dataset,
+    and marshals its return value into params to the underlying test method.
     :param dataset:
-        Tuple or GentyArgs instance containing the args of the dataset.
+        Tuple or GentyArgs instance containing the args of the dataset,
+        GentyLazy instance building it, or GentyNestedDataset instance
+        getting it from another dataprovider.
     :type dataset:
-        `tuple` or :class:`GentyArgs`
+        `tuple` or :class:`GentyArgs` or :class:`GentyLazy` or
+        :class:`GentyNestedDataset`
     :param dataprovider:
         The unbound function that's responsible for generating the actual
         params that will be passed to the test function.
     :type dataprovider:
         `callable`
+    :param memo_key:
+        The key to memoize the return value of the dataprovider under, or
+        None not to memoize it.
+    :type memo_key:
+        `tuple` or None
     :return:
-        Return an unbound function that will become a test method
+        Function taking the test instance, and returning the positional and
+        keyword arguments for the test method.
     :rtype:
         `function`
     """
-    if isinstance(dataset, GentyArgs):
-        final_args = dataset.args
-        final_kwargs = dataset.kwargs
-    else:
-        final_args = dataset
-        final_kwargs = {}
-
-    def test_method_wrapper(my_self):
+    has_shared_values = False
+    if isinstance(dataset, GentyNestedDataset):
+        call_upstream = _build_dataprovider_call(dataset.dataset, dataset.dataprovider, dataset.memo_key)
+    elif not isinstance(dataset, GentyLazy):
+        final_args, final_kwargs = _get_dataset_args(dataset)
+        has_shared_values = _has_shared_values(dataset)
+
+    def call_dataprovider(my_self):
+        if isinstance(dataset, GentyNestedDataset):
+            dataprovider_args, dataprovider_kwargs = call_upstream(my_self)
+        elif isinstance(dataset, GentyLazy):
+            dataprovider_args, dataprovider_kwargs = _get_dataset_args(dataset.resolve())
+        elif has_shared_values:
+            dataprovider_args, dataprovider_kwargs = _resolve_shared_values(final_args, final_kwargs)
+        else:
+            dataprovider_args, dataprovider_kwargs = final_args, final_kwargs
         args = dataprovider(
             my_self,
-            *final_args,
-            **final_kwargs
+            *dataprovider_args,
+            **dataprovider_kwargs
         )
 
         kwargs = {}
@@ -411,12 +649,64 @@ def test_method_wrapper(my_self):
         elif not isinstance(args, (tuple, list)):
             args = (args, )
 
+        return args, kwargs
+
+    if memo_key is not None:
+        return functools.partial(_call_memoized, memo_key, call_dataprovider)
+    return call_dataprovider
+
+
+def _build_dataprovider_method(method, dataset, dataprovider, prefetch=False, memo_key=None):
+    """
+    Return a fabricated method that calls the dataprovider with the given
+    dataset, and marshals the return value from that into params to the
+    underlying test 'method'.
+    :param method:
+        The underlying test method.
+    :type method:
+        `callable`
+    :param dataset:
+        Tuple or GentyArgs instance containing the args of the dataset, or
+        GentyLazy instance building it.
+    :type dataset:
+        `tuple` or :class:`GentyArgs` or :class:`GentyLazy`
+    :param dataprovider:
+        The unbound function that's responsible for generating the actual
+        params that will be passed to the test function.
+    :type dataprovider:
+        `callable`
+    :param prefetch:
+        Whether to use the params prefetched by
+        :class:`genty.genty_suite.GentyTestSuite`, if any.
+    :type prefetch:
+        `bool`
+    :param memo_key:
+        The key to memoize the return value of the dataprovider under, or
+        None not to memoize it.
+    :type memo_key:
+        `tuple` or None
+    :return:
+        Return an unbound function that will become a test method
+    :rtype:
+        `function`
+    """
+    call_dataprovider = _build_dataprovider_call(dataset, dataprovider, memo_key)
+
+    def test_method_wrapper(my_self):
+        prefetched = None
+        if prefetch:
+            prefetched = vars(my_self).pop(PREFETCHED_ATTRIBUTE, None)
+        if prefetched is not None:
+            args, kwargs = prefetched.get()
+        else:
+            args, kwargs = call_dataprovider(my_self)
+
         return method(my_self, *args, **kwargs)
 
     return test_method_wrapper
 
 
-def _build_test_method(method, dataset, dataprovider=None):
+def _build_test_method(method, dataset, dataprovider=None, prefetch=False, memo_key=None, test_id=None):
     """
     Return a fabricated method that marshals the dataset into parameters
     for given 'method'
@@ -433,13 +723,33 @@ def _build_test_method(method, dataset, dataprovider=None):
         params that will be passed to the test function. Can be None
     :type dataprovider:
         `callable` or None
+    :param prefetch:
+        Whether the dataprovider may be called ahead of time.
+    :type prefetch:
+        `bool`
+    :param memo_key:
+        The key to memoize the return value of the dataprovider under, or
+        None not to memoize it.
+    :type memo_key:
+        `tuple` or None
+    :param test_id:
+        Stable identifier of the generated test, to measure the method
+        with the budget and benchmark set on it. None not to measure it.
+    :type test_id:
+        `unicode` or None
     :return:
         Return an unbound function that will become a test method
     :rtype:
         `function`
     """
+    # pylint: disable=too-many-arguments
+    resources = getattr(method, 'genty_resources', None)
+    if test_id is not None:
+        method = _build_measured_method(method, test_id, dataset)
+    if resources:
+        method = _build_resource_method(method, resources)
     if dataprovider:
-        test_method = _build_dataprovider_method(method, dataset, dataprovider)
+        test_method = _build_dataprovider_method(method, dataset, dataprovider, prefetch, memo_key)
     elif dataset:
         test_method = _build_dataset_method(method, dataset)
     else:
@@ -447,6 +757,119 @@ def _build_test_method(method, dataset, dataprovider=None):
     return test_method
 
 
+def _build_measured_method(method, test_id, dataset):
+    """
+    Wrap the underlying test function according to the budget, benchmark
+    and load set on it, before it is bound to its dataset, so that they only
+    measure the test itself and not the dataprovider call or resource
+    checkout, which happen once per generated test.
+
+    :param method:
+        The underlying test function, carrying the decorator settings.
+    :type method:
+        `function`
+    :param test_id:
+        Stable identifier of the generated test, used for reporting.
+    :type test_id:
+        `unicode`
+    :param dataset:
+        The dataset of the generated test, which may carry options.
+    :type dataset:
+        `tuple` or :class:`GentyArgs` or None
+    :return:
+        A function taking the test instance and the arguments of the test.
+    :rtype:
+        `function`
+    """
+    test_method = method
+    budget = _get_budget(method, dataset)
+    if budget:
+        test_method = _build_budget_method(test_method, test_id, budget)
+
+    benchmark = getattr(method, 'genty_benchmark', None)
+    if benchmark:
+        test_method = _build_benchmark_method(test_method, test_id, benchmark)
+
+    load = getattr(method, 'genty_load', None)
+    if load:
+        test_method = _build_load_method(test_method, test_id, load)
+    return test_method
+
+
+def _wrap_test_method(test_method, func, test_info, instrument_settings=None, body_method=None):
+    """
+    Wrap a fabricated test method according to the settings that decorators
+    such as @genty_repeat left on the underlying test function, and to the
+    instrumentation enabled for this run.
+
+    :param test_method:
+        The fabricated test method, already bound to its dataset.
+    :type test_method:
+        `function`
+    :param func:
+        The underlying test function, carrying the decorator settings.
+    :type func:
+        `function`
+    :param test_info:
+        Description of the generated test.
+    :type test_info:
+        :class:`GentyTestInfo`
+    :param instrument_settings:
+        The instrumentation enabled for this run, or None if none is.
+    :type instrument_settings:
+        :class:`genty.genty_instrument._InstrumentSettings` or None
+    :param body_method:
+        The test body bound to its dataset, without the budget, benchmark
+        or load set on it, for the profiler to run again. Can be None.
+    :type body_method:
+        `function` or None
+    :return:
+        Return an unbound function that will become a test method
+    :rtype:
+        `function`
+    """
+    test_id = test_info.test_id
+
+    until_failure = getattr(func, 'genty_repeat_until_failure', None)
+    if until_failure:
+        max_count, time_budget = until_failure
+        test_method = _build_repeat_until_failure_method(
+            test_method,
+            test_id,
+            max_count,
+            time_budget,
+        )
+
+    leak_check = getattr(func, 'genty_repeat_leak_check', None)
+    if leak_check:
+        count, threshold = leak_check
+        test_method = _build_leak_check_method(
+            test_method,
+            test_id,
+            count,
+            threshold,
+        )
+
+    concurrency = getattr(func, 'genty_repeat_concurrency', None)
+    if concurrency:
+        count, max_concurrency, processes = concurrency
+        test_method = _build_concurrent_repeat_method(
+            test_method,
+            test_id,
+            count,
+            max_concurrency,
+            processes,
+        )
+
+    return _instrument_test_method(
+        test_method,
+        test_info,
+        instrument_settings,
+        concurrent=bool(getattr(func, 'genty_load', None) or concurrency),
+        body_method=body_method,
+    )
+
+
 def _add_method_to_class(
         target_cls,
         method_name,
@@ -455,6 +878,8 @@ def _add_method_to_class(
         dataset,
         dataprovider,
         repeat_suffix,
+        memo_key=None,
+        instrument_settings=None,
 ):
     """
     Add the described method to the given class.
@@ -488,27 +913,78 @@ def _add_method_to_class(
         params that will be passed to the test function. Can be None.
     :type dataprovider:
         `callable`
+    :param memo_key:
+        The key to memoize the return value of the dataprovider under, or
+        None not to memoize it.
+    :type memo_key:
+        `tuple` or None
+    :param instrument_settings:
+        The instrumentation enabled for this run, or None if none is.
+    :type instrument_settings:
+        :class:`genty.genty_instrument._InstrumentSettings` or None
+    :return:
+        The name of the method added to the class.
+    :rtype:
+        `unicode`
     """
     # pylint: disable=too-many-arguments
+    dataprovider_name = dataprovider.__name__ if dataprovider else None
     test_method_name_for_dataset = _build_final_method_name(
         method_name,
         dataset_name,
-        dataprovider.__name__ if dataprovider else None,
+        dataprovider_name,
+        repeat_suffix,
+    )
+
+    test_method_name_for_dataset = encode_non_ascii_string(
+        test_method_name_for_dataset,
+    )
+    test_info = GentyTestInfo(
+        _build_test_id(target_cls, test_method_name_for_dataset),
+        method_name,
+        dataprovider_name,
+        dataset_name,
         repeat_suffix,
     )
 
-    test_method_for_dataset = _build_test_method(func, dataset, dataprovider)
+    prefetch = dataprovider in getattr(func, 'genty_prefetched_dataproviders', ())
+    test_method_for_dataset = _build_test_method(
+        func,
+        dataset,
+        dataprovider,
+        prefetch,
+        memo_key,
+        test_info.test_id,
+    )
+    body_method = None
+    if instrument_settings is not None and instrument_settings.profile is not None:
+        body_method = _build_test_method(func, dataset, dataprovider, prefetch, memo_key)
+    test_method_for_dataset = _wrap_test_method(
+        test_method_for_dataset,
+        func,
+        test_info,
+        instrument_settings,
+        body_method,
+    )
 
     test_method_for_dataset = functools.update_wrapper(
         test_method_for_dataset,
         func,
     )
 
-    test_method_name_for_dataset = encode_non_ascii_string(
-        test_method_name_for_dataset,
-    )
     test_method_for_dataset.__name__ = test_method_name_for_dataset
     test_method_for_dataset.genty_generated_test = True
+    test_method_for_dataset.genty_test_id = test_info.test_id
+    test_method_for_dataset.genty_test_info = test_info
+    test_method_for_dataset.genty_test_input = (dataprovider, dataset)
+    if prefetch:
+        test_method_for_dataset.genty_prefetch = _build_dataprovider_call(
+            dataset,
+            dataprovider,
+            memo_key,
+        )
 
     # Add the method to the class under the proper name
     setattr(target_cls, test_method_name_for_dataset, test_method_for_dataset)
+
+    return test_method_name_for_dataset
@@ -6,6 +6,11 @@
 from .private import format_arg, format_kwarg
 
 
+# Keyword arguments of genty_args that configure genty instead of being
+# passed to the test.
+RESERVED_OPTIONS = ('_max_ms', '_max_bytes', '_tags')
+
+
 class GentyArgs(object):
     """
     Store args and kwargs for use in a genty-generated test.
@@ -13,6 +18,9 @@ class GentyArgs(object):
     def __init__(self, *args, **kwargs):
         super(GentyArgs, self).__init__()
         self._args = args
+        self._options = dict(
+            (name, kwargs.pop(name)) for name in RESERVED_OPTIONS if name in kwargs
+        )
         self._kwargs = kwargs
 
     @property
@@ -25,6 +33,11 @@ def kwargs(self):
         """Return dictionary of keyword arguments to be passed to the test."""
         return self._kwargs
 
+    @property
+    def options(self):
+        """Return dictionary of the reserved options given for this dataset."""
+        return self._options
+
     def __iter__(self):
         """Allow iterating over the argument list.
         First, yield value of args in given order.
@@ -69,6 +82,11 @@ def test_function(a, b, c=0, d=None)
         test_function('a1', 'b1', 1, 'd1') and
         test_function('a2', 'b2', d='d2')
 
+    A few keyword arguments are reserved for options about the dataset, and
+    are neither passed to the test nor part of its name:
+    - _max_ms and _max_bytes override the budget set by @genty_budget.
+    - _tags adds tags to the test, as with @genty_tags.
+
     :param args:
         Ordered arguments that should be sent to the test.
     :type args:
@@ -0,0 +1,344 @@
+# coding: utf-8
+
+from __future__ import division, unicode_literals
+import atexit
+from collections import namedtuple
+import gc
+import io
+import json
+import os
+import threading
+import warnings
+
+from .genty_report import get_report, record
+from .private import to_json
+from .private.timing import NANOSECONDS_PER_SECOND, perf_counter_ns, summarize
+
+
+BASELINE_ENV_VAR = 'GENTY_BENCHMARK_BASELINE'
+SAVE_BASELINE_ENV_VAR = 'GENTY_BENCHMARK_SAVE_BASELINE'
+TOLERANCE_ENV_VAR = 'GENTY_BENCHMARK_TOLERANCE'
+
+_STATISTICS = ('min', 'median', 'mean', 'p95', 'p99', 'max')
+
+_BenchmarkSettings = namedtuple(
+    '_BenchmarkSettings',
+    ['warmup', 'iterations', 'min_time', 'disable_gc', 'tolerance', 'statistic', 'stddevs'],
+)
+
+_baselines = {}
+_baselines_lock = threading.Lock()
+
+
+def genty_benchmark(
+        warmup=1,
+        iterations=100,
+        min_time=0,
+        disable_gc=False,
+        tolerance=0.1,
+        statistic='median',
+        stddevs=3,
+):
+    """
+    To use in conjunction with a TestClass wrapped with @genty.
+
+    Benchmarks the body of the wrapped test. Like @genty_repeat, the test is
+    called several times, but the calls happen inside each generated test so
+    that their timings can be collected. Combined with @genty_dataset, each
+    dataset gets its own benchmark:
+        @genty_benchmark(warmup=10, iterations=1000)
+        @genty_dataset(small=(10,), large=(10000,))
+        def test_sort(self, size):
+            ...
+
+    The min, median, p95, p99, max, mean and standard deviation of the
+    timings, in nanoseconds, are recorded per generated test in the
+    'benchmark' report of :mod:`genty.genty_report`, which is written as
+    JSON to the GENTY_REPORT_DIR directory at exit. Note that setUp and
+    tearDown run once around the whole benchmark.
+
+    Benchmarks can also act as a regression gate. Point the
+    GENTY_BENCHMARK_SAVE_BASELINE environment variable at a file to store
+    the results of a run as a baseline, keyed by test id. In later runs,
+    point GENTY_BENCHMARK_BASELINE at that file: each generated test then
+    fails if its 'statistic' got slower than the baseline by more than
+    'tolerance', and by more than 'stddevs' standard deviations of the
+    timings, taking the larger of this run's and the baseline's, so that
+    noisy tests don't fail on noise alone. GENTY_BENCHMARK_TOLERANCE
+    overrides 'tolerance' for a run, e.g. on noisier CI machines. Tests
+    missing from the baseline pass.
+
+    :param warmup:
+        The number of untimed calls to make before timing.
+    :type warmup:
+        `int`
+    :param iterations:
+        The minimum number of timed calls.
+    :type iterations:
+        `int`
+    :param min_time:
+        The minimum number of seconds to spend in timed calls. Timed calls
+        continue past 'iterations' until this much time has been spent.
+    :type min_time:
+        `float`
+    :param disable_gc:
+        Whether to collect garbage before timing and disable the garbage
+        collector while timing, to reduce noise.
+    :type disable_gc:
+        `bool`
+    :param tolerance:
+        The allowed slowdown relative to the baseline, as a fraction. For
+        example 0.1 fails the test if it is more than 10% slower.
+    :type tolerance:
+        `float`
+    :param statistic:
+        The statistic compared against the baseline. One of 'min',
+        'median', 'mean', 'p95', 'p99' or 'max'.
+    :type statistic:
+        `unicode`
+    :param stddevs:
+        The number of standard deviations of the timings that a slowdown
+        must exceed to count as a regression. 0 only applies 'tolerance'.
+    :type stddevs:
+        `float`
+    """
+    # pylint:disable=too-many-arguments
+    if warmup < 0:
+        raise ValueError(
+            "Can't have {0} warmup calls. Please pick a value >= 0.".format(warmup)
+        )
+    if iterations < 1:
+        raise ValueError(
+            "Can't have {0} iterations. Please pick a value >= 1.".format(iterations)
+        )
+    if min_time < 0:
+        raise ValueError(
+            "Can't have a min_time of {0}. Please pick a value >= 0.".format(min_time)
+        )
+    if tolerance < 0:
+        raise ValueError(
+            "Can't have a tolerance of {0}. Please pick a value >= 0.".format(tolerance)
+        )
+    if stddevs < 0:
+        raise ValueError(
+            "Can't have {0} stddevs. Please pick a value >= 0.".format(stddevs)
+        )
+    if statistic not in _STATISTICS:
+        raise ValueError(
+            "Unknown statistic {0!r}. Please pick one of {1}.".format(
+                statistic,
+                ', '.join(_STATISTICS),
+            )
+        )
+    settings = _BenchmarkSettings(
+        warmup,
+        iterations,
+        min_time,
+        disable_gc,
+        tolerance,
+        statistic,
+        stddevs,
+    )
+
+    def wrap(test_method):
+        test_method.genty_benchmark = settings
+        return test_method
+    return wrap
+
+
+def _build_benchmark_method(method, test_id, settings):
+    """
+    Return a fabricated method that benchmarks 'method' and records the
+    distribution of its timings.
+
+    :param method:
+        The underlying test function to benchmark, called with the arguments
+        of the test, so that the dataprovider isn't timed.
+    :type method:
+        `callable`
+    :param test_id:
+        Stable identifier of the generated test, used for reporting.
+    :type test_id:
+        `unicode`
+    :param settings:
+        How to run the benchmark.
+    :type settings:
+        :class:`_BenchmarkSettings`
+    :return:
+        Function taking the test instance and the arguments of the test.
+    :rtype:
+        `function`
+    """
+    min_time_ns = int(settings.min_time * NANOSECONDS_PER_SECOND)
+
+    def test_method_wrapper(my_self, *args, **kwargs):
+        result = None
+        for _ in range(settings.warmup):
+            result = method(my_self, *args, **kwargs)
+
+        samples = []
+        gc_was_enabled = gc.isenabled()
+        if settings.disable_gc:
+            gc.collect()
+            gc.disable()
+        try:
+            start = perf_counter_ns()
+            while len(samples) < settings.iterations or perf_counter_ns() - start < min_time_ns:
+                sample_start = perf_counter_ns()
+                result = method(my_self, *args, **kwargs)
+                samples.append(perf_counter_ns() - sample_start)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        entry = summarize(samples)
+        entry['warmup'] = settings.warmup
+        record('benchmark', test_id, entry)
+        _check_against_baseline(my_self, test_id, entry, settings)
+        return result
+
+    return test_method_wrapper
+
+
+def _check_against_baseline(test_case, test_id, entry, settings):
+    """
+    Fail the test if it regressed compared to the configured baseline,
+    beyond both the tolerance and the spread of the timings.
+
+    :param test_case:
+        The running test case.
+    :type test_case:
+        :class:`TestCase`
+    :param test_id:
+        Stable identifier of the generated test.
+    :type test_id:
+        `unicode`
+    :param entry:
+        The timing summary of this run, in nanoseconds.
+    :type entry:
+        `dict`
+    :param settings:
+        The benchmark settings, holding the tolerance, statistic and
+        number of standard deviations.
+    :type settings:
+        :class:`_BenchmarkSettings`
+    """
+    path = os.environ.get(BASELINE_ENV_VAR)
+    if not path:
+        return
+    baseline_entry = load_baseline(path).get(test_id)
+    if not baseline_entry or not baseline_entry.get(settings.statistic):
+        return
+
+    current = entry[settings.statistic]
+    baseline = baseline_entry[settings.statistic]
+    tolerance = _get_tolerance(settings.tolerance)
+    # Baselines saved before the spread was recorded have no stddev.
+    noise = settings.stddevs * max(entry['stddev'], baseline_entry.get('stddev') or 0)
+    change = current / baseline - 1
+    entry['baseline'] = baseline
+    entry['change'] = change
+    if change > tolerance and current - baseline > noise:
+        failure_exception = getattr(test_case, 'failureException', AssertionError)
+        raise failure_exception(
+            '{0} regressed: {1} of {2:.0f}ns vs {3:.0f}ns in the baseline '
+            '({4:+.1%}, tolerance {5:.1%}, noise {6:.0f}ns).'.format(
+                test_id,
+                settings.statistic,
+                current,
+                baseline,
+                change,
+                tolerance,
+                noise,
+            )
+        )
+
+
+def _get_tolerance(default):
+    """
+    :param default:
+        The tolerance set with @genty_benchmark.
+    :type default:
+        `float`
+    :return:
+        The tolerance set with GENTY_BENCHMARK_TOLERANCE for this run, or
+        else the given one.
+    :rtype:
+        `float`
+    """
+    value = os.environ.get(TOLERANCE_ENV_VAR)
+    if not value:
+        return default
+    try:
+        tolerance = float(value)
+    except ValueError:
+        tolerance = -1
+    if tolerance < 0:
+        warnings.warn('{0} is not a fraction >= 0, using {1}.'.format(
+            TOLERANCE_ENV_VAR,
+            default,
+        ))
+        return default
+    return tolerance
+
+
+def load_baseline(path):
+    """
+    Load a baseline file, caching its contents for subsequent calls.
+
+    :param path:
+        Path of the baseline file.
+    :type path:
+        `unicode`
+    :return:
+        The baseline timing summaries keyed by test id. Empty if the file
+        doesn't exist.
+    :rtype:
+        `dict` of `unicode` to `dict`
+    """
+    with _baselines_lock:
+        if path not in _baselines:
+            baseline = {}
+            if os.path.exists(path):
+                with io.open(path, encoding='utf-8') as baseline_file:
+                    baseline = json.load(baseline_file)
+            _baselines[path] = baseline
+        return _baselines[path]
+
+
+def save_baseline(path):
+    """
+    Store the benchmark results of this run in a baseline file. Results of
+    tests that didn't run in this run are kept from the existing file.
+
+    :param path:
+        Path of the baseline file.
+    :type path:
+        `unicode`
+    """
+    results = get_report('benchmark')
+    if not results:
+        return
+    baseline = {}
+    if os.path.exists(path):
+        with io.open(path, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    for test_id, entry in results.items():
+        baseline[test_id] = dict(
+            (key, value) for key, value in entry.items()
+            if key not in ('baseline', 'change')
+        )
+    with io.open(path, 'w', encoding='utf-8') as baseline_file:
+        baseline_file.write(to_json(baseline))
+    with _baselines_lock:
+        _baselines.pop(path, None)
+
+
+def _save_baseline_from_environment():
+    """Save the baseline if a baseline file has been configured."""
+    path = os.environ.get(SAVE_BASELINE_ENV_VAR)
+    if path:
+        save_baseline(path)
+
+
+atexit.register(_save_baseline_from_environment)
@@ -0,0 +1,187 @@
+# coding: utf-8
+
+from __future__ import division, unicode_literals
+from collections import namedtuple
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from .genty_args import GentyArgs
+from .genty_report import record
+from .private.timing import perf_counter_ns
+
+
+_NANOSECONDS_PER_MILLISECOND = 10 ** 6
+
+_Budget = namedtuple('_Budget', ['max_ms', 'max_bytes'])
+
+
+def genty_budget(max_ms=None, max_bytes=None):
+    """
+    To use in conjunction with a TestClass wrapped with @genty.
+
+    Fails each generated test whose body takes longer than 'max_ms'
+    milliseconds, or allocates more than 'max_bytes' bytes at its peak. The
+    failure reports how far over budget the test went:
+        @genty_budget(max_ms=5)
+        @genty_dataset(
+            small=(10,),
+            large=genty_args(10000, _max_ms=50),
+        )
+        def test_sort(self, size):
+            ...
+
+    As above, datasets passed with genty_args can override the budget with
+    the '_max_ms' and '_max_bytes' keyword arguments, which aren't passed to
+    the test. Datasets can also set a budget when the method has none.
+
+    The wall time is measured around the test body only, without setUp and
+    tearDown. Allocations are traced with tracemalloc, only when a byte
+    budget is set. The measurements are recorded per generated test in the
+    'budget' report of :mod:`genty.genty_report`.
+
+    :param max_ms:
+        The maximum wall time of a test, in milliseconds, or None.
+    :type max_ms:
+        `float` or None
+    :param max_bytes:
+        The maximum peak of memory allocated by a test, in bytes, or None.
+    :type max_bytes:
+        `int` or None
+    """
+    _check_budget(max_ms, max_bytes)
+    budget = _Budget(max_ms, max_bytes)
+
+    def wrap(test_method):
+        test_method.genty_budget = budget
+        return test_method
+    return wrap
+
+
+def _check_budget(max_ms, max_bytes):
+    """
+    :param max_ms:
+        The maximum wall time of a test, in milliseconds, or None.
+    :type max_ms:
+        `float` or None
+    :param max_bytes:
+        The maximum peak of memory allocated by a test, in bytes, or None.
+    :type max_bytes:
+        `int` or None
+    :raises:
+        ValueError if the budget is invalid.
+    """
+    if max_ms is None and max_bytes is None:
+        raise ValueError('Please set max_ms, max_bytes or both.')
+    if max_ms is not None and max_ms <= 0:
+        raise ValueError("Can't have a budget of {0} ms. Please pick a value > 0.".format(max_ms))
+    if max_bytes is not None:
+        if max_bytes <= 0:
+            raise ValueError(
+                "Can't have a budget of {0} bytes. Please pick a value > 0.".format(max_bytes)
+            )
+        if tracemalloc is None:
+            raise ValueError('Byte budgets need tracemalloc, which is not available in this Python.')
+
+
+def _get_budget(func, dataset):
+    """
+    :param func:
+        The underlying test function.
+    :type func:
+        `function`
+    :param dataset:
+        The dataset of the generated test.
+    :type dataset:
+        `tuple` or :class:`GentyArgs` or None
+    :return:
+        The budget of the generated test: the one set with @genty_budget,
+        overridden by the options of the dataset. None if neither sets one.
+    :rtype:
+        :class:`_Budget` or None
+    """
+    budget = getattr(func, 'genty_budget', None) or _Budget(None, None)
+    if isinstance(dataset, GentyArgs):
+        options = dataset.options
+        budget = _Budget(
+            options.get('_max_ms', budget.max_ms),
+            options.get('_max_bytes', budget.max_bytes),
+        )
+    if budget.max_ms is None and budget.max_bytes is None:
+        return None
+    _check_budget(*budget)
+    return budget
+
+
+def _build_budget_method(method, test_id, budget):
+    """
+    Return a fabricated method that fails if 'method' goes over budget.
+
+    :param method:
+        The underlying test function to measure, called with the arguments
+        of the test, so that the dataprovider isn't measured.
+    :type method:
+        `callable`
+    :param test_id:
+        Stable identifier of the generated test, used for reporting.
+    :type test_id:
+        `unicode`
+    :param budget:
+        The budget.
+    :type budget:
+        :class:`_Budget`
+    :return:
+        Function taking the test instance and the arguments of the test, and
+        returning what the test returns.
+    :rtype:
+        `function`
+    """
+    def test_method_wrapper(my_self, *args, **kwargs):
+        trace = budget.max_bytes is not None
+        if trace:
+            was_tracing = tracemalloc.is_tracing()
+            if not was_tracing:
+                tracemalloc.start()
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            size_before = tracemalloc.get_traced_memory()[0]
+        start = perf_counter_ns()
+        try:
+            result = method(my_self, *args, **kwargs)
+        finally:
+            elapsed_ms = (perf_counter_ns() - start) / _NANOSECONDS_PER_MILLISECOND
+            peak_bytes = None
+            if trace:
+                peak_bytes = max(tracemalloc.get_traced_memory()[1] - size_before, 0)
+                if not was_tracing:
+                    tracemalloc.stop()
+
+        record('budget', test_id, {
+            'elapsed_ms': elapsed_ms,
+            'max_ms': budget.max_ms,
+            'peak_bytes': peak_bytes,
+            'max_bytes': budget.max_bytes,
+        })
+        overruns = []
+        if budget.max_ms is not None and elapsed_ms > budget.max_ms:
+            overruns.append('took {0:.3f} ms, {1:.3f} ms ({2:.0%}) over its budget of {3} ms'.format(
+                elapsed_ms,
+                elapsed_ms - budget.max_ms,
+                (elapsed_ms - budget.max_ms) / budget.max_ms,
+                budget.max_ms,
+            ))
+        if budget.max_bytes is not None and peak_bytes > budget.max_bytes:
+            overruns.append('allocated {0} bytes, {1} bytes ({2:.0%}) over its budget of {3} bytes'.format(
+                peak_bytes,
+                peak_bytes - budget.max_bytes,
+                (peak_bytes - budget.max_bytes) / budget.max_bytes,
+                budget.max_bytes,
+            ))
+        if overruns:
+            failure_exception = getattr(my_self, 'failureException', AssertionError)
+            raise failure_exception('{0} {1}.'.format(test_id, ' and '.join(overruns)))
+        return result
+
+    return test_method_wrapper
@@ -0,0 +1,237 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import functools
+import hashlib
+import inspect
+import io
+import os
+import tempfile
+import warnings
+
+from six.moves import cPickle as pickle  # pylint:disable=import-error
+
+from .genty_dataset import _UnhashableError, _update_hash
+from .genty_manifest import code_hash
+
+
+CACHE_DIR_ENV_VAR = 'GENTY_CACHE_DIR'
+
+
+def genty_cached(factory, dependencies=(), key=None):
+    """
+    Build datasets with a factory, or load them from an on-disk cache if the
+    factory already built them in an earlier run.
+
+    Arguments to @genty_dataset are built when the test module is imported.
+    When that takes long, e.g. because it scans files, move the building
+    into a factory, and pass what genty_cached returns to @genty_dataset:
+        def build_cases():
+            return [load_case(path) for path in glob.glob('cases/*.json')]
+
+        @genty_dataset(*genty_cached(build_cases, glob.glob('cases/*.json')))
+        def test_case(self, case):
+            ...
+
+    Caching is enabled by setting the GENTY_CACHE_DIR environment variable
+    to the directory to keep the cache files in. The return value of the
+    factory is pickled there, keyed on a hash of the source file defining
+    the factory, of the code of the factory along with its default
+    arguments and the values it closes over, and of the size and
+    modification time of the given dependencies. Editing the file or a
+    dependency rebuilds the cache. Factories that close over values that
+    can't be hashed, e.g. objects whose repr is their address, and
+    callables that aren't functions, need an explicit unique key.
+
+    :param factory:
+        Callable taking no arguments and returning picklable datasets, e.g.
+        a list of tuples or a dict of named datasets.
+    :type factory:
+        `callable`
+    :param dependencies:
+        Paths of other files the datasets are built from.
+    :type dependencies:
+        `iterable` of `unicode`
+    :param key:
+        Identifies the datasets the factory builds, among those cached by
+        other factories. Defaults to a hash of the factory.
+    :type key:
+        `unicode` or None
+    :return:
+        The datasets returned by the factory.
+    :rtype:
+        varies
+    :raises:
+        ValueError if no key is given and the factory can't be hashed.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if not cache_dir:
+        return factory()
+    if key is None:
+        identity = _build_factory_key(factory)
+    else:
+        identity = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    function = _unwrap_factory(factory)
+    path = os.path.join(cache_dir, 'genty_{0}.{1}.{2}.pickle'.format(
+        getattr(function, '__module__', None),
+        getattr(function, '__qualname__', None) or getattr(function, '__name__', type(function).__name__),
+        identity[:16],
+    ))
+    key = _build_cache_key(function, identity, dependencies)
+    try:
+        with io.open(path, 'rb') as cache_file:
+            cached_key, datasets = pickle.load(cache_file)
+        if cached_key == key:
+            return datasets
+    except (IOError, OSError, EOFError, ValueError, TypeError, AttributeError, ImportError, pickle.UnpicklingError):
+        # Missing or unreadable cache, e.g. written by another version.
+        pass
+    datasets = factory()
+    try:
+        _write_cache(path, key, datasets)
+    except (IOError, OSError, TypeError, AttributeError, pickle.PicklingError) as error:
+        warnings.warn('Could not cache the datasets built by {0!r}: {1}'.format(factory, error))
+    return datasets
+
+
+def _unwrap_factory(factory):
+    """
+    :param factory:
+        The factory building the datasets.
+    :type factory:
+        `callable`
+    :return:
+        The function the factory calls, unwrapping partials and methods.
+    :rtype:
+        `callable`
+    """
+    while isinstance(factory, functools.partial):
+        factory = factory.func
+    return getattr(factory, '__func__', factory)
+
+
+def _build_factory_key(factory):
+    """
+    :param factory:
+        The factory building the datasets.
+    :type factory:
+        `callable`
+    :return:
+        Hash of the code of the factory, of its default arguments and of the
+        values it closes over, and for partials and bound methods, of the
+        arguments and instance they are bound to.
+    :rtype:
+        `unicode`
+    :raises:
+        ValueError if the factory can't be hashed.
+    """
+    digest = hashlib.sha256()
+    try:
+        _update_factory_hash(digest, factory)
+    except (_UnhashableError, RuntimeError):
+        raise ValueError(
+            "Can't tell the datasets built by {0!r} apart from those of other factories. "
+            "Please pass a unique key to genty_cached.".format(factory)
+        )
+    return digest.hexdigest()
+
+
+def _update_factory_hash(digest, factory):
+    """
+    :param digest:
+        The hash to feed the factory to.
+    :type digest:
+        :class:`hashlib.sha256`
+    :param factory:
+        The factory building the datasets.
+    :type factory:
+        `callable`
+    :raises:
+        :class:`_UnhashableError` if the factory can't be hashed.
+    """
+    if isinstance(factory, functools.partial):
+        _update_factory_hash(digest, factory.func)
+        _update_hash(digest, factory.args)
+        _update_hash(digest, factory.keywords or {})
+        return
+    if getattr(factory, '__self__', None) is not None:
+        _update_hash(digest, factory.__self__)
+        factory = factory.__func__
+    if getattr(factory, '__code__', None) is None:
+        raise _UnhashableError(factory)
+    digest.update(code_hash([factory]).encode('ascii'))
+    _update_hash(digest, factory.__defaults__ or ())
+    _update_hash(digest, getattr(factory, '__kwdefaults__', None) or {})
+    for cell in factory.__closure__ or ():
+        try:
+            contents = cell.cell_contents
+        except ValueError:
+            # The cell isn't bound yet.
+            contents = None
+        _update_hash(digest, contents)
+
+
+def _build_cache_key(function, identity, dependencies):
+    """
+    :param function:
+        The function building the datasets.
+    :type function:
+        `callable`
+    :param identity:
+        Hash identifying the factory.
+    :type identity:
+        `unicode`
+    :param dependencies:
+        Paths of other files the datasets are built from.
+    :type dependencies:
+        `iterable` of `unicode`
+    :return:
+        Hash of the identity and source file of the factory, and of the
+        size and modification time of the dependencies.
+    :rtype:
+        `unicode`
+    """
+    key = hashlib.sha256(identity.encode('ascii'))
+    try:
+        source_path = inspect.getsourcefile(function)
+    except TypeError:
+        # Built-in or C callables have no source file.
+        source_path = None
+    if source_path:
+        with io.open(source_path, 'rb') as source_file:
+            key.update(source_file.read())
+    for dependency in sorted(dependencies):
+        stat = os.stat(dependency)
+        key.update('{0}:{1}:{2}\n'.format(dependency, stat.st_size, stat.st_mtime).encode('utf-8'))
+    return key.hexdigest()
+
+
+def _write_cache(path, key, datasets):
+    """
+    Atomically write datasets to a cache file.
+
+    :param path:
+        Path of the cache file.
+    :type path:
+        `unicode`
+    :param key:
+        The key the datasets are valid for.
+    :type key:
+        `unicode`
+    :param datasets:
+        The datasets.
+    :type datasets:
+        varies
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with io.open(file_descriptor, 'wb') as cache_file:
+            pickle.dump((key, datasets), cache_file, pickle.HIGHEST_PROTOCOL)
+        # Replaces any existing file atomically, unlike os.rename on Windows.
+        getattr(os, 'replace', os.rename)(temporary_path, path)
+    except Exception:
+        os.remove(temporary_path)
+        raise
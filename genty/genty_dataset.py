@@ -7,15 +7,45 @@
     # pylint:disable=import-error
     from ordereddict import OrderedDict
     # pylint:enable=import-error
+import hashlib
+import os
+import threading
+import types
+import warnings
 import six
 from .genty_args import GentyArgs
+from .genty_lazy import GentyLazy
+from .genty_shared import GentyShared
 from .private import format_arg
 
 
-def genty_dataprovider(builder_function):
+DUPLICATES_ENV_VAR = 'GENTY_DUPLICATES'
+DUPLICATE_POLICIES = ('keep', 'dedupe', 'warn', 'error')
+
+
+def genty_dataprovider(builder_function, prefetch=False, memoize=False):
     """Decorator defining that this test gets parameters from the given
     build_function.
 
+    Dataproviders can themselves get their parameters from other
+    dataproviders, by decorating the builder_function with
+    @genty_dataprovider too. The tests then get a dataset for each dataset
+    of the dataproviders upstream, named after the chain of dataproviders:
+        @genty_dataset('eu', 'us')
+        def start_server(self, region):
+            ...
+
+        @genty_dataprovider(start_server, memoize=True)
+        def create_tenant(self, server):
+            ...
+
+        @genty_dataprovider(create_tenant)
+        def test_login(self, tenant):
+            ...
+    generates the tests named
+        test_login_create_tenant(start_server('eu')) and
+        test_login_create_tenant(start_server('us'))
+
     :param builder_function:
         A callable that returns parameters that will be passed to the method
         decorated by this decorator.
@@ -30,8 +60,24 @@ def genty_dataprovider(builder_function):
         passed as such to the decorated method.
     :type builder_function:
         `callable`
+    :param prefetch:
+        Whether :class:`genty.genty_suite.GentyTestSuite` may call the
+        builder_function ahead of time, in a background thread, while the
+        tests before this one run. Only enable this for builder functions
+        that don't depend on the state set up by setUp(). Prefetching is
+        turned on for a run with the GENTY_PREFETCH environment variable.
+    :type prefetch:
+        `bool`
+    :param memoize:
+        Whether to call the builder_function once per dataset, and share
+        what it returns with all the tests and dataproviders using it with
+        memoize=True, until :func:`clear_memoized_dataproviders` is called. Only enable this for
+        builder functions that don't depend on the state set up by setUp(),
+        and whose return value the tests don't modify.
+    :type memoize:
+        `bool`
     """
-    datasets = getattr(builder_function, 'genty_datasets', {None: ()})
+    datasets = _get_dataprovider_datasets(builder_function)
 
     def wrap(test_method):
         # Save the data providers in the test method. This data will be
@@ -42,11 +88,183 @@ def wrap(test_method):
         test_method.genty_dataproviders.append(
             (builder_function, datasets),
         )
+        if prefetch:
+            if not hasattr(test_method, 'genty_prefetched_dataproviders'):
+                test_method.genty_prefetched_dataproviders = []
+            test_method.genty_prefetched_dataproviders.append(builder_function)
+        if memoize:
+            if not hasattr(test_method, 'genty_memoized_dataproviders'):
+                test_method.genty_memoized_dataproviders = []
+            test_method.genty_memoized_dataproviders.append(builder_function)
 
         return test_method
     return wrap
 
 
+class GentyNestedDataset(object):
+    """
+    Store a dataset of a dataprovider, whose return value is the dataset of
+    another dataprovider.
+    """
+    def __init__(self, dataprovider, dataset, memo_key=None):
+        super(GentyNestedDataset, self).__init__()
+        self._dataprovider = dataprovider
+        self._dataset = dataset
+        self._memo_key = memo_key
+
+    @property
+    def dataprovider(self):
+        """Return the dataprovider upstream."""
+        return self._dataprovider
+
+    @property
+    def dataset(self):
+        """Return the dataset of the dataprovider upstream."""
+        return self._dataset
+
+    @property
+    def memo_key(self):
+        """
+        Return the key under which the return value of the dataprovider
+        upstream is memoized, or None if it isn't.
+        """
+        return self._memo_key
+
+
+def clear_memoized_dataproviders(builder_function=None):
+    """
+    Forget the return values of memoized dataproviders, e.g. once the tests
+    sharing them ran, so that they can be freed.
+
+    :param builder_function:
+        The dataprovider to forget the return values of, or None to forget
+        those of all dataproviders.
+    :type builder_function:
+        `callable` or None
+    """
+    with _memoized_lock:
+        for key in list(_memoized):
+            if builder_function is None or key[0] is builder_function:
+                del _memoized[key]
+
+
+class _MemoizedCall(object):
+    """
+    Return value of a dataprovider, computed by the first test needing it.
+    """
+    def __init__(self):
+        super(_MemoizedCall, self).__init__()
+        self._lock = threading.Lock()
+        self._has_value = False
+        self._value = None
+
+    def get(self, call_dataprovider, my_self):
+        """
+        :param call_dataprovider:
+            Function calling the dataprovider, if it wasn't called yet.
+        :type call_dataprovider:
+            `function`
+        :param my_self:
+            The test instance.
+        :type my_self:
+            :class:`TestCase`
+        :return:
+            The return value of the first successful call.
+        :rtype:
+            varies
+        """
+        with self._lock:
+            if not self._has_value:
+                self._value = call_dataprovider(my_self)
+                self._has_value = True
+            return self._value
+
+
+_memoized = {}
+_memoized_lock = threading.Lock()
+
+
+def _call_memoized(memo_key, call_dataprovider, my_self):
+    """
+    :param memo_key:
+        The key the return value of the call is memoized under, as returned
+        by :func:`_get_memo_key`.
+    :type memo_key:
+        `tuple`
+    :param call_dataprovider:
+        Function calling the dataprovider with its dataset.
+    :type call_dataprovider:
+        `function`
+    :param my_self:
+        The test instance.
+    :type my_self:
+        :class:`TestCase`
+    :return:
+        The memoized return value of the call.
+    :rtype:
+        varies
+    """
+    with _memoized_lock:
+        memoized_call = _memoized.get(memo_key)
+        if memoized_call is None:
+            memoized_call = _memoized[memo_key] = _MemoizedCall()
+    return memoized_call.get(call_dataprovider, my_self)
+
+
+def _get_memo_key(test_method, dataprovider, dataset_name):
+    """
+    :param test_method:
+        The test method or dataprovider decorated with @genty_dataprovider.
+    :type test_method:
+        `callable`
+    :param dataprovider:
+        The dataprovider it is decorated with.
+    :type dataprovider:
+        `callable`
+    :param dataset_name:
+        The name of the dataset the dataprovider is called with. Names
+        of nested datasets include the chain of dataproviders and datasets
+        upstream.
+    :type dataset_name:
+        `unicode` or None
+    :return:
+        Key identifying the call of the dataprovider with the dataset, if
+        that decorator memoizes it, else None.
+    :rtype:
+        `tuple` or None
+    """
+    if dataprovider in getattr(test_method, 'genty_memoized_dataproviders', ()):
+        return dataprovider, dataset_name
+    return None
+
+
+def _get_dataprovider_datasets(builder_function):
+    """
+    :param builder_function:
+        A dataprovider.
+    :type builder_function:
+        `callable`
+    :return:
+        The datasets to call the dataprovider with: its own datasets, and
+        one nested dataset for each dataset of the dataproviders upstream.
+    :rtype:
+        `dict` of `unicode` to varies
+    """
+    upstream_dataproviders = getattr(builder_function, 'genty_dataproviders', [])
+    if not upstream_dataproviders:
+        return getattr(builder_function, 'genty_datasets', {None: ()})
+    datasets = OrderedDict(getattr(builder_function, 'genty_datasets', {}))
+    for dataprovider, upstream_datasets in upstream_dataproviders:
+        for dataset_name, dataset in six.iteritems(upstream_datasets):
+            nested_name = '{0}({1})'.format(dataprovider.__name__, dataset_name or '')
+            datasets[nested_name] = GentyNestedDataset(
+                dataprovider,
+                dataset,
+                _get_memo_key(builder_function, dataprovider, dataset_name),
+            )
+    return datasets
+
+
 def genty_dataset(*args, **kwargs):
     """Decorator defining data sets to provide to a test.
 
@@ -125,6 +343,23 @@ def test_some_other_function(param1, param2=None)
     key&value pair from the outer (first) decorator will override the
     data from the inner.
 
+    The GENTY_DUPLICATES environment variable sets what to do about
+    datasets of a method with the same content, as hashed by
+    :func:`dataset_hash`, and about names given to datasets of different
+    content:
+    - 'keep' (the default) generates a test for each of them, and lets the
+      outer dataset override the inner one with the same name.
+    - 'dedupe' only generates a test for the first of identical datasets,
+      and warns about datasets overridden by name.
+    - 'warn' warns about both, without changing the tests.
+    - 'error' raises a ValueError for either.
+
+    Datasets that are expensive to build can be wrapped with genty_lazy, so
+    that they are only built when the generated test runs:
+        @genty_dataset(genty_lazy(load_big_schema, 'big_schema'))
+        def test_validate(self, schema)
+            ...
+
     :param args:
         Tuple of unnamed data sets.
     :type args:
@@ -142,7 +377,8 @@ def wrap(test_method):
         if not hasattr(test_method, 'genty_datasets'):
             test_method.genty_datasets = OrderedDict()
 
-        test_method.genty_datasets.update(datasets)
+        for dataset_name, dataset in six.iteritems(datasets):
+            _set_dataset(test_method.genty_datasets, dataset_name, dataset)
 
         return test_method
     return wrap
@@ -185,17 +421,19 @@ def _add_arg_datasets(datasets, args):
     """
     for dataset in args:
         # turn a value into a 1-tuple.
-        if not isinstance(dataset, (tuple, GentyArgs)):
+        if not isinstance(dataset, (tuple, GentyArgs, GentyLazy)):
             dataset = (dataset,)
 
         # Create a test_name_suffix - basically the parameter list
-        if isinstance(dataset, GentyArgs):
+        if isinstance(dataset, GentyLazy):
+            dataset_strings = [dataset.label]   # the dataset isn't built yet
+        elif isinstance(dataset, GentyArgs):
             dataset_strings = dataset     # GentyArgs supports iteration
         else:
             dataset_strings = [format_arg(data) for data in dataset]
         test_method_suffix = ", ".join(dataset_strings)
 
-        datasets[test_method_suffix] = dataset
+        _set_dataset(datasets, test_method_suffix, dataset)
 
 
 def _add_kwarg_datasets(datasets, kwargs):
@@ -211,4 +449,311 @@ def _add_kwarg_datasets(datasets, kwargs):
         `dict` of `unicode` to varies
     """
     for test_method_suffix, dataset in six.iteritems(kwargs):
-        datasets[test_method_suffix] = dataset
+        _set_dataset(datasets, test_method_suffix, dataset)
+
+
+def _set_dataset(datasets, name, dataset):
+    """Add a data set, reporting it if it overrides a different data set
+    of the same name.
+
+    :param datasets:
+        The dict where to accumulate data sets.
+    :type datasets:
+        `dict`
+    :param name:
+        The name of the data set.
+    :type name:
+        `unicode`
+    :param dataset:
+        The data set.
+    :type dataset:
+        varies
+    """
+    previous = datasets.get(name)
+    if previous is not None and previous is not dataset:
+        policy = _get_duplicate_policy()
+        if policy != 'keep':
+            previous_hash = dataset_hash(previous)
+            if previous_hash is None or previous_hash != dataset_hash(dataset):
+                _report_duplicate(policy, 'The dataset {0!r} overrides the different dataset {1!r}, named {2}.'.format(
+                    dataset,
+                    previous,
+                    name,
+                ))
+    datasets[name] = dataset
+
+
+def dataset_hash(dataset):
+    """
+    Hash the content of a dataset. The hash is stable across runs and
+    processes: it only depends on the values of the dataset, not on their
+    ids or on the order of dicts and sets.
+
+    Datasets with the same args and kwargs hash the same, whether passed as
+    tuples or with genty_args, unless genty_args also sets reserved options,
+    like '_tags' or '_max_ms', which change the generated test too.
+    Lazy datasets, whose content is only known once built, can't be hashed.
+    Nor can values without a stable representation, e.g. objects whose
+    repr is their address.
+
+    :param dataset:
+        The dataset.
+    :type dataset:
+        `tuple` or :class:`GentyArgs` or :class:`GentyNestedDataset` or
+        :class:`GentyLazy`
+    :return:
+        The hex digest of the content of the dataset, or None if it can't be
+        hashed.
+    :rtype:
+        `unicode` or None
+    """
+    digest = hashlib.sha256()
+    try:
+        if isinstance(dataset, tuple):
+            dataset = GentyArgs(*dataset)
+        _update_hash(digest, dataset)
+    except (_UnhashableError, RuntimeError):
+        # RuntimeError covers running out of recursion on cyclic values.
+        return None
+    return digest.hexdigest()
+
+
+class _UnhashableError(Exception):
+    """
+    Raised for values without a stable representation to hash.
+    """
+    pass
+
+
+def _update_hash(digest, value):
+    """
+    Feed a type-tagged, unambiguous encoding of a value to a hash.
+
+    :param digest:
+        The hash.
+    :type digest:
+        :class:`hashlib.sha256`
+    :param value:
+        The value.
+    :type value:
+        varies
+    :raises:
+        :class:`_UnhashableError` if the value can't be hashed.
+    """
+    for value_types, update in _HASH_ENCODERS:
+        if isinstance(value, value_types):
+            update(digest, value)
+            return
+    _update_object_hash(digest, value)
+
+
+def _update_text_hash(digest, tag, text):
+    """
+    Feed a tagged, length-prefixed text to a hash.
+
+    :param digest:
+        The hash.
+    :type digest:
+        :class:`hashlib.sha256`
+    :param tag:
+        The tag of the type of the value the text encodes.
+    :type tag:
+        `unicode`
+    :param text:
+        The text.
+    :type text:
+        `unicode` or `bytes`
+    """
+    data = text.encode('utf-8') if isinstance(text, six.text_type) else text
+    digest.update('{0}{1}:'.format(tag, len(data)).encode('ascii'))
+    digest.update(data)
+
+
+def _update_sequence_hash(digest, value):
+    """Feed a tuple or list, and its items in order, to a hash."""
+    _update_text_hash(digest, 'T' if isinstance(value, tuple) else 'L', six.text_type(len(value)))
+    for item in value:
+        _update_hash(digest, item)
+
+
+def _update_collection_hash(digest, value):
+    """Feed a dict or set to a hash, whatever the order of its items."""
+    # Sort by the hashes of the items, which don't depend on their order.
+    items = six.iteritems(value) if isinstance(value, dict) else value
+    item_hashes = []
+    for item in items:
+        item_digest = hashlib.sha256()
+        _update_hash(item_digest, item)
+        item_hashes.append(item_digest.hexdigest())
+    _update_text_hash(digest, 'D' if isinstance(value, dict) else 'E', ','.join(sorted(item_hashes)))
+
+
+def _update_args_hash(digest, value):
+    """Feed the args, kwargs and options of a :class:`GentyArgs` to a hash."""
+    _update_text_hash(digest, 'A', '')
+    _update_hash(digest, value.args)
+    _update_hash(digest, value.kwargs)
+    if value.options:
+        # Only hashed when set, so that datasets without options hash
+        # the same as the equivalent tuples.
+        _update_text_hash(digest, 'O', '')
+        _update_hash(digest, value.options)
+
+
+def _update_nested_dataset_hash(digest, value):
+    """Feed the dataprovider and dataset of a :class:`GentyNestedDataset` to a hash."""
+    _update_text_hash(digest, 'P', _get_qualified_name(value.dataprovider))
+    _update_hash(digest, value.dataset)
+
+
+def _update_object_hash(digest, value):
+    """
+    Feed a value of any other type to a hash: numpy arrays by their content,
+    and other objects by their repr or their attributes.
+
+    :raises:
+        :class:`_UnhashableError` if the value can't be hashed.
+    """
+    if hasattr(value, 'dtype') and hasattr(value, 'shape') and hasattr(value, 'tobytes'):
+        # numpy arrays and scalars.
+        _update_text_hash(digest, 'X', '{0}{1}'.format(value.dtype, value.shape))
+        _update_text_hash(digest, 'B', value.tobytes())
+    elif isinstance(value, GentyLazy):
+        raise _UnhashableError(value)
+    elif type(value).__repr__ is not object.__repr__:
+        text = repr(value)
+        if ' at 0x' in text:
+            raise _UnhashableError(value)
+        _update_text_hash(digest, 'R', '{0}:{1}'.format(_get_qualified_name(type(value)), text))
+    elif hasattr(value, '__dict__'):
+        _update_text_hash(digest, 'O', _get_qualified_name(type(value)))
+        _update_hash(digest, vars(value))
+    else:
+        raise _UnhashableError(value)
+
+
+# How to hash values of each type, tried in order before falling back to
+# _update_object_hash. bool comes before int, which it subclasses.
+_HASH_ENCODERS = (
+    ((type(None), bool), lambda digest, value: _update_text_hash(digest, 'C', six.text_type(value))),
+    (six.integer_types, lambda digest, value: _update_text_hash(digest, 'I', six.text_type(value))),
+    (float, lambda digest, value: _update_text_hash(digest, 'F', repr(value))),
+    (six.text_type, lambda digest, value: _update_text_hash(digest, 'S', value)),
+    (six.binary_type, lambda digest, value: _update_text_hash(digest, 'B', value)),
+    ((tuple, list), _update_sequence_hash),
+    ((dict, set, frozenset), _update_collection_hash),
+    (GentyArgs, _update_args_hash),
+    (GentyNestedDataset, _update_nested_dataset_hash),
+    (GentyShared, lambda digest, value: _update_hash(digest, value.resolve())),
+    (memoryview, lambda digest, value: _update_text_hash(digest, 'B', value.tobytes())),
+    (
+        (type, types.FunctionType, types.BuiltinFunctionType),
+        lambda digest, value: _update_text_hash(digest, 'N', _get_qualified_name(value)),
+    ),
+)
+
+
+def _get_qualified_name(value):
+    """
+    :param value:
+        A class or function.
+    :type value:
+        `type` or `function`
+    :return:
+        The module and qualified name of the class or function.
+    :rtype:
+        `unicode`
+    :raises:
+        :class:`_UnhashableError` for lambdas, which share the same name.
+    """
+    name = getattr(value, '__qualname__', None) or getattr(value, '__name__', '')
+    if '<lambda>' in name:
+        raise _UnhashableError(value)
+    return '{0}.{1}'.format(getattr(value, '__module__', None), name)
+
+
+def _get_duplicate_policy():
+    """
+    :return:
+        The policy about duplicate datasets set by the GENTY_DUPLICATES
+        environment variable, 'keep' by default.
+    :rtype:
+        `unicode`
+    :raises:
+        ValueError if the policy is unknown.
+    """
+    policy = os.environ.get(DUPLICATES_ENV_VAR) or 'keep'
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError('Unknown duplicate policy {0!r}. Please pick one of {1}.'.format(
+            policy,
+            ', '.join(DUPLICATE_POLICIES),
+        ))
+    return policy
+
+
+def _is_duplicate_dataset(dataset_names_by_hash, method_name, dataset_name, dataset, duplicate_policy):
+    """
+    Detect a dataset identical to an earlier one, reporting it according to
+    the policy.
+
+    :param dataset_names_by_hash:
+        The names of the earlier datasets of the method and dataprovider,
+        by their hashes. Updated with this dataset.
+    :type dataset_names_by_hash:
+        `dict` of `unicode` to `unicode`
+    :param method_name:
+        Name of the test method.
+    :type method_name:
+        `unicode`
+    :param dataset_name:
+        Name of the dataset.
+    :type dataset_name:
+        `unicode`
+    :param dataset:
+        The dataset.
+    :type dataset:
+        varies
+    :param duplicate_policy:
+        One of 'dedupe', 'warn' or 'error'.
+    :type duplicate_policy:
+        `unicode`
+    :return:
+        Whether to drop the dataset.
+    :rtype:
+        `bool`
+    :raises:
+        ValueError for a duplicate, if the policy is 'error'.
+    """
+    # pylint:disable=too-many-arguments
+    content_hash = dataset_hash(dataset)
+    if content_hash is None:
+        return False
+    first_name = dataset_names_by_hash.setdefault(content_hash, dataset_name)
+    if first_name == dataset_name:
+        return False
+    if duplicate_policy == 'dedupe':
+        return True
+    _report_duplicate(duplicate_policy, 'The datasets {0} and {1} of {2} are identical.'.format(
+        first_name,
+        dataset_name,
+        method_name,
+    ))
+    return False
+
+
+def _report_duplicate(policy, message):
+    """
+    :param policy:
+        The policy about duplicate datasets.
+    :type policy:
+        `unicode`
+    :param message:
+        Description of the duplicate.
+    :type message:
+        `unicode`
+    :raises:
+        ValueError if the policy is 'error'.
+    """
+    if policy == 'error':
+        raise ValueError(message)
+    warnings.warn(message)
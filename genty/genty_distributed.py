@@ -0,0 +1,507 @@
+# coding: utf-8
+
+"""
+Run tests on workers, possibly on other hosts, handed out by a coordinator.
+
+The coordinator listens on a socket, and hands out batches of tests to the
+workers that connect to it, as they ask for more work. Workers load the
+tests from their ids, run them, and send the results back, along with the
+entries they recorded in the genty reports:
+    python -m genty.genty_distributed coordinator --host 0.0.0.0 --allow-remote --port 8765 -s test
+    python -m genty.genty_distributed worker coordinator-host:8765
+"""
+
+from __future__ import absolute_import, unicode_literals
+from collections import deque
+import importlib
+import json
+import socket
+import sys
+import threading
+import unittest
+
+from genty.genty_loader import GentyTestLoader, _iterate_tests
+from genty.genty_report import get_reports, merge_reports
+from genty.genty_suite import _RecordingResult, _build_error_calls, _replay_calls, _serialize_calls
+
+
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_MAX_ATTEMPTS = 2
+DEFAULT_WORKER_TIMEOUT = 600
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+class _Batch(object):
+    """
+    Tests handed out together to a worker.
+    """
+    def __init__(self, tests, attempts=0):
+        super(_Batch, self).__init__()
+        self.tests = tests
+        self.attempts = attempts
+        # The indexes of the tests whose results were reported already.
+        self.completed = set()
+
+    @property
+    def test_ids(self):
+        """Return the ids the worker loads the tests from."""
+        return [test.id() for test in self.tests]
+
+
+class GentyCoordinator(object):
+    """
+    Hands out batches of tests to the workers connecting to it, and collects
+    their results.
+
+    Workers ask for a batch whenever they are done with the previous one, so
+    faster workers take on more batches. The batch of a worker that
+    disconnects, or doesn't respond within 'worker_timeout' seconds, before
+    the results of its batch were reported, is handed out again, up to
+    'max_attempts' times in total, after which its tests are reported as
+    errors. Only the tests whose results weren't reported yet are handed
+    out again.
+    """
+    def __init__(
+            self,
+            tests,
+            host='127.0.0.1',
+            port=0,
+            batch_size=DEFAULT_BATCH_SIZE,
+            max_attempts=DEFAULT_MAX_ATTEMPTS,
+            worker_timeout=DEFAULT_WORKER_TIMEOUT,
+    ):
+        """
+        :param tests:
+            The tests to run. Workers must be able to load them from their
+            ids, e.g. 'module.Class.test_method(dataset)'.
+        :type tests:
+            :class:`TestSuite` or `iterable` of :class:`TestCase`
+        :param host:
+            The interface to listen on.
+        :type host:
+            `unicode`
+        :param port:
+            The port to listen on. Defaults to any free port.
+        :type port:
+            `int`
+        :param batch_size:
+            The number of tests in each batch. Batches only contain tests of
+            the same class, so that class fixtures run once per batch.
+        :type batch_size:
+            `int`
+        :param max_attempts:
+            The number of workers to hand a batch out to before giving up.
+        :type max_attempts:
+            `int`
+        :param worker_timeout:
+            The number of seconds to wait for a worker to report the results
+            of its batch before considering it lost, or None to wait forever.
+        :type worker_timeout:
+            `float` or None
+        """
+        # pylint:disable=too-many-arguments
+        super(GentyCoordinator, self).__init__()
+        self._pending = deque(_build_batches(list(_iterate_tests(tests)), batch_size))
+        self._remaining = len(self._pending)
+        self._max_attempts = max_attempts
+        self._worker_timeout = worker_timeout
+        self._condition = threading.Condition()
+        self._result = None
+        # Listen on IPv4 or IPv6, whichever the host is an address of.
+        family, _, _, _, address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+        self._server = socket.socket(family, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(address)
+        self._server.listen(5)
+        # Wake up regularly while waiting for workers, to notice when done.
+        self._server.settimeout(0.5)
+        self._done = False
+
+    @property
+    def address(self):
+        """Return the host and port workers connect to."""
+        return self._server.getsockname()[:2]
+
+    def run(self, result):
+        """
+        Serve the tests to workers until all of them ran, reporting their
+        results as they come in.
+
+        :param result:
+            The result to report to.
+        :type result:
+            :class:`TestResult`
+        :return:
+            The result.
+        :rtype:
+            :class:`TestResult`
+        """
+        self._result = result
+        accept_thread = threading.Thread(target=self._accept_workers)
+        accept_thread.daemon = True
+        accept_thread.start()
+        try:
+            with self._condition:
+                while self._remaining:
+                    self._condition.wait(1)
+        finally:
+            self._done = True
+            accept_thread.join()
+            self._server.close()
+        return result
+
+    def _accept_workers(self):
+        """Start serving each worker that connects, until the server is closed."""
+        while not self._done:
+            try:
+                connection, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            connection.settimeout(self._worker_timeout)
+            worker_thread = threading.Thread(target=self._serve_worker, args=(connection,))
+            worker_thread.daemon = True
+            worker_thread.start()
+
+    def _serve_worker(self, connection):
+        """
+        Hand out batches to a worker, and collect their results.
+
+        :param connection:
+            The connection to the worker.
+        :type connection:
+            :class:`socket.socket`
+        """
+        batch = None
+        reader = connection.makefile('rb')
+        try:
+            for line in reader:
+                message = json.loads(line.decode('utf-8'))
+                if message['type'] == 'results' and batch is not None:
+                    self._complete(batch, message['calls'], message.get('reports'))
+                    batch = None
+                batch = self._take_batch()
+                if batch is None:
+                    _send_message(connection, {'type': 'done'})
+                    break
+                _send_message(connection, {'type': 'batch', 'tests': batch.test_ids})
+        except (socket.error, OSError, ValueError, KeyError):
+            pass
+        finally:
+            if batch is not None:
+                self._reassign(batch)
+            reader.close()
+            connection.close()
+
+    def _take_batch(self):
+        """
+        :return:
+            The next batch to hand out, waiting for one while batches handed
+            out to other workers may still be reassigned, or None once all
+            the batches completed.
+        :rtype:
+            :class:`_Batch` or None
+        """
+        with self._condition:
+            while not self._pending and self._remaining:
+                self._condition.wait()
+            if not self._pending:
+                return None
+            batch = self._pending.popleft()
+            batch.attempts += 1
+            return batch
+
+    def _complete(self, batch, calls, reports=None):
+        """
+        Report the results of a batch, and record the report entries the
+        worker recorded while running it.
+
+        :param batch:
+            The batch.
+        :type batch:
+            :class:`_Batch`
+        :param calls:
+            The calls its tests made to their result, as sent by the worker.
+        :type calls:
+            `list`
+        :param reports:
+            The report entries, as sent by the worker.
+        :type reports:
+            `dict` or None
+        """
+        with self._condition:
+            if reports:
+                merge_reports(reports)
+            for call in calls:
+                name, index, _ = call
+                if index in batch.completed:
+                    continue
+                _replay_calls(batch.tests, [call], self._result)
+                if name == 'stopTest':
+                    batch.completed.add(index)
+            self._remaining -= 1
+            self._condition.notify_all()
+
+    def _reassign(self, batch):
+        """
+        Hand out the tests of the batch of a lost worker whose results
+        weren't reported yet again, or report them as errors if the batch
+        was handed out too many times already.
+
+        :param batch:
+            The batch.
+        :type batch:
+            :class:`_Batch`
+        """
+        with self._condition:
+            remaining = _Batch(
+                [test for index, test in enumerate(batch.tests) if index not in batch.completed],
+                batch.attempts,
+            )
+        if not remaining.tests:
+            self._complete(remaining, [])
+        elif remaining.attempts >= self._max_attempts:
+            self._complete(remaining, _build_error_calls(
+                len(remaining.tests),
+                'Lost the worker running this test, {0} times.'.format(remaining.attempts),
+            ))
+        else:
+            with self._condition:
+                self._pending.appendleft(remaining)
+                self._condition.notify_all()
+
+
+def run_worker(address, loader=None):
+    """
+    Run the tests handed out by a coordinator, until it has none left.
+
+    :param address:
+        The host and port of the coordinator.
+    :type address:
+        `tuple` of (`unicode`, `int`)
+    :param loader:
+        The loader used to load tests from their ids. Defaults to a
+        :class:`GentyTestLoader`.
+    :type loader:
+        :class:`TestLoader` or None
+    :return:
+        The number of tests run.
+    :rtype:
+        `int`
+    """
+    loader = loader or GentyTestLoader()
+    test_classes = {}
+    sent_reports = {}
+    tests_run = 0
+    connection = socket.create_connection(tuple(address))
+    reader = connection.makefile('rb')
+    try:
+        _send_message(connection, {'type': 'ready'})
+        for line in reader:
+            message = json.loads(line.decode('utf-8'))
+            if message['type'] != 'batch':
+                break
+            tests = [_load_test(loader, test_id, test_classes) for test_id in message['tests']]
+            result = _RecordingResult()
+            unittest.TestSuite(tests).run(result)
+            tests_run += len(tests)
+            reports = get_reports(since=sent_reports)
+            for kind, entries in reports.items():
+                sent_reports.setdefault(kind, {}).update(entries)
+            _send_message(connection, {
+                'type': 'results',
+                'calls': _serialize_calls(tests, result.calls),
+                'reports': reports,
+            })
+    finally:
+        reader.close()
+        connection.close()
+    return tests_run
+
+
+def _build_batches(tests, batch_size):
+    """
+    :param tests:
+        The tests to run.
+    :type tests:
+        `list` of :class:`TestCase`
+    :param batch_size:
+        The maximum number of tests in a batch.
+    :type batch_size:
+        `int`
+    :return:
+        The consecutive tests, in batches of tests of the same class.
+    :rtype:
+        `list` of :class:`_Batch`
+    """
+    batches = []
+    for test in tests:
+        batch = batches[-1] if batches else None
+        if batch is None or len(batch.tests) >= batch_size or type(batch.tests[0]) is not type(test):
+            batch = _Batch([])
+            batches.append(batch)
+        batch.tests.append(test)
+    return batches
+
+
+class _UnloadableTest(unittest.TestCase):
+    """
+    Stands in for a test that a worker couldn't load from its id, and
+    reports why as an error.
+    """
+    def __init__(self, test_id, reason):
+        super(_UnloadableTest, self).__init__()
+        self._test_id = test_id
+        self._reason = reason
+
+    def id(self):
+        return self._test_id
+
+    def runTest(self):  # pylint:disable=invalid-name
+        raise LookupError('Could not load test {0}: {1}'.format(self._test_id, self._reason))
+
+
+def _load_test(loader, test_id, test_classes):
+    """
+    :param loader:
+        The loader to fall back to, for ids that don't name a test method of
+        a test class at the top level of a module.
+    :type loader:
+        :class:`TestLoader`
+    :param test_id:
+        The id of a test, e.g. 'module.Class.test_method(dataset)'.
+    :type test_id:
+        `unicode`
+    :param test_classes:
+        The test classes looked up so far, by module and class name. Tests
+        are instantiated from their class directly, without loading every
+        test of the class.
+    :type test_classes:
+        `dict`
+    :return:
+        The test. If it can't be loaded, a test reporting why.
+    :rtype:
+        :class:`TestCase`
+    """
+    parts = test_id.rsplit('.', 2)
+    if len(parts) == 3:
+        module_name, class_name, method_name = parts
+        key = (module_name, class_name)
+        if key not in test_classes:
+            try:
+                test_classes[key] = getattr(importlib.import_module(module_name), class_name)
+            except (ImportError, AttributeError, ValueError):
+                test_classes[key] = None
+        test_class = test_classes[key]
+        if isinstance(test_class, type) and issubclass(test_class, unittest.TestCase) \
+                and callable(getattr(test_class, method_name, None)):
+            return test_class(method_name)
+    try:
+        tests = list(_iterate_tests(loader.loadTestsFromName(test_id)))
+    except Exception as error:  # pylint:disable=broad-except
+        return _UnloadableTest(test_id, repr(error))
+    for test in tests:
+        if test.id() == test_id:
+            return test
+    errors = getattr(loader, 'errors', None)
+    return _UnloadableTest(test_id, errors[-1] if errors else 'no test has this id.')
+
+
+def _send_message(connection, message):
+    """
+    :param connection:
+        The connection to send the message on.
+    :type connection:
+        :class:`socket.socket`
+    :param message:
+        The message, sent as a line of JSON.
+    :type message:
+        `dict`
+    """
+    connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def _is_loopback(host):
+    """
+    :param host:
+        The interface to listen on.
+    :type host:
+        `unicode`
+    :return:
+        Whether only this host can connect to it.
+    :rtype:
+        `bool`
+    """
+    return host in LOOPBACK_HOSTS or host.startswith('127.')
+
+
+def main(argv=None):
+    """
+    Run a coordinator or a worker from the command line:
+        coordinator [--host HOST [--allow-remote]] [--port PORT] [--batch-size N] [--worker-timeout SECONDS]
+                    [-s DIR] [TEST_NAME ...]
+        worker HOST:PORT
+
+    The coordinator serves the named tests, or else the tests discovered in
+    the start directory. It only listens on the loopback interface, unless
+    --allow-remote lets it listen on another host, for workers on other
+    hosts.
+
+    :param argv:
+        The command line arguments. Defaults to sys.argv[1:].
+    :type argv:
+        `list` of `unicode` or None
+    :return:
+        The exit code.
+    :rtype:
+        `int`
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m genty.genty_distributed')
+    subparsers = parser.add_subparsers(dest='role')
+    coordinator_parser = subparsers.add_parser('coordinator')
+    coordinator_parser.add_argument('--host', default='127.0.0.1')
+    coordinator_parser.add_argument('--allow-remote', action='store_true')
+    coordinator_parser.add_argument('--port', type=int, default=0)
+    coordinator_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    coordinator_parser.add_argument('--worker-timeout', type=float, default=DEFAULT_WORKER_TIMEOUT)
+    coordinator_parser.add_argument('-s', '--start-directory', default='.')
+    coordinator_parser.add_argument('tests', nargs='*')
+    worker_parser = subparsers.add_parser('worker')
+    worker_parser.add_argument('address')
+    arguments = parser.parse_args(argv)
+    if arguments.role == 'coordinator' and not arguments.allow_remote and not _is_loopback(arguments.host):
+        parser.error('--host {0} accepts workers from other hosts, pass --allow-remote to allow it.'.format(
+            arguments.host,
+        ))
+
+    if arguments.role == 'worker':
+        host, port = arguments.address.rsplit(':', 1)
+        run_worker((host, int(port)))
+        return 0
+
+    loader = GentyTestLoader()
+    if arguments.tests:
+        tests = loader.loadTestsFromNames(arguments.tests)
+    else:
+        tests = loader.discover(arguments.start_directory)
+    coordinator = GentyCoordinator(
+        tests,
+        arguments.host,
+        arguments.port,
+        arguments.batch_size,
+        worker_timeout=arguments.worker_timeout,
+    )
+    sys.stderr.write('Waiting for workers on {0}:{1}\n'.format(*coordinator.address))
+    result = unittest.TextTestResult(
+        unittest.runner._WritelnDecorator(sys.stderr),  # pylint:disable=protected-access
+        True,
+        1,
+    )
+    coordinator.run(result)
+    result.printErrors()
+    sys.stderr.write('\nRan {0} tests\n'.format(result.testsRun))
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
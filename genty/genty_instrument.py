@@ -0,0 +1,616 @@
+# coding: utf-8
+
+from __future__ import absolute_import, unicode_literals
+import atexit
+from collections import namedtuple
+import cProfile
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import threading
+from unittest import SkipTest
+import warnings
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from .genty_report import get_entry, get_report, record, set_sort_key
+from .private import to_json
+from .private.timing import ns_to_seconds, perf_counter_ns
+
+
+TRACEMALLOC_ENV_VAR = 'GENTY_TRACEMALLOC'
+DURATIONS_ENV_VAR = 'GENTY_DURATIONS'
+PROFILE_DIR_ENV_VAR = 'GENTY_PROFILE_DIR'
+PROFILE_THRESHOLD_ENV_VAR = 'GENTY_PROFILE_THRESHOLD'
+PROFILE_MODE_ENV_VAR = 'GENTY_PROFILE_MODE'
+RUSAGE_ENV_VAR = 'GENTY_RUSAGE'
+PROFILE_MODES = ('rerun', 'always')
+DEFAULT_TOP_SITES = 10
+DEFAULT_PROFILE_THRESHOLD_MS = 500
+
+# Characters that can't appear in file names on some platforms.
+_UNSAFE_FILE_NAME_CHARACTERS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+_MAX_FILE_NAME_LENGTH = 150
+
+# Counters of resource.getrusage recorded per test, and their names in the
+# 'rusage' report.
+_RUSAGE_COUNTERS = (
+    ('ru_utime', 'user_seconds'),
+    ('ru_stime', 'system_seconds'),
+    ('ru_nvcsw', 'voluntary_context_switches'),
+    ('ru_nivcsw', 'involuntary_context_switches'),
+    ('ru_inblock', 'block_inputs'),
+    ('ru_oublock', 'block_outputs'),
+    ('ru_majflt', 'major_page_faults'),
+)
+# ru_maxrss is in kilobytes, except on macOS where it is in bytes.
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+_rusage_totals_lock = threading.Lock()
+
+# Weight of the latest run in the smoothed duration stored in the history.
+_DURATION_SMOOTHING = 0.5
+
+set_sort_key('memory', lambda entry: -entry['peak_bytes'])
+
+
+# The instrumentation enabled through environment variables, as read by
+# :func:`_get_instrument_settings`.
+_InstrumentSettings = namedtuple(
+    '_InstrumentSettings',
+    ['top_sites', 'durations', 'rusage', 'profile'],
+)
+
+
+def _get_instrument_settings():
+    """
+    Read the instrumentation enabled through environment variables. @genty
+    reads them once per decorated class, rather than once per generated
+    test.
+
+    :return:
+        The instrumentation settings, or None if no instrumentation is
+        enabled.
+    :rtype:
+        :class:`_InstrumentSettings` or None
+    """
+    rusage = bool(os.environ.get(RUSAGE_ENV_VAR))
+    if rusage and resource is None:
+        warnings.warn(
+            '{0} is set, but resource is not available on this platform.'.format(
+                RUSAGE_ENV_VAR,
+            )
+        )
+        rusage = False
+    settings = _InstrumentSettings(
+        top_sites=_get_tracemalloc_top_sites(),
+        durations=bool(os.environ.get(DURATIONS_ENV_VAR)),
+        rusage=rusage,
+        profile=_get_profile_settings(),
+    )
+    if settings == (None, False, False, None):
+        return None
+    return settings
+
+
+def _instrument_test_method(test_method, test_info, settings, concurrent=False, body_method=None):
+    """
+    Wrap a generated test method with the instrumentation enabled through
+    environment variables. Instrumentation is opt-in: when none is enabled,
+    the test method is returned as is, so it costs nothing at run time.
+
+    Setting GENTY_TRACEMALLOC records, per generated test, the peak and net
+    number of bytes allocated by the test, along with the top allocation
+    sites, in the 'memory' report of :mod:`genty.genty_report`. The report
+    is sorted by decreasing peak. The value of the variable is the number of
+    allocation sites to keep (defaults to 10 for any non-numeric value).
+
+    Setting GENTY_DURATIONS to the path of a JSON file records the duration
+    of each generated test, and whether it failed, in the 'duration' report.
+    At exit, they are merged into the history kept in that file, which
+    :mod:`genty.genty_loader` uses to order tests.
+
+    Setting GENTY_PROFILE_DIR profiles the generated tests that take longer
+    than GENTY_PROFILE_THRESHOLD milliseconds (500 by default) with
+    cProfile, and dumps their stats to that directory, in files named after
+    the test id with a '.pstats' extension. With GENTY_PROFILE_MODE=rerun,
+    the default, a slow test body runs once more under the profiler, so
+    fast tests pay no profiling overhead, nor do tests that failed. The
+    second run calls tearDown and setUp first, so that it starts from fresh
+    fixtures, and only runs the body bound to its dataset, without the
+    load, repeats, budget or benchmark set on the test. With
+    GENTY_PROFILE_MODE=always, every test runs under the profiler, and the
+    stats are kept for the slow ones only. The dumped files are listed in
+    the 'profile' report.
+
+    Setting GENTY_RUSAGE records, per generated test, the user and system
+    CPU time, context switches, block I/O operations and major page faults
+    the test caused, as measured by resource.getrusage, along with the
+    maximum resident set size of the process, in the 'rusage' report. The
+    counters are also summed per test method, overall and per dataset, in
+    the 'rusage_by_method' report. They are counted for the thread running
+    the test where the platform supports it, and else for the process. Tests
+    that run their body on several threads, with @genty_load or
+    @genty_repeat(concurrency=...), are counted for the whole process,
+    including any other tests running at the same time. Other threads that
+    a test starts itself aren't counted, nor are processes it forks.
+
+    The environment is read when @genty decorates the class, by
+    :func:`_get_instrument_settings`.
+
+    :param test_method:
+        The fabricated test method.
+    :type test_method:
+        `function`
+    :param test_info:
+        Description of the generated test.
+    :type test_info:
+        :class:`GentyTestInfo`
+    :param settings:
+        The instrumentation enabled for this run, or None if none is.
+    :type settings:
+        :class:`_InstrumentSettings` or None
+    :param concurrent:
+        Whether the test method runs the test body on several threads.
+    :type concurrent:
+        `bool`
+    :param body_method:
+        The test body bound to its dataset, to run once more under the
+        profiler, or None to run the test method itself.
+    :type body_method:
+        `function` or None
+    :return:
+        Return an unbound function that will become a test method
+    :rtype:
+        `function`
+    """
+    # pylint:disable=too-many-arguments
+    if settings is None:
+        return test_method
+    rerun_method = body_method or test_method
+    if settings.top_sites is not None:
+        test_method = _build_tracemalloc_method(test_method, test_info, settings.top_sites)
+    if settings.durations:
+        test_method = _build_duration_method(test_method, test_info)
+    if settings.rusage:
+        test_method = _build_rusage_method(test_method, test_info, concurrent)
+    # Profile outermost, so that the other instrumentation doesn't measure
+    # slow tests running once more under the profiler.
+    if settings.profile is not None:
+        test_method = _build_profile_method(
+            test_method,
+            rerun_method,
+            test_info,
+            *settings.profile
+        )
+    return test_method
+
+
+def _get_tracemalloc_top_sites():
+    """
+    :return:
+        The number of allocation sites to report, or None if memory
+        instrumentation is disabled.
+    :rtype:
+        `int` or None
+    """
+    value = os.environ.get(TRACEMALLOC_ENV_VAR, '')
+    if value in ('', '0'):
+        return None
+    if tracemalloc is None:
+        warnings.warn(
+            '{0} is set, but tracemalloc is not available in this Python.'.format(
+                TRACEMALLOC_ENV_VAR,
+            )
+        )
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return DEFAULT_TOP_SITES
+
+
+def _get_profile_settings():
+    """
+    :return:
+        The directory to dump profiles to, the threshold in seconds above
+        which tests are profiled, and the profiling mode, or None if
+        profiling is disabled.
+    :rtype:
+        `tuple` of (`unicode`, `float`, `unicode`) or None
+    """
+    directory = os.environ.get(PROFILE_DIR_ENV_VAR)
+    if not directory:
+        return None
+    threshold_ms = DEFAULT_PROFILE_THRESHOLD_MS
+    try:
+        threshold_ms = float(os.environ.get(PROFILE_THRESHOLD_ENV_VAR) or threshold_ms)
+    except ValueError:
+        warnings.warn('{0} is not a number of milliseconds, using {1}.'.format(
+            PROFILE_THRESHOLD_ENV_VAR,
+            threshold_ms,
+        ))
+    mode = os.environ.get(PROFILE_MODE_ENV_VAR) or PROFILE_MODES[0]
+    if mode not in PROFILE_MODES:
+        warnings.warn('Unknown {0} {1!r}, using {2!r}.'.format(
+            PROFILE_MODE_ENV_VAR,
+            mode,
+            PROFILE_MODES[0],
+        ))
+        mode = PROFILE_MODES[0]
+    return directory, threshold_ms / 1000, mode
+
+
+def _build_profile_method(method, rerun_method, test_info, directory, threshold, mode):
+    """
+    Return a fabricated method that profiles 'method' with cProfile when it
+    is slow, and dumps the stats to a file.
+
+    :param method:
+        The test method to profile.
+    :type method:
+        `callable`
+    :param rerun_method:
+        The test body to run once more under the profiler, in 'rerun'
+        mode, without the instrumentation and decorators wrapping 'method'.
+    :type rerun_method:
+        `callable`
+    :param test_info:
+        Description of the generated test.
+    :type test_info:
+        :class:`GentyTestInfo`
+    :param directory:
+        The directory to dump the stats to.
+    :type directory:
+        `unicode`
+    :param threshold:
+        The duration in seconds above which to keep a profile.
+    :type threshold:
+        `float`
+    :param mode:
+        'rerun' to run the method once more under the profiler when it
+        passed but was slow, or 'always' to always run it under the
+        profiler.
+    :type mode:
+        `unicode`
+    :return:
+        Return an unbound function that will become a test method
+    :rtype:
+        `function`
+    """
+    # pylint:disable=too-many-arguments
+    def dump_stats(profiler, duration):
+        path = _build_profile_path(directory, test_info.test_id)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        profiler.dump_stats(path)
+        record('profile', test_info.test_id, {'duration': duration, 'path': path})
+
+    def test_method_wrapper(my_self):
+        if mode == 'always':
+            profiler = cProfile.Profile()
+            start = perf_counter_ns()
+            try:
+                return profiler.runcall(method, my_self)
+            finally:
+                duration = ns_to_seconds(perf_counter_ns() - start)
+                if duration >= threshold:
+                    dump_stats(profiler, duration)
+
+        start = perf_counter_ns()
+        result = method(my_self)
+        duration = ns_to_seconds(perf_counter_ns() - start)
+        if duration >= threshold:
+            try:
+                _reset_fixtures(my_self)
+            except Exception:  # pylint:disable=broad-except
+                # Without fresh fixtures, the body can't run again.
+                return result
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(rerun_method, my_self)
+            except Exception:  # pylint:disable=broad-except
+                # The outcome of the test is that of its first run.
+                pass
+            dump_stats(profiler, duration)
+        return result
+
+    return test_method_wrapper
+
+
+def _reset_fixtures(test):
+    """
+    Tear down the fixtures of a test that just ran, and set them up again,
+    so that its body can run once more. The test runner tears them down
+    once the test is over, as usual.
+
+    :param test:
+        The test instance.
+    :type test:
+        :class:`TestCase`
+    """
+    tear_down = getattr(test, 'tearDown', None)
+    if tear_down is not None:
+        tear_down()
+    set_up = getattr(test, 'setUp', None)
+    if set_up is not None:
+        set_up()
+
+
+def _build_profile_path(directory, test_id):
+    """
+    :param directory:
+        The directory to dump the stats to.
+    :type directory:
+        `unicode`
+    :param test_id:
+        Stable identifier of the generated test.
+    :type test_id:
+        `unicode`
+    :return:
+        The path of the file to dump the stats of the test to, named after
+        the test id. Long ids are shortened, keeping them unique with a hash.
+    :rtype:
+        `unicode`
+    """
+    name = _UNSAFE_FILE_NAME_CHARACTERS.sub('_', test_id)
+    if len(name) > _MAX_FILE_NAME_LENGTH:
+        digest = hashlib.sha1(test_id.encode('utf-8')).hexdigest()[:12]
+        name = '{0}-{1}'.format(name[:_MAX_FILE_NAME_LENGTH], digest)
+    return os.path.join(directory, name + '.pstats')
+
+
+def _build_tracemalloc_method(method, test_info, top_sites):
+    """
+    Return a fabricated method that traces the memory allocations of
+    'method' and records them in the 'memory' report.
+
+    :param method:
+        The test method to trace.
+    :type method:
+        `callable`
+    :param test_info:
+        Description of the generated test.
+    :type test_info:
+        :class:`GentyTestInfo`
+    :param top_sites:
+        The number of allocation sites to report.
+    :type top_sites:
+        `int`
+    :return:
+        Return an unbound function that will become a test method
+    :rtype:
+        `function`
+    """
+    ignored_files = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    )
+
+    def test_method_wrapper(my_self):
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot().filter_traces(ignored_files)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        size_before = tracemalloc.get_traced_memory()[0]
+        try:
+            return method(my_self)
+        finally:
+            size_after, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(ignored_files)
+            if not was_tracing:
+                tracemalloc.stop()
+            top_stats = after.compare_to(before, 'lineno')[:top_sites]
+            record('memory', test_info.test_id, {
+                'method': test_info.method_name,
+                'dataset': test_info.dataset_name,
+                'peak_bytes': max(peak - size_before, 0),
+                'net_bytes': size_after - size_before,
+                'top_sites': [
+                    {
+                        'site': '{0}:{1}'.format(
+                            stat.traceback[0].filename,
+                            stat.traceback[0].lineno,
+                        ),
+                        'size_diff_bytes': stat.size_diff,
+                        'count_diff': stat.count_diff,
+                    }
+                    for stat in top_stats
+                ],
+            })
+
+    return test_method_wrapper
+
+
+def _build_duration_method(method, test_info):
+    """
+    Return a fabricated method that records the duration and outcome of
+    'method' in the 'duration' report.
+
+    :param method:
+        The test method to time.
+    :type method:
+        `callable`
+    :param test_info:
+        Description of the generated test.
+    :type test_info:
+        :class:`GentyTestInfo`
+    :return:
+        Return an unbound function that will become a test method
+    :rtype:
+        `function`
+    """
+    def test_method_wrapper(my_self):
+        start = perf_counter_ns()
+        failed = True
+        try:
+            result = method(my_self)
+            failed = False
+            return result
+        except SkipTest:
+            failed = False
+            raise
+        finally:
+            record('duration', test_info.test_id, {
+                'duration': ns_to_seconds(perf_counter_ns() - start),
+                'failed': failed,
+            })
+
+    return test_method_wrapper
+
+
+def _build_rusage_method(method, test_info, concurrent=False):
+    """
+    Return a fabricated method that records the resources used by 'method'
+    in the 'rusage' and 'rusage_by_method' reports.
+
+    :param method:
+        The test method to measure.
+    :type method:
+        `callable`
+    :param test_info:
+        Description of the generated test.
+    :type test_info:
+        :class:`GentyTestInfo`
+    :param concurrent:
+        Whether 'method' runs the test body on several threads, which are
+        only all counted for the whole process.
+    :type concurrent:
+        `bool`
+    :return:
+        Return an unbound function that will become a test method
+    :rtype:
+        `function`
+    """
+    who = resource.RUSAGE_SELF
+    if not concurrent:
+        who = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+    method_id = '{0}.{1}'.format(test_info.test_id.rsplit('.', 1)[0], test_info.method_name)
+
+    def test_method_wrapper(my_self):
+        before = resource.getrusage(who)
+        try:
+            return method(my_self)
+        finally:
+            after = resource.getrusage(who)
+            counters = dict(
+                (name, getattr(after, field) - getattr(before, field))
+                for field, name in _RUSAGE_COUNTERS
+            )
+            entry = dict(counters)
+            entry['method'] = test_info.method_name
+            entry['dataset'] = test_info.dataset_name
+            entry['max_rss_bytes'] = after.ru_maxrss * _MAXRSS_UNIT
+            record('rusage', test_info.test_id, entry)
+            _add_rusage_totals(method_id, test_info.dataset_name, counters)
+
+    return test_method_wrapper
+
+
+def _add_rusage_totals(method_id, dataset_name, counters):
+    """
+    Add the resources used by a test to the totals of its method, kept in
+    place in the 'rusage_by_method' report, so that adding them doesn't
+    depend on the number of datasets of the method.
+
+    :param method_id:
+        Identifier of the test method, e.g. 'my_module.MyTests.test_something'.
+    :type method_id:
+        `unicode`
+    :param dataset_name:
+        The name of the dataset of the test, or None.
+    :type dataset_name:
+        `unicode` or None
+    :param counters:
+        The resources used by the test.
+    :type counters:
+        `dict`
+    """
+    with _rusage_totals_lock:
+        totals = get_entry('rusage_by_method', method_id)
+        if totals is None:
+            totals = {'runs': 0, 'datasets': {}}
+            record('rusage_by_method', method_id, totals)
+        dataset_totals = totals['datasets'].setdefault(dataset_name or '', {'runs': 0})
+        for current_totals in (totals, dataset_totals):
+            current_totals['runs'] += 1
+            for name, value in counters.items():
+                current_totals[name] = current_totals.get(name, 0) + value
+
+
+def load_durations(path):
+    """
+    Load a history of test durations.
+
+    :param path:
+        Path of the history file.
+    :type path:
+        `unicode`
+    :return:
+        For each test id, its smoothed 'duration' in seconds, whether it
+        'failed' in its latest run, and the number of 'runs' recorded.
+        Empty if the file doesn't exist.
+    :rtype:
+        `dict` of `unicode` to `dict`
+    """
+    if not os.path.exists(path):
+        return {}
+    with io.open(path, encoding='utf-8') as history_file:
+        return json.load(history_file)
+
+
+def save_durations(path):
+    """
+    Merge the durations recorded in this run into a history file.
+
+    :param path:
+        Path of the history file.
+    :type path:
+        `unicode`
+    """
+    durations = get_report('duration')
+    if not durations:
+        return
+    history = load_durations(path)
+    for test_id, entry in durations.items():
+        previous = history.get(test_id)
+        duration = entry['duration']
+        runs = 1
+        if previous:
+            duration = (
+                _DURATION_SMOOTHING * duration +
+                (1 - _DURATION_SMOOTHING) * previous['duration']
+            )
+            runs += previous['runs']
+        history[test_id] = {
+            'duration': duration,
+            'failed': entry['failed'],
+            'runs': runs,
+        }
+    with io.open(path, 'w', encoding='utf-8') as history_file:
+        history_file.write(to_json(history))
+
+
+def _save_durations_from_environment():
+    """Save the durations if a history file has been configured."""
+    path = os.environ.get(DURATIONS_ENV_VAR)
+    if path:
+        save_durations(path)
+
+
+atexit.register(_save_durations_from_environment)
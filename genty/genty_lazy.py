@@ -0,0 +1,135 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import functools
+import threading
+
+from .genty_args import GentyArgs
+from .private import format_arg, format_kwarg
+
+
+class GentyLazy(object):
+    """
+    Store a factory building a dataset when the generated test runs.
+    """
+    def __init__(self, factory, label=None, cache=True):
+        super(GentyLazy, self).__init__()
+        self._factory = factory
+        self._label = label or _build_label(factory)
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._has_value = False
+        self._value = None
+
+    @property
+    def factory(self):
+        """Return the callable that builds the dataset."""
+        return self._factory
+
+    @property
+    def label(self):
+        """Return the name identifying the dataset in test names."""
+        return self._label
+
+    def resolve(self):
+        """
+        Build the dataset by calling the factory, or return the cached
+        dataset if it was already built.
+
+        :return:
+            The dataset. A value that is neither a tuple nor a
+            :class:`GentyArgs` is turned into a 1-tuple, like values passed
+            directly to @genty_dataset.
+        :rtype:
+            `tuple` or :class:`GentyArgs`
+        """
+        if not self._cache:
+            return self._build()
+        with self._lock:
+            if not self._has_value:
+                self._value = self._build()
+                self._has_value = True
+            return self._value
+
+    def _build(self):
+        """
+        :return:
+            The dataset returned by the factory.
+        :rtype:
+            `tuple` or :class:`GentyArgs`
+        """
+        dataset = self._factory()
+        if not isinstance(dataset, (tuple, GentyArgs)):
+            dataset = (dataset,)
+        return dataset
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, self._label)
+
+
+def _build_label(factory):
+    """
+    :param factory:
+        Callable taking no arguments and returning the dataset.
+    :type factory:
+        `callable`
+    :return:
+        A name for the dataset that stays the same across runs: the name of
+        the factory, e.g. 'load_schema', or for a functools.partial object,
+        the name of its function followed by its arguments, e.g.
+        "load_schema('big', strict=True)".
+    :rtype:
+        `unicode`
+    """
+    if isinstance(factory, functools.partial):
+        arguments = [format_arg(value) for value in factory.args]
+        arguments.extend(
+            format_kwarg(key, value)
+            for key, value in sorted((factory.keywords or {}).items())
+        )
+        return '{0}({1})'.format(_build_label(factory.func), ', '.join(arguments))
+    # Name callable objects after their class, as their repr may change
+    # from one run to the next.
+    return getattr(factory, '__name__', None) or type(factory).__name__
+
+
+def genty_lazy(factory, label=None, cache=True):
+    """
+    Used to pass a dataset to @genty_dataset that is only built when the
+    generated test actually runs.
+
+    Arguments to @genty_dataset are evaluated when the test module is
+    imported. Wrapping an expensive dataset in genty_lazy defers building
+    it until the test using it runs, so that tests which are filtered out
+    never pay for it:
+        @genty_dataset(
+            genty_lazy(load_big_schema, 'big_schema'),
+            small_schema=genty_lazy(load_small_schema),
+        )
+        def test_validate(self, schema):
+            ...
+    produces tests named
+        test_validate(big_schema) and
+        test_validate(small_schema)
+
+    The factory returns the dataset: a tuple, a :class:`GentyArgs` or a
+    single value, like the arguments to @genty_dataset.
+
+    :param factory:
+        Callable taking no arguments and returning the dataset.
+    :type factory:
+        `callable`
+    :param label:
+        The name identifying the dataset in test names, when passed as an
+        unnamed dataset. Defaults to the name of the factory. For
+        functools.partial objects, it is followed by their arguments, and
+        other callables without a name are named after their class.
+    :type label:
+        `unicode` or None
+    :param cache:
+        Whether to build the dataset once and reuse it, e.g. across repeats,
+        instead of building it each time a test using it runs.
+    :type cache:
+        `bool`
+    """
+    return GentyLazy(factory, label, cache)
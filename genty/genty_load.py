@@ -0,0 +1,181 @@
+# coding: utf-8
+
+from __future__ import division, unicode_literals
+from collections import namedtuple
+import itertools
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+import traceback
+from unittest import SkipTest
+
+from .genty_report import record
+from .private.timing import NANOSECONDS_PER_SECOND, ns_to_seconds, perf_counter_ns, percentile
+
+
+_LoadSettings = namedtuple('_LoadSettings', ['rate', 'duration', 'workers'])
+
+_PERCENTILES = (
+    ('p50', 0.5),
+    ('p90', 0.9),
+    ('p99', 0.99),
+    ('p99.9', 0.999),
+    ('p99.99', 0.9999),
+)
+
+
+def genty_load(rate, duration, workers=8):
+    """
+    To use in conjunction with a TestClass wrapped with @genty.
+
+    Drives the body of the wrapped test as a load scenario: inside each
+    generated test, the body is called 'rate' times per second for
+    'duration' seconds, by a pool of 'workers' threads sharing the same
+    TestCase instance. Combined with @genty_dataset, each dataset becomes
+    its own scenario:
+        @genty_load(rate=200, duration=10, workers=16)
+        @genty_dataset(small=(SMALL_PAYLOAD,), large=(LARGE_PAYLOAD,))
+        def test_upload(self, payload):
+            self.client.upload(payload)
+
+    Calls are scheduled open-loop: the n-th call is due 'n / rate' seconds
+    after the start, whether or not earlier calls have completed, and its
+    latency is measured from when it was due. A slow call therefore also
+    counts against the calls queued behind it, instead of silently lowering
+    the rate (coordinated omission). Use enough workers to keep up with the
+    rate.
+
+    The achieved throughput and the latency percentiles (p50 to p99.99 and
+    max, in nanoseconds) are recorded per generated test in the 'load'
+    report of :mod:`genty.genty_report`. The test fails if any call fails,
+    and is skipped as soon as a call raises SkipTest.
+
+    The dataprovider is called, and resources are checked out, once per
+    generated test: all the calls of the scenario share them.
+
+    :param rate:
+        The target number of calls per second.
+    :type rate:
+        `float`
+    :param duration:
+        The number of seconds to generate load for.
+    :type duration:
+        `float`
+    :param workers:
+        The number of threads making calls.
+    :type workers:
+        `int`
+    """
+    if rate <= 0:
+        raise ValueError("Can't have a rate of {0}. Please pick a value > 0.".format(rate))
+    if duration <= 0:
+        raise ValueError(
+            "Can't have a duration of {0}. Please pick a value > 0.".format(duration)
+        )
+    if workers < 1:
+        raise ValueError(
+            "Can't have {0} workers. Please pick a value >= 1.".format(workers)
+        )
+    settings = _LoadSettings(rate, duration, workers)
+
+    def wrap(test_method):
+        test_method.genty_load = settings
+        return test_method
+    return wrap
+
+
+def _build_load_method(method, test_id, settings):
+    """
+    Return a fabricated method that drives 'method' at the configured rate
+    and records its throughput and latencies.
+
+    :param method:
+        The underlying test function to drive, taking the test instance and
+        the arguments of the test.
+    :type method:
+        `callable`
+    :param test_id:
+        Stable identifier of the generated test, used for reporting.
+    :type test_id:
+        `unicode`
+    :param settings:
+        How to generate the load.
+    :type settings:
+        :class:`_LoadSettings`
+    :return:
+        A function taking the test instance and the arguments of the test.
+    :rtype:
+        `function`
+    """
+    total_calls = max(int(settings.rate * settings.duration), 1)
+    interval_ns = NANOSECONDS_PER_SECOND / settings.rate
+
+    def test_method_wrapper(my_self, *args, **kwargs):
+        call_indexes = itertools.count()
+        call_indexes_lock = threading.Lock()
+        skipped = threading.Event()
+        start = perf_counter_ns()
+
+        def run_worker(_):
+            outcomes = []
+            while True:
+                with call_indexes_lock:
+                    index = next(call_indexes)
+                if index >= total_calls or skipped.is_set():
+                    return outcomes
+                due = start + int(index * interval_ns)
+                delay = due - perf_counter_ns()
+                if delay > 0:
+                    time.sleep(ns_to_seconds(delay))
+                call_start = perf_counter_ns()
+                error = None
+                try:
+                    method(my_self, *args, **kwargs)
+                except SkipTest:
+                    # Stop the other workers, and skip the whole test.
+                    skipped.set()
+                    raise
+                except Exception:  # pylint:disable=broad-except
+                    error = traceback.format_exc()
+                end = perf_counter_ns()
+                outcomes.append((end - due, end - call_start, error))
+
+        pool = ThreadPool(settings.workers)
+        try:
+            outcomes = [
+                outcome
+                for worker_outcomes in pool.map(run_worker, range(settings.workers))
+                for outcome in worker_outcomes
+            ]
+        finally:
+            pool.close()
+            pool.join()
+        elapsed = perf_counter_ns() - start
+
+        latencies = sorted(latency for latency, _, _ in outcomes)
+        service_times = sorted(service_time for _, service_time, _ in outcomes)
+        errors = [error for _, _, error in outcomes if error]
+        entry = {
+            'target_rate': settings.rate,
+            'throughput': len(outcomes) / ns_to_seconds(elapsed),
+            'calls': len(outcomes),
+            'errors': len(errors),
+            'workers': settings.workers,
+            'elapsed_seconds': ns_to_seconds(elapsed),
+            'max': latencies[-1],
+            'service_time_p50': percentile(service_times, 0.5),
+        }
+        for name, fraction in _PERCENTILES:
+            entry[name] = percentile(latencies, fraction)
+        record('load', test_id, entry)
+        if errors:
+            failure_exception = getattr(my_self, 'failureException', AssertionError)
+            raise failure_exception(
+                '{0} of {1} calls failed. First failure:\n{2}'.format(
+                    len(errors),
+                    len(outcomes),
+                    errors[0],
+                )
+            )
+
+    return test_method_wrapper
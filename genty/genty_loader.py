@@ -0,0 +1,335 @@
+# coding: utf-8
+
+from __future__ import absolute_import, division, unicode_literals
+import functools
+import os
+import unittest
+try:
+    from collections import OrderedDict
+except ImportError:
+    # pylint:disable=import-error
+    from ordereddict import OrderedDict
+    # pylint:enable=import-error
+
+from .genty_dataset import dataset_hash
+from .genty_instrument import DURATIONS_ENV_VAR, load_durations
+from .genty_suite import GentyTestSuite
+
+
+ORDER_ENV_VAR = 'GENTY_ORDER'
+ORDERS = ('default', 'longest', 'failed', 'locality')
+
+
+def order_tests(tests, order=None, durations=None):
+    """
+    Reorder tests using the history of their durations, or the datasets
+    they share.
+
+    Tests stay grouped by module and by class, so that module and class
+    fixtures still run once. Within those groups:
+    - 'default' keeps the order of the given tests.
+    - 'longest' runs the slowest first, which packs better across parallel
+      workers. Tests missing from the history count as average ones.
+    - 'failed' runs the tests that failed in their latest run first, for
+      faster feedback.
+    - 'locality' runs the tests sharing a dataset back-to-back: tests
+      generated from the same dataprovider and from datasets with the same
+      content, including their repeats and tests generated from other
+      methods of the class. Fixtures
+      built from the dataset stay hot while the group runs, and consecutive
+      tests are what workers get handed out together. The history of
+      durations isn't used.
+
+    :param tests:
+        The tests to reorder.
+    :type tests:
+        :class:`TestSuite` or `iterable` of :class:`TestCase`
+    :param order:
+        One of 'default', 'longest', 'failed' or 'locality'. Defaults to
+        the value of the GENTY_ORDER environment variable, or 'default'.
+    :type order:
+        `unicode` or None
+    :param durations:
+        The history of test durations, as loaded by
+        :func:`genty.genty_instrument.load_durations`. Defaults to the
+        history in the file named by the GENTY_DURATIONS environment
+        variable.
+    :type durations:
+        `dict` or None
+    :return:
+        A flat suite of the reordered tests.
+    :rtype:
+        :class:`GentyTestSuite`
+    """
+    order = order or os.environ.get(ORDER_ENV_VAR) or 'default'
+    if order not in ORDERS:
+        raise ValueError(
+            "Unknown test order {0!r}. Please pick one of {1}.".format(
+                order,
+                ', '.join(ORDERS),
+            )
+        )
+    flat_tests = list(_iterate_tests(tests))
+    if order == 'default':
+        return GentyTestSuite(flat_tests)
+    modules = OrderedDict()
+    for test in flat_tests:
+        classes = modules.setdefault(type(test).__module__, OrderedDict())
+        classes.setdefault(type(test), []).append(test)
+    if order == 'locality':
+        return GentyTestSuite(
+            test
+            for classes in modules.values()
+            for group in classes.values()
+            for test in _group_by_locality(group)
+        )
+    if durations is None:
+        durations = _load_durations_from_environment()
+
+    sort_key = _build_sort_key(order, durations)
+
+    def group_key(group_tests):
+        return min(sort_key(test) for test in group_tests)
+
+    ordered_modules = []
+    for classes in modules.values():
+        ordered_classes = [sorted(group, key=sort_key) for group in classes.values()]
+        ordered_classes.sort(key=group_key)
+        ordered_modules.append([test for group in ordered_classes for test in group])
+    ordered_modules.sort(key=group_key)
+    return GentyTestSuite(test for module in ordered_modules for test in module)
+
+
+def genty_load_tests(order=None, durations=None):
+    """
+    Build a 'load_tests' function that reorders the tests of a module with
+    :func:`order_tests`. To use it, assign it in the test module:
+        load_tests = genty_load_tests('longest')
+
+    :param order:
+        See :func:`order_tests`.
+    :type order:
+        `unicode` or None
+    :param durations:
+        See :func:`order_tests`.
+    :type durations:
+        `dict` or None
+    :return:
+        A function implementing the unittest load_tests protocol.
+    :rtype:
+        `function`
+    """
+    def load_tests(loader, tests, pattern):  # pylint:disable=unused-argument
+        return order_tests(tests, order, durations)
+    return load_tests
+
+
+class GentyTestLoader(unittest.TestLoader):
+    """
+    Test loader aware of the tests generated by @genty.
+
+    The stock loader finds test methods by calling dir() on each test class
+    and filtering the names, which is slow for classes with many generated
+    tests. This loader reads the names that @genty registered on the class
+    instead, falling back to the stock behavior for classes that weren't
+    decorated with @genty.
+
+    It also orders the tests of each module with :func:`order_tests`, and
+    builds :class:`GentyTestSuite` suites, which run tests marked with
+    @genty_threadsafe concurrently.
+    """
+    suiteClass = GentyTestSuite
+
+    def __init__(self, order=None, durations=None):
+        super(GentyTestLoader, self).__init__()
+        self._order = order
+        self._durations = durations
+
+    def getTestCaseNames(self, testCaseClass):  # pylint:disable=invalid-name
+        """Override of :meth:`TestLoader.getTestCaseNames`."""
+        names = None
+        if not getattr(self, 'testNamePatterns', None):
+            names = get_registered_test_names(testCaseClass, self.testMethodPrefix)
+        if names is None:
+            return super(GentyTestLoader, self).getTestCaseNames(testCaseClass)
+        # Keep the order the tests were generated in, unless asked for a
+        # different one than the stock alphabetical order.
+        sort_using = self.sortTestMethodsUsing
+        if sort_using and sort_using is not unittest.TestLoader.sortTestMethodsUsing:
+            names.sort(key=functools.cmp_to_key(sort_using))
+        return names
+
+    def loadTestsFromModule(self, module, *args, **kwargs):  # pylint:disable=invalid-name,arguments-differ
+        """Override of :meth:`TestLoader.loadTestsFromModule`."""
+        tests = super(GentyTestLoader, self).loadTestsFromModule(module, *args, **kwargs)
+        if self._durations is None and (self._order or os.environ.get(ORDER_ENV_VAR)):
+            self._durations = _load_durations_from_environment()
+        return order_tests(tests, self._order, self._durations)
+
+
+def get_registered_test_names(test_class, prefix='test'):
+    """
+    Return the names of the test methods of a class, as registered by
+    @genty on the class and on its base classes, without scanning them.
+    Only the classes that @genty didn't decorate, and so have no registry,
+    are scanned for test methods.
+
+    :param test_class:
+        The test class.
+    :type test_class:
+        `class`
+    :param prefix:
+        The prefix of test method names.
+    :type prefix:
+        `unicode`
+    :return:
+        The names of the test methods, in the order they were generated,
+        followed by the names found by scanning, sorted. None if the prefix
+        isn't 'test', or if no class has a registry, in which case the
+        stock behavior applies.
+    :rtype:
+        `list` of `unicode` or None
+    """
+    if prefix != 'test':
+        return None
+    names = []
+    seen = set()
+    has_registry = False
+    for cls in test_class.__mro__:
+        if cls is object or cls.__module__ in ('unittest', 'unittest.case', 'unittest2.case'):
+            continue
+        registry = cls.__dict__.get('genty_generated_tests')
+        if registry is None:
+            class_names = sorted(name for name in cls.__dict__ if name.startswith(prefix))
+        else:
+            has_registry = True
+            class_names = registry
+        for name in class_names:
+            if name not in seen:
+                seen.add(name)
+                if registry is not None or callable(getattr(test_class, name, None)):
+                    names.append(name)
+    return names if has_registry else None
+
+
+def _iterate_tests(tests):
+    """
+    :param tests:
+        A test, or a suite or iterable of tests, possibly nested.
+    :type tests:
+        :class:`TestCase` or :class:`TestSuite` or `iterable`
+    :return:
+        Generator of the individual tests.
+    :rtype:
+        `generator` of :class:`TestCase`
+    """
+    if isinstance(tests, unittest.TestCase):
+        yield tests
+        return
+    for test in tests:
+        for sub_test in _iterate_tests(test):
+            yield sub_test
+
+
+def _get_test_id(test):
+    """
+    :param test:
+        A test.
+    :type test:
+        :class:`TestCase`
+    :return:
+        The stable id of the generated test, or the unittest id of any
+        other test.
+    :rtype:
+        `unicode`
+    """
+    method_name = getattr(test, '_testMethodName', None)
+    method = getattr(type(test), method_name, None) if method_name else None
+    return getattr(method, 'genty_test_id', None) or test.id()
+
+
+def _get_locality_key(test):
+    """
+    :param test:
+        A test.
+    :type test:
+        :class:`TestCase`
+    :return:
+        The dataprovider and the hash of the dataset of a generated test,
+        which tests sharing the same input have in common. Datasets that
+        can't be hashed, e.g. lazy ones, fall back to the names of the
+        dataprovider and dataset. Other tests get their id, which they share
+        with no other test.
+    :rtype:
+        `tuple` or `unicode`
+    """
+    method_name = getattr(test, '_testMethodName', None)
+    method = getattr(type(test), method_name, None) if method_name else None
+    dataprovider, dataset = getattr(method, 'genty_test_input', (None, None))
+    if dataset is None:
+        return test.id()
+    content_hash = dataset_hash(dataset)
+    if content_hash is None:
+        test_info = method.genty_test_info
+        return test_info.dataprovider_name, test_info.dataset_name
+    return dataprovider, content_hash
+
+
+def _group_by_locality(tests):
+    """
+    :param tests:
+        Tests of a single class.
+    :type tests:
+        `list` of :class:`TestCase`
+    :return:
+        The tests, with the tests sharing a locality key moved right after
+        the first of them, otherwise keeping their order.
+    :rtype:
+        `list` of :class:`TestCase`
+    """
+    groups = OrderedDict()
+    for test in tests:
+        groups.setdefault(_get_locality_key(test), []).append(test)
+    return [test for group in groups.values() for test in group]
+
+
+def _build_sort_key(order, durations):
+    """
+    :param order:
+        Either 'longest' or 'failed'.
+    :type order:
+        `unicode`
+    :param durations:
+        The history of test durations.
+    :type durations:
+        `dict`
+    :return:
+        Function of a test returning its sort key. Lower keys run first.
+    :rtype:
+        `function`
+    """
+    known_durations = [entry['duration'] for entry in durations.values()]
+    average_duration = 0.0
+    if known_durations:
+        average_duration = sum(known_durations) / len(known_durations)
+
+    def sort_key(test):
+        entry = durations.get(_get_test_id(test), {})
+        duration = entry.get('duration', average_duration)
+        if order == 'failed':
+            return not entry.get('failed', False), -duration
+        return -duration
+
+    return sort_key
+
+
+def _load_durations_from_environment():
+    """
+    :return:
+        The history of test durations in the file named by the
+        GENTY_DURATIONS environment variable, if any.
+    :rtype:
+        `dict`
+    """
+    path = os.environ.get(DURATIONS_ENV_VAR)
+    return load_durations(path) if path else {}
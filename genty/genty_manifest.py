@@ -0,0 +1,192 @@
+# coding: utf-8
+
+from __future__ import absolute_import, unicode_literals
+import atexit
+import hashlib
+import io
+import json
+import os
+import types
+
+from .genty_dataset import GentyNestedDataset, _UnhashableError, _update_hash, dataset_hash
+from .genty_report import get_report
+from .private import to_json
+
+
+MANIFEST_ENV_VAR = 'GENTY_MANIFEST'
+ONLY_CHANGED_ENV_VAR = 'GENTY_ONLY_CHANGED'
+
+_BASELINES = {}
+
+
+def load_manifest(path):
+    """
+    Load a manifest of generated tests.
+
+    :param path:
+        Path of the manifest file.
+    :type path:
+        `unicode`
+    :return:
+        For each test id, the 'dataset_hash' of its dataset and the
+        'code_hash' of its test method and dataproviders. Empty if the file
+        doesn't exist.
+    :rtype:
+        `dict` of `unicode` to `dict`
+    """
+    if not os.path.exists(path):
+        return {}
+    with io.open(path, encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(path):
+    """
+    Merge the manifest entries of the tests generated in this run into a
+    manifest file.
+
+    :param path:
+        Path of the manifest file.
+    :type path:
+        `unicode`
+    """
+    entries = get_report('manifest')
+    if not entries:
+        return
+    manifest = load_manifest(path)
+    manifest.update(entries)
+    with io.open(path, 'w', encoding='utf-8') as manifest_file:
+        manifest_file.write(to_json(manifest))
+
+
+def is_changed(baseline_entry, entry):
+    """
+    :param baseline_entry:
+        The manifest entry of a test in the baseline, or None if the test
+        isn't in it.
+    :type baseline_entry:
+        `dict` or None
+    :param entry:
+        The manifest entry of the test now.
+    :type entry:
+        `dict`
+    :return:
+        Whether the test is new, or its dataset or code changed since the
+        baseline. Tests whose dataset can't be hashed always count as
+        changed.
+    :rtype:
+        `bool`
+    """
+    return baseline_entry is None or entry['dataset_hash'] is None or baseline_entry != entry
+
+
+def code_hash(functions):
+    """
+    Hash the code of functions: their bytecode, constants and names, but
+    not their decorators, line numbers or file names, so that adding
+    datasets to a test or moving it around doesn't change the hash. The
+    bytecode depends on the version of Python.
+
+    :param functions:
+        The functions.
+    :type functions:
+        `iterable` of `callable`
+    :return:
+        The hex digest of the code of the functions.
+    :rtype:
+        `unicode`
+    """
+    digest = hashlib.sha256()
+    for function in functions:
+        function = getattr(function, '__func__', function)
+        code = getattr(function, '__code__', None)
+        if code is None:
+            digest.update(repr(function).encode('utf-8'))
+        else:
+            _update_code_hash(digest, code)
+    return digest.hexdigest()
+
+
+def _update_code_hash(digest, code):
+    """
+    :param digest:
+        The hash to feed the code to.
+    :type digest:
+        :class:`hashlib.sha256`
+    :param code:
+        The code object of a function.
+    :type code:
+        :class:`types.CodeType`
+    """
+    digest.update(code.co_code)
+    for names in (code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars):
+        digest.update(','.join(names).encode('utf-8'))
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            _update_code_hash(digest, constant)
+            continue
+        try:
+            _update_hash(digest, constant)
+        except _UnhashableError:
+            digest.update(repr(constant).encode('utf-8'))
+
+
+def _build_manifest_entry(func, dataset, dataprovider):
+    """
+    :param func:
+        The underlying test function.
+    :type func:
+        `function`
+    :param dataset:
+        The dataset of the test, or None.
+    :type dataset:
+        `tuple` or :class:`GentyArgs` or :class:`GentyLazy` or
+        :class:`GentyNestedDataset` or None
+    :param dataprovider:
+        The dataprovider of the test, or None.
+    :type dataprovider:
+        `callable` or None
+    :return:
+        The hash of the dataset, None if it can't be hashed, and the hash of
+        the code of the test function and of the dataproviders it depends
+        on.
+    :rtype:
+        `dict`
+    """
+    functions = [func]
+    if dataprovider is not None:
+        functions.append(dataprovider)
+    upstream = dataset
+    while isinstance(upstream, GentyNestedDataset):
+        functions.append(upstream.dataprovider)
+        upstream = upstream.dataset
+    return {
+        'dataset_hash': dataset_hash(dataset if dataset is not None else ()),
+        'code_hash': code_hash(functions),
+    }
+
+
+def _get_baseline():
+    """
+    :return:
+        The manifest named by the GENTY_ONLY_CHANGED environment variable,
+        loaded once per process, or None if it isn't set.
+    :rtype:
+        `dict` or None
+    """
+    path = os.environ.get(ONLY_CHANGED_ENV_VAR)
+    if not path:
+        return None
+    if path not in _BASELINES:
+        _BASELINES[path] = load_manifest(path)
+    return _BASELINES[path]
+
+
+def _save_manifest_from_environment():
+    """Save the manifest if a manifest file has been configured."""
+    path = os.environ.get(MANIFEST_ENV_VAR)
+    if path:
+        save_manifest(path)
+
+
+atexit.register(_save_manifest_from_environment)
@@ -1,9 +1,44 @@
 # coding: utf-8
 
-from __future__ import unicode_literals
+from __future__ import division, unicode_literals
+from collections import defaultdict
+import gc
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import sys
+import traceback
+from unittest import SkipTest
 
+from six.moves import queue  # pylint:disable=import-error
 
-def genty_repeat(count):
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from .genty_report import record
+from .private import reraise_with_note
+from .private.timing import NANOSECONDS_PER_SECOND, ns_to_seconds, perf_counter_ns, summarize
+
+
+MIN_LEAK_CHECK_COUNT = 3
+_LEAK_TREND_MIN_R_SQUARED = 0.5
+# How often to check whether forked processes exited, while waiting for
+# the return value of an iteration.
+_FORKED_POLL_INTERVAL = 0.1
+
+
+def genty_repeat(
+        count=None,
+        until_failure=False,
+        max_count=None,
+        time_budget=None,
+        leak_check=False,
+        leak_threshold=1024,
+        concurrency=None,
+        processes=False,
+):
     """
     To use in conjunction with a TestClass wrapped with @genty.
 
@@ -19,18 +54,559 @@ def test_some__other_function(self, bool_value):
             ...
     This will run 6 tests in total, 3 each of the True and False cases.
 
+    To hunt for flaky failures without generating one test method per
+    iteration, use 'until_failure'. The iterations then run inside a single
+    generated test, which stops at the first failure, after 'max_count'
+    iterations or once 'time_budget' seconds have been spent, whichever
+    comes first:
+        @genty_repeat(until_failure=True, max_count=10000, time_budget=30)
+        def test_flaky_function(self):
+            ...
+    The index and timing of the failing iteration are appended to the
+    failure message, and every run is recorded in the 'repeat' report of
+    :mod:`genty.genty_report`. Note that setUp and tearDown run once around
+    all of the iterations, not around each of them.
+
+    To catch leaks, use 'leak_check'. The 'count' iterations then also run
+    inside a single generated test. After each of them, garbage is collected
+    and the retained memory (as traced by tracemalloc when available) and
+    the number of live objects are measured. The test fails if, ignoring
+    the first iteration, retained memory grows steadily by more than
+    'leak_threshold' bytes per iteration. The failure message lists the
+    types whose live object counts grew the most:
+        @genty_repeat(50, leak_check=True)
+        def test_handle_request(self):
+            ...
+    Measurements are recorded in the 'leak' report of
+    :mod:`genty.genty_report`.
+
+    To stress code for races and contention, use 'concurrency'. The 'count'
+    iterations then run inside a single generated test, 'concurrency' at a
+    time on as many threads, all sharing the same TestCase instance and
+    fixtures. With 'processes', they run in as many forked processes
+    instead. The test fails if any iteration fails, reporting which ones,
+    and is only skipped if every iteration raises SkipTest. Otherwise the
+    skipped iterations are counted in the report:
+        @genty_repeat(1000, concurrency=16)
+        def test_cache_under_contention(self):
+            ...
+    The latency distribution of the iterations (in nanoseconds) and the
+    throughput are recorded in the 'concurrency' report of
+    :mod:`genty.genty_report`.
+
     :param count:
         The number of times to run the test.
     :type count:
         `int`
+    :param until_failure:
+        Whether to run the iterations inside a single test, stopping at the
+        first failure.
+    :type until_failure:
+        `bool`
+    :param max_count:
+        The maximum number of iterations when running until failure.
+        Defaults to 'count'.
+    :type max_count:
+        `int` or None
+    :param time_budget:
+        The maximum number of seconds to spend iterating when running until
+        failure.
+    :type time_budget:
+        `float` or None
+    :param leak_check:
+        Whether to run the iterations inside a single test, failing it if
+        memory grows steadily across iterations.
+    :type leak_check:
+        `bool`
+    :param leak_threshold:
+        The number of bytes per iteration that retained memory may grow by
+        before the leak check fails.
+    :type leak_threshold:
+        `int`
+    :param concurrency:
+        The number of iterations to run at the same time, if any.
+    :type concurrency:
+        `int` or None
+    :param processes:
+        Whether to run concurrent iterations in forked processes rather
+        than threads.
+    :type processes:
+        `bool`
     """
-    if count < 0:
+    # pylint:disable=too-many-arguments,too-many-branches
+    if len([mode for mode in (until_failure, leak_check, concurrency) if mode]) > 1:
+        raise ValueError("Can't combine until_failure, leak_check and concurrency.")
+    if concurrency is not None and concurrency < 1:
+        raise ValueError(
+            "Can't run {0} iterations at the same time. "
+            "Please pick a value >= 1.".format(concurrency)
+        )
+    if processes and not concurrency:
+        raise ValueError("processes only applies with a concurrency.")
+    if processes and not hasattr(os, 'fork'):
+        raise ValueError("Running iterations in processes requires os.fork.")
+    if leak_check and (count is None or count < MIN_LEAK_CHECK_COUNT):
         raise ValueError(
-            "Really? Can't have {0} iterations. Please pick a value >= 0."
-            .format(count)
+            "Can't check for leaks across {0} iterations. "
+            "Please pick a count >= {1}.".format(count, MIN_LEAK_CHECK_COUNT)
         )
+    if until_failure:
+        if max_count is None:
+            max_count = count
+        if max_count is None and time_budget is None:
+            raise ValueError(
+                "Repeating until failure needs a max_count or a time_budget, "
+                "otherwise a passing test would run forever."
+            )
+        if max_count is not None and max_count < 1:
+            raise ValueError(
+                "Can't repeat until failure with a max_count of {0}. "
+                "Please pick a value >= 1.".format(max_count)
+            )
+        if time_budget is not None and time_budget <= 0:
+            raise ValueError(
+                "Can't repeat until failure with a time_budget of {0}. "
+                "Please pick a value > 0.".format(time_budget)
+            )
+    else:
+        if count is None:
+            raise ValueError("Please specify how many times to repeat the test.")
+        if max_count is not None or time_budget is not None:
+            raise ValueError(
+                "max_count and time_budget only apply with until_failure=True."
+            )
+        if count < 0:
+            raise ValueError(
+                "Really? Can't have {0} iterations. Please pick a value >= 0."
+                .format(count)
+            )
 
     def wrap(test_method):
-        test_method.genty_repeat_count = count
+        if until_failure:
+            test_method.genty_repeat_count = 0
+            test_method.genty_repeat_until_failure = (max_count, time_budget)
+        elif leak_check:
+            test_method.genty_repeat_count = 0
+            test_method.genty_repeat_leak_check = (count, leak_threshold)
+        elif concurrency:
+            test_method.genty_repeat_count = 0
+            test_method.genty_repeat_concurrency = (count, concurrency, processes)
+        else:
+            test_method.genty_repeat_count = count
         return test_method
     return wrap
+
+
+def _build_repeat_until_failure_method(method, test_id, max_count, time_budget):
+    """
+    Return a fabricated method that calls 'method' repeatedly until it fails,
+    or until the iteration count or time budget is exhausted.
+
+    :param method:
+        The test method to repeat, already bound to its dataset.
+    :type method:
+        `callable`
+    :param test_id:
+        Stable identifier of the generated test, used for reporting.
+    :type test_id:
+        `unicode`
+    :param max_count:
+        The maximum number of iterations, or None for no limit.
+    :type max_count:
+        `int` or None
+    :param time_budget:
+        The maximum number of seconds to spend iterating, or None.
+    :type time_budget:
+        `float` or None
+    :return:
+        Return an unbound function that will become a test method
+    :rtype:
+        `function`
+    """
+    def test_method_wrapper(my_self):
+        start = perf_counter_ns()
+        deadline = None
+        if time_budget is not None:
+            deadline = start + int(time_budget * NANOSECONDS_PER_SECOND)
+        iteration = 0
+        stopped_by = 'max_count'
+        result = None
+        while max_count is None or iteration < max_count:
+            if deadline is not None and perf_counter_ns() >= deadline:
+                stopped_by = 'time_budget'
+                break
+            iteration += 1
+            iteration_start = perf_counter_ns()
+            try:
+                result = method(my_self)
+            except SkipTest:
+                raise
+            except Exception:  # pylint:disable=broad-except
+                end = perf_counter_ns()
+                record('repeat', test_id, {
+                    'iterations': iteration,
+                    'elapsed_seconds': ns_to_seconds(end - start),
+                    'stopped_by': 'failure',
+                    'failed_iteration': iteration,
+                    'failed_iteration_seconds': ns_to_seconds(end - iteration_start),
+                })
+                reraise_with_note(
+                    'Failed on iteration {0} after {1:.3f}s '
+                    '(the failing iteration took {2:.3f}s).'.format(
+                        iteration,
+                        ns_to_seconds(end - start),
+                        ns_to_seconds(end - iteration_start),
+                    )
+                )
+        record('repeat', test_id, {
+            'iterations': iteration,
+            'elapsed_seconds': ns_to_seconds(perf_counter_ns() - start),
+            'stopped_by': stopped_by,
+        })
+        return result
+
+    return test_method_wrapper
+
+
+def _build_leak_check_method(method, test_id, count, threshold):
+    """
+    Return a fabricated method that calls 'method' 'count' times, measuring
+    retained memory and live objects after each call, and fails if memory
+    grows steadily.
+
+    :param method:
+        The test method to repeat, already bound to its dataset.
+    :type method:
+        `callable`
+    :param test_id:
+        Stable identifier of the generated test, used for reporting.
+    :type test_id:
+        `unicode`
+    :param count:
+        The number of iterations.
+    :type count:
+        `int`
+    :param threshold:
+        The number of bytes per iteration retained memory may grow by.
+    :type threshold:
+        `int`
+    :return:
+        Return an unbound function that will become a test method
+    :rtype:
+        `function`
+    """
+    def test_method_wrapper(my_self):
+        started_tracing = tracemalloc is not None and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        retained_bytes = []
+        live_objects = []
+        types_before = {}
+        result = None
+        try:
+            for iteration in range(1, count + 1):
+                try:
+                    result = method(my_self)
+                except SkipTest:
+                    raise
+                except Exception:  # pylint:disable=broad-except
+                    reraise_with_note(
+                        'Failed on iteration {0} of {1}.'.format(iteration, count)
+                    )
+                gc.collect()
+                retained_bytes.append(_measure_retained_bytes())
+                live_objects.append(len(gc.get_objects()))
+                if iteration == 1:
+                    types_before = _count_objects_by_type()
+            types_after = _count_objects_by_type()
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        # The first iteration typically fills caches, so it's left out of
+        # the trend.
+        bytes_per_iteration, r_squared = _fit_trend(retained_bytes[1:])
+        objects_per_iteration, _ = _fit_trend(live_objects[1:])
+        growing_types = sorted(
+            (
+                (types_after[name] - types_before.get(name, 0), name)
+                for name in types_after
+                if types_after[name] > types_before.get(name, 0)
+            ),
+            reverse=True,
+        )[:10]
+        leaking = bytes_per_iteration > threshold and r_squared >= _LEAK_TREND_MIN_R_SQUARED
+        record('leak', test_id, {
+            'iterations': count,
+            'retained_bytes': retained_bytes,
+            'live_objects': live_objects,
+            'bytes_per_iteration': bytes_per_iteration,
+            'objects_per_iteration': objects_per_iteration,
+            'r_squared': r_squared,
+            'growing_types': dict((name, growth) for growth, name in growing_types),
+            'leaking': leaking,
+        })
+        if leaking:
+            failure_exception = getattr(my_self, 'failureException', AssertionError)
+            raise failure_exception(
+                'Memory grew by {0:.0f} bytes and {1:.1f} objects per iteration '
+                'over {2} iterations (threshold {3} bytes). '
+                'Growing types: {4}.'.format(
+                    bytes_per_iteration,
+                    objects_per_iteration,
+                    count,
+                    threshold,
+                    ', '.join('{0} +{1}'.format(name, growth) for growth, name in growing_types),
+                )
+            )
+        return result
+
+    return test_method_wrapper
+
+
+def _build_concurrent_repeat_method(method, test_id, count, concurrency, processes):
+    """
+    Return a fabricated method that calls 'method' 'count' times, running
+    'concurrency' calls at the same time, and fails if any call fails.
+
+    :param method:
+        The test method to repeat, already bound to its dataset.
+    :type method:
+        `callable`
+    :param test_id:
+        Stable identifier of the generated test, used for reporting.
+    :type test_id:
+        `unicode`
+    :param count:
+        The number of iterations.
+    :type count:
+        `int`
+    :param concurrency:
+        The number of iterations to run at the same time.
+    :type concurrency:
+        `int`
+    :param processes:
+        Whether to run iterations in forked processes rather than threads.
+    :type processes:
+        `bool`
+    :return:
+        Return an unbound function that will become a test method
+    :rtype:
+        `function`
+    """
+    # pylint:disable=too-many-arguments
+    def test_method_wrapper(my_self):
+        def run_iteration(iteration):
+            start = perf_counter_ns()
+            error = None
+            skip_reason = None
+            try:
+                method(my_self)
+            except SkipTest as skip:
+                skip_reason = str(skip)
+            except Exception:  # pylint:disable=broad-except
+                error = traceback.format_exc()
+            return iteration, perf_counter_ns() - start, error, skip_reason
+
+        iterations = range(1, count + 1)
+        start = perf_counter_ns()
+        if processes:
+            outcomes = _map_in_forked_processes(run_iteration, iterations, concurrency)
+        else:
+            pool = ThreadPool(concurrency)
+            try:
+                outcomes = pool.map(run_iteration, iterations, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        elapsed = perf_counter_ns() - start
+
+        failures = [(iteration, error) for iteration, _, error, _ in outcomes if error]
+        skip_reasons = [skip_reason for _, _, _, skip_reason in outcomes if skip_reason is not None]
+        entry = summarize([latency for _, latency, _, _ in outcomes])
+        entry.update({
+            'concurrency': concurrency,
+            'processes': processes,
+            'elapsed_seconds': ns_to_seconds(elapsed),
+            'throughput': count / ns_to_seconds(elapsed) if elapsed else None,
+            'failed_iterations': [iteration for iteration, _ in failures],
+            'skipped_iterations': len(skip_reasons),
+        })
+        record('concurrency', test_id, entry)
+        if len(skip_reasons) == count:
+            raise SkipTest(skip_reasons[0])
+        if failures:
+            failure_exception = getattr(my_self, 'failureException', AssertionError)
+            raise failure_exception(
+                '{0} of {1} iterations failed (iterations {2}). '
+                'First failure, on iteration {3}:\n{4}'.format(
+                    len(failures),
+                    count,
+                    ', '.join(str(iteration) for iteration, _ in failures),
+                    failures[0][0],
+                    failures[0][1],
+                )
+            )
+
+    return test_method_wrapper
+
+
+def _map_in_forked_processes(function, iterable, processes):
+    """
+    Call a function on each item of an iterable, in processes forked from
+    this one. The function doesn't need to be picklable, since forked
+    processes get it without pickling, its return values do.
+
+    :param function:
+        The function to call.
+    :type function:
+        `callable`
+    :param iterable:
+        The items to call the function on.
+    :type iterable:
+        `iterable`
+    :param processes:
+        The number of processes.
+    :type processes:
+        `int`
+    :return:
+        The return values of the function, in order.
+    :rtype:
+        `list`
+    :raises:
+        RuntimeError if a process exited before returning all its values,
+        e.g. because the function raised an error.
+    """
+    get_context = getattr(multiprocessing, 'get_context', None)
+    context = get_context('fork') if get_context else multiprocessing
+    items = list(iterable)
+    tasks = context.Queue()
+    results = context.Queue()
+    for task in enumerate(items):
+        tasks.put(task)
+    workers = []
+    for _ in range(min(processes, len(items))):
+        tasks.put(None)
+        worker = context.Process(target=_run_forked_iterations, args=(function, tasks, results))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+    return_values = [None] * len(items)
+    try:
+        for _ in items:
+            index, return_value = _get_forked_return_value(results, workers)
+            return_values[index] = return_value
+    except BaseException:
+        for worker in workers:
+            worker.terminate()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+    return return_values
+
+
+def _run_forked_iterations(function, tasks, results):
+    """
+    Call a function on the items of a queue, in a forked process, until
+    getting None.
+
+    :param function:
+        The function to call.
+    :type function:
+        `callable`
+    :param tasks:
+        The queue of the indexes and items to call the function on.
+    :type tasks:
+        :class:`multiprocessing.Queue`
+    :param results:
+        The queue to put the indexes and return values of the calls to.
+    :type results:
+        :class:`multiprocessing.Queue`
+    """
+    for index, item in iter(tasks.get, None):
+        results.put((index, function(item)))
+
+
+def _get_forked_return_value(results, workers):
+    """
+    :param results:
+        The queue forked processes put the return values of the function to.
+    :type results:
+        :class:`multiprocessing.Queue`
+    :param workers:
+        The forked processes.
+    :type workers:
+        `list` of :class:`multiprocessing.Process`
+    :return:
+        The next index and return value put to the queue.
+    :rtype:
+        `tuple`
+    :raises:
+        RuntimeError if a process exited with an error.
+    """
+    while True:
+        try:
+            return results.get(timeout=_FORKED_POLL_INTERVAL)
+        except queue.Empty:
+            pass
+        for worker in workers:
+            if worker.exitcode:
+                raise RuntimeError('A forked process exited with code {0}.'.format(worker.exitcode))
+
+
+def _measure_retained_bytes():
+    """
+    :return:
+        The memory currently allocated by Python objects: the traced memory
+        if tracemalloc is tracing, or else the sum of the sizes of the
+        objects tracked by the garbage collector.
+    :rtype:
+        `int`
+    """
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    return sum(sys.getsizeof(obj) for obj in gc.get_objects())
+
+
+def _count_objects_by_type():
+    """
+    :return:
+        The number of live objects tracked by the garbage collector, by
+        type name.
+    :rtype:
+        `dict` of `unicode` to `int`
+    """
+    counts = defaultdict(int)
+    for obj in gc.get_objects():
+        counts[type(obj).__name__] += 1
+    return counts
+
+
+def _fit_trend(values):
+    """
+    Fit a line to values measured at consecutive iterations, using least
+    squares.
+
+    :param values:
+        The measured values.
+    :type values:
+        `list` of `int` or `float`
+    :return:
+        The slope of the line, i.e. the growth per iteration, and the
+        coefficient of determination, i.e. how steady that growth is.
+    :rtype:
+        `tuple` of (`float`, `float`)
+    """
+    count = len(values)
+    if count < 2:
+        return 0.0, 0.0
+    mean_x = (count - 1) / 2
+    mean_y = sum(values) / count
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+    variance_x = sum((x - mean_x) ** 2 for x in range(count))
+    variance_y = sum((y - mean_y) ** 2 for y in values)
+    slope = covariance / variance_x
+    if not variance_y:
+        return slope, 0.0
+    return slope, covariance ** 2 / (variance_x * variance_y)
@@ -0,0 +1,216 @@
+# coding: utf-8
+
+from __future__ import absolute_import, unicode_literals
+import atexit
+import io
+import os
+import threading
+try:
+    from collections import OrderedDict
+except ImportError:
+    # pylint:disable=import-error
+    from ordereddict import OrderedDict
+    # pylint:enable=import-error
+from .private import to_json
+
+
+REPORT_DIR_ENV_VAR = 'GENTY_REPORT_DIR'
+
+_REPORTS = OrderedDict()
+_REPORTS_LOCK = threading.Lock()
+_SORT_KEYS = {}
+
+
+def record(kind, test_id, entry):
+    """
+    Record measurements about a generated test.
+
+    :param kind:
+        The kind of report the entry belongs to, e.g. 'repeat'. Each kind is
+        written to its own file.
+    :type kind:
+        `unicode`
+    :param test_id:
+        Stable identifier of the generated test.
+    :type test_id:
+        `unicode`
+    :param entry:
+        JSON serializable measurements. A later entry for the same test
+        replaces the earlier one.
+    :type entry:
+        `dict`
+    """
+    with _REPORTS_LOCK:
+        _REPORTS.setdefault(kind, OrderedDict())[test_id] = entry
+
+
+def set_sort_key(kind, sort_key):
+    """
+    Have the given kind of report written as a list of entries sorted with
+    the given key, instead of as an object keyed by test id. Each entry of
+    the list then also carries its 'test_id'.
+
+    :param kind:
+        The kind of report.
+    :type kind:
+        `unicode`
+    :param sort_key:
+        Function of an entry returning its sort key.
+    :type sort_key:
+        `callable`
+    """
+    _SORT_KEYS[kind] = sort_key
+
+
+def get_sorted_report(kind):
+    """
+    :param kind:
+        The kind of report to return.
+    :type kind:
+        `unicode`
+    :return:
+        The entries recorded so far for the given kind, each with its
+        'test_id', sorted with the key set for that kind, if any.
+    :rtype:
+        `list` of `dict`
+    """
+    entries = []
+    for test_id, entry in get_report(kind).items():
+        entry = dict(entry)
+        entry['test_id'] = test_id
+        entries.append(entry)
+    sort_key = _SORT_KEYS.get(kind)
+    if sort_key:
+        entries.sort(key=sort_key)
+    return entries
+
+
+def get_report(kind):
+    """
+    :param kind:
+        The kind of report to return.
+    :type kind:
+        `unicode`
+    :return:
+        A copy of the entries recorded so far for the given kind, keyed by
+        test id in the order they were recorded.
+    :rtype:
+        :class:`OrderedDict` of `unicode` to `dict`
+    """
+    with _REPORTS_LOCK:
+        return OrderedDict(_REPORTS.get(kind, ()))
+
+
+def get_entry(kind, test_id):
+    """
+    :param kind:
+        The kind of report.
+    :type kind:
+        `unicode`
+    :param test_id:
+        Stable identifier of the generated test.
+    :type test_id:
+        `unicode`
+    :return:
+        The entry recorded for the test itself, not a copy, or None. Entries
+        updated in place are written as they are when the report is written.
+    :rtype:
+        `dict` or None
+    """
+    with _REPORTS_LOCK:
+        return _REPORTS.get(kind, {}).get(test_id)
+
+
+def get_reports(since=None):
+    """
+    :param since:
+        Reports returned by an earlier call, to only return the entries
+        recorded or changed since then.
+    :type since:
+        `dict` or None
+    :return:
+        A copy of the entries recorded so far for every kind of report,
+        e.g. to send them to another process that merges them with
+        :func:`merge_reports`.
+    :rtype:
+        `dict` of `unicode` to `dict` of `unicode` to `dict`
+    """
+    since = since or {}
+    reports = {}
+    with _REPORTS_LOCK:
+        for kind, entries in _REPORTS.items():
+            earlier = since.get(kind, {})
+            changed = dict(
+                (test_id, dict(entry))
+                for test_id, entry in entries.items()
+                if earlier.get(test_id) != entry
+            )
+            if changed:
+                reports[kind] = changed
+    return reports
+
+
+def merge_reports(reports):
+    """
+    Record the entries recorded by another process, as returned by its
+    :func:`get_reports`. They replace the entries recorded here for the same
+    tests.
+
+    :param reports:
+        The entries for each kind of report.
+    :type reports:
+        `dict` of `unicode` to `dict` of `unicode` to `dict`
+    """
+    with _REPORTS_LOCK:
+        for kind, entries in reports.items():
+            _REPORTS.setdefault(kind, OrderedDict()).update(entries)
+
+
+def clear_reports():
+    """Forget every entry recorded so far."""
+    with _REPORTS_LOCK:
+        _REPORTS.clear()
+
+
+def write_reports(directory):
+    """
+    Write every report to a JSON file named 'genty_<kind>.json' in the
+    given directory, with entries sorted by test id, or by the key set for
+    that kind of report.
+
+    :param directory:
+        The directory to write the reports to. Created if needed.
+    :type directory:
+        `unicode`
+    :return:
+        The paths of the files that were written.
+    :rtype:
+        `list` of `unicode`
+    """
+    with _REPORTS_LOCK:
+        kinds = list(_REPORTS)
+    reports = [
+        (kind, get_sorted_report(kind) if kind in _SORT_KEYS else dict(get_report(kind)))
+        for kind in kinds
+    ]
+    if not reports:
+        return []
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    paths = []
+    for kind, entries in reports:
+        path = os.path.join(directory, 'genty_{0}.json'.format(kind))
+        with io.open(path, 'w', encoding='utf-8') as report_file:
+            report_file.write(to_json(entries))
+        paths.append(path)
+    return paths
+
+
+def _write_reports_from_environment():
+    """Write the reports if a report directory has been configured."""
+    directory = os.environ.get(REPORT_DIR_ENV_VAR)
+    if directory:
+        write_reports(directory)
+
+
+atexit.register(_write_reports_from_environment)
@@ -0,0 +1,386 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import atexit
+from collections import namedtuple
+import os
+import threading
+from unittest import SkipTest
+
+from six.moves import queue  # pylint:disable=import-error
+
+
+SCOPES = ('process', 'test')
+DEFAULT_CHECKOUT_TIMEOUT = 60
+
+_ResourceSettings = namedtuple(
+    '_ResourceSettings',
+    ['name', 'factory', 'pool_size', 'scope', 'teardown', 'validate', 'checkout_timeout'],
+)
+
+# The pools of each process, by pid, then by resource name, along with the
+# settings they were created with. Processes forked from this one, e.g. to
+# run isolated tests, don't share the resources of this one's pools.
+_pools = {}
+_pools_lock = threading.Lock()
+
+# The settings that a pool of a given name is built from.
+_POOL_SETTINGS = ('factory', 'pool_size', 'teardown', 'validate', 'checkout_timeout')
+
+
+class ResourceTimeoutError(RuntimeError):
+    """
+    Raised when no resource of a full pool was returned in time, e.g.
+    because a test holding one waits for another from the same pool.
+    """
+    pass
+
+
+class GentyResourcePool(object):
+    """
+    Pool of resources built on demand by a factory, up to a maximum size.
+    """
+    def __init__(self, factory, size=1, teardown=None, validate=None, timeout=None):
+        """
+        :param factory:
+            Callable taking no arguments and building a resource.
+        :type factory:
+            `callable`
+        :param size:
+            The maximum number of resources to build.
+        :type size:
+            `int`
+        :param teardown:
+            Callable taking a resource and releasing it, or None.
+        :type teardown:
+            `callable` or None
+        :param validate:
+            Callable taking a resource returned after an error, and returning
+            whether it can still be used. Resources it rejects are torn down
+            and replaced. None to keep them all.
+        :type validate:
+            `callable` or None
+        :param timeout:
+            The number of seconds to wait for a resource when the pool is
+            full, or None to wait forever.
+        :type timeout:
+            `float` or None
+        """
+        # pylint:disable=too-many-arguments
+        super(GentyResourcePool, self).__init__()
+        self._factory = factory
+        self._size = size
+        self._teardown = teardown
+        self._validate = validate
+        self._timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._built_count = 0
+        self._resources = []
+
+    @property
+    def factory(self):
+        """Return the factory building the resources of the pool."""
+        return self._factory
+
+    def checkout(self):
+        """
+        Take a resource out of the pool, building a new one if all the
+        resources built so far are in use and the pool isn't full. Otherwise
+        wait for a resource to be returned.
+
+        :return:
+            The resource.
+        :rtype:
+            `object`
+        :raises:
+            :class:`ResourceTimeoutError` if no resource was returned within
+            the timeout of the pool.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            # Count the resource before building it, so that concurrent
+            # checkouts don't overfill the pool while the factory runs.
+            build = self._built_count < self._size
+            if build:
+                self._built_count += 1
+        if not build:
+            try:
+                return self._idle.get(timeout=self._timeout)
+            except queue.Empty:
+                raise ResourceTimeoutError(
+                    'Timed out after {0}s waiting for one of the {1} resources built by {2!r} to be '
+                    'returned. Tests that use a resource from a pool while holding another one need '
+                    'a pool_size of at least the number of resources they hold at once.'.format(
+                        self._timeout,
+                        self._size,
+                        self._factory,
+                    )
+                )
+        try:
+            resource = self._factory()
+        except Exception:
+            with self._lock:
+                self._built_count -= 1
+            raise
+        with self._lock:
+            self._resources.append(resource)
+        return resource
+
+    def checkin(self, resource, errored=False):
+        """
+        Return a resource taken with :meth:`checkout` to the pool.
+
+        :param resource:
+            The resource.
+        :type resource:
+            `object`
+        :param errored:
+            Whether the test using the resource raised an error, in which
+            case the resource is only returned if the validate callable of
+            the pool accepts it, and discarded otherwise.
+        :type errored:
+            `bool`
+        """
+        if errored and self._validate is not None and not self._validate(resource):
+            self.discard(resource)
+            return
+        self._idle.put(resource)
+
+    def discard(self, resource):
+        """
+        Tear down a resource taken with :meth:`checkout` instead of returning
+        it to the pool, making room for a new one.
+
+        :param resource:
+            The resource.
+        :type resource:
+            `object`
+        """
+        with self._lock:
+            for index, other in enumerate(self._resources):
+                if other is resource:
+                    del self._resources[index]
+                    self._built_count -= 1
+                    break
+        if self._teardown:
+            self._teardown(resource)
+
+    def close(self):
+        """
+        Tear down every resource the pool built, and empty it.
+        """
+        with self._lock:
+            resources = self._resources
+            self._resources = []
+            self._built_count = 0
+            self._idle = queue.LifoQueue()
+        if self._teardown:
+            for resource in resources:
+                self._teardown(resource)
+
+
+def genty_resource(
+        name,
+        factory,
+        pool_size=1,
+        scope='process',
+        teardown=None,
+        validate=None,
+        checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT,
+):
+    """
+    Inject a resource built by a factory, such as a database connection or
+    an HTTP session, into the tests generated from the decorated method:
+        @genty_resource('session', requests.Session, pool_size=4, teardown=close)
+        @genty_dataset(*ENDPOINTS)
+        def test_endpoint(self, endpoint, session):
+            ...
+
+    The resource is passed as the keyword argument 'name'. With the
+    'process' scope, resources are checked out of a pool shared by every
+    test using a resource of that name, and returned to it after each
+    call, so that thousands of generated tests reuse a handful of
+    connections. Tests running concurrently, e.g. with @genty_threadsafe,
+    wait for a resource when all 'pool_size' of them are in use, for up to
+    'checkout_timeout' seconds. When a test raises an error, its resource
+    only goes back to the pool if 'validate' accepts it, and is torn down
+    otherwise. Every test using a resource of a given name must use the
+    same factory. Pooled resources are torn down at exit, or by
+    :func:`close_resource_pools`. With the 'test' scope, a new resource is
+    built for each call and torn down right after it.
+
+    :param name:
+        Name of the keyword argument receiving the resource, and of the pool.
+    :type name:
+        `unicode`
+    :param factory:
+        Callable taking no arguments and building a resource.
+    :type factory:
+        `callable`
+    :param pool_size:
+        The maximum number of resources to build for the pool.
+    :type pool_size:
+        `int`
+    :param scope:
+        Either 'process' or 'test'.
+    :type scope:
+        `unicode`
+    :param teardown:
+        Callable taking a resource and releasing it, or None.
+    :type teardown:
+        `callable` or None
+    :param validate:
+        Callable taking a pooled resource whose test raised an error, and
+        returning whether it can be reused, or None to reuse it.
+    :type validate:
+        `callable` or None
+    :param checkout_timeout:
+        The number of seconds to wait for a pooled resource before failing
+        the test with :class:`ResourceTimeoutError`, or None to wait forever.
+    :type checkout_timeout:
+        `float` or None
+    """
+    # pylint:disable=too-many-arguments
+    if scope not in SCOPES:
+        raise ValueError(
+            "Unknown resource scope {0!r}. Please pick one of {1}.".format(
+                scope,
+                ', '.join(SCOPES),
+            )
+        )
+    if pool_size < 1:
+        raise ValueError(
+            "Can't have a pool of {0} resources. Please pick a value >= 1.".format(pool_size)
+        )
+    settings = _ResourceSettings(name, factory, pool_size, scope, teardown, validate, checkout_timeout)
+
+    def wrap(test_method):
+        # Save the resources on the test function, for @genty to inject.
+        if not hasattr(test_method, 'genty_resources'):
+            test_method.genty_resources = []
+        test_method.genty_resources.append(settings)
+        return test_method
+    return wrap
+
+
+def get_resource_pool(name):
+    """
+    :param name:
+        Name of a resource with the 'process' scope.
+    :type name:
+        `unicode`
+    :return:
+        The pool of resources of that name, or None if no test used one yet.
+    :rtype:
+        :class:`GentyResourcePool` or None
+    """
+    with _pools_lock:
+        pool, _ = _pools.get(os.getpid(), {}).get(name, (None, None))
+        return pool
+
+
+def close_resource_pools():
+    """
+    Tear down the resources of every pool of this process, e.g. between
+    test runs.
+    """
+    with _pools_lock:
+        pools = _pools.pop(os.getpid(), {})
+    for pool, _ in pools.values():
+        pool.close()
+
+
+def _get_pool(settings):
+    """
+    :param settings:
+        A resource with the 'process' scope.
+    :type settings:
+        :class:`_ResourceSettings`
+    :return:
+        The pool of this process shared by the resources of that name,
+        created if needed.
+    :rtype:
+        :class:`GentyResourcePool`
+    :raises:
+        ValueError if the pool of that name was created with another
+        factory, pool size, teardown, validate callable or checkout timeout.
+    """
+    with _pools_lock:
+        pools = _pools.setdefault(os.getpid(), {})
+        pool, pool_settings = pools.get(settings.name, (None, None))
+        if pool is None:
+            pool = GentyResourcePool(
+                settings.factory,
+                settings.pool_size,
+                settings.teardown,
+                settings.validate,
+                settings.checkout_timeout,
+            )
+            pools[settings.name] = (pool, settings)
+            return pool
+    for field in _POOL_SETTINGS:
+        if getattr(pool_settings, field) != getattr(settings, field):
+            raise ValueError(
+                'The resource {0!r} is pooled with the {1} {2!r}, '
+                "so it can't also use {3!r}. Please give it another name.".format(
+                    settings.name,
+                    field,
+                    getattr(pool_settings, field),
+                    getattr(settings, field),
+                )
+            )
+    return pool
+
+
+def _build_resource_method(method, resources):
+    """
+    Return a fabricated method that passes resources to 'method' as keyword
+    arguments, checking them out for the duration of the call.
+
+    :param method:
+        The underlying test method.
+    :type method:
+        `callable`
+    :param resources:
+        The resources to inject.
+    :type resources:
+        `list` of :class:`_ResourceSettings`
+    :return:
+        Return an unbound function calling 'method'
+    :rtype:
+        `function`
+    """
+    def test_method_wrapper(my_self, *args, **kwargs):
+        checked_out = []
+        errored = False
+        try:
+            for settings in resources:
+                if settings.scope == 'process':
+                    pool = _get_pool(settings)
+                    resource = pool.checkout()
+                    checked_out.append((settings, pool, resource))
+                else:
+                    resource = settings.factory()
+                    checked_out.append((settings, None, resource))
+                kwargs[settings.name] = resource
+            return method(my_self, *args, **kwargs)
+        except SkipTest:
+            raise
+        except Exception:
+            errored = True
+            raise
+        finally:
+            for settings, pool, resource in reversed(checked_out):
+                if pool is not None:
+                    pool.checkin(resource, errored)
+                elif settings.teardown:
+                    settings.teardown(resource)
+
+    return test_method_wrapper
+
+
+atexit.register(close_resource_pools)
@@ -0,0 +1,283 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import atexit
+from collections import namedtuple
+import mmap
+import os
+import tempfile
+import threading
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8 falls back to memory-mapped files.
+    shared_memory = None
+
+
+# Where a shared buffer lives: a shared memory block, along with the pid of
+# the resource tracker of the process that created it, or else a
+# memory-mapped file.
+_SharedLocation = namedtuple('_SharedLocation', ['name', 'tracker_pid', 'path'])
+
+
+class GentyShared(object):
+    """
+    Store a buffer once in memory shared between processes, and hand out
+    views of it to the generated tests using it.
+    """
+    def __init__(self, buffer, label=None):
+        super(GentyShared, self).__init__()
+        if not hasattr(memoryview, 'cast'):
+            raise ValueError('genty_shared needs Python 3 memoryviews, which are not available in this Python.')
+        data = memoryview(buffer)
+        if not data.c_contiguous:
+            # e.g. slices of numpy arrays. Copy them in C order, the order
+            # numpy views of the shared buffer read them in.
+            data = memoryview(data.tobytes())
+        self._nbytes = data.nbytes
+        self._label = label or 'shared({0} bytes)'.format(self._nbytes)
+        # Keep the dtype and shape of numpy arrays, to hand out numpy views.
+        self._array_type = None
+        if hasattr(buffer, 'dtype'):
+            self._array_type = (buffer.dtype, buffer.shape)
+        self._creator_pid = os.getpid()
+        self._lock = threading.Lock()
+        self._memory = None
+        self._location = self._create(data)
+        _created.append(self)
+
+    @property
+    def label(self):
+        """Return the name identifying the value in test names."""
+        return self._label
+
+    @property
+    def name(self):
+        """Return the name of the shared memory block, or the path of the mapped file."""
+        return self._location.name or self._location.path
+
+    def resolve(self):
+        """
+        :return:
+            A read-only, zero-copy view of the shared buffer: a numpy array
+            with the dtype and shape of the original buffer if it was a
+            numpy array, or else a memoryview of bytes.
+        :rtype:
+            `memoryview` or `numpy.ndarray`
+        """
+        view = memoryview(self._attach())[:self._nbytes]
+        if hasattr(view, 'toreadonly'):
+            view = view.toreadonly()
+        if self._array_type is None:
+            return view
+        import numpy  # pylint:disable=import-error
+        dtype, shape = self._array_type
+        array = numpy.frombuffer(view, dtype=dtype).reshape(shape)
+        array.flags.writeable = False
+        return array
+
+    def close(self):
+        """
+        Release the shared buffer. The process that created it also frees
+        it, after which it can't be resolved anymore.
+        """
+        with self._lock:
+            memory, self._memory = self._memory, None
+        if memory is None:
+            return
+        is_creator = os.getpid() == self._creator_pid
+        try:
+            memory.close()
+        except BufferError:
+            # Views handed out to tests are still alive. Keep the memory
+            # around until the process exits instead.
+            _still_exported.append(memory)
+        if is_creator:
+            if shared_memory is not None:
+                memory.unlink()
+            else:
+                os.remove(self._location.path)
+
+    def _create(self, data):
+        """
+        Copy a buffer into newly allocated shared memory.
+
+        :param data:
+            The buffer.
+        :type data:
+            `memoryview`
+        :return:
+            Where the shared memory lives.
+        :rtype:
+            :class:`_SharedLocation`
+        """
+        size = max(self._nbytes, 1)
+        if shared_memory is not None:
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+            self._memory.buf[:self._nbytes] = data.cast('B')
+            return _SharedLocation(self._memory.name, _get_resource_tracker_pid(), None)
+        file_descriptor, path = tempfile.mkstemp(prefix='genty_shared_')
+        try:
+            os.write(file_descriptor, data.tobytes())
+            if not self._nbytes:
+                os.write(file_descriptor, b'\0')
+        finally:
+            os.close(file_descriptor)
+        self._memory = _map_file(path)
+        return _SharedLocation(None, None, path)
+
+    def _attach(self):
+        """
+        :return:
+            The shared memory, attached to in this process if it was created
+            in another one, e.g. after being unpickled.
+        :rtype:
+            `buffer`
+        """
+        with self._lock:
+            if self._memory is None:
+                name, tracker_pid, path = self._location
+                if name is not None:
+                    self._memory = _attach_shared_memory(name, tracker_pid)
+                else:
+                    self._memory = _map_file(path)
+            memory = self._memory
+        return memory.buf if shared_memory is not None else memory
+
+    def __getstate__(self):
+        # Only send the name of the shared memory to other processes, not
+        # its content: they attach to it when resolving.
+        state = dict(self.__dict__)
+        state['_memory'] = None
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return self._label
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, self._label)
+
+
+_created = []
+_still_exported = []
+
+
+def genty_shared(buffer, label=None):
+    """
+    Used to pass a large buffer, e.g. bytes or a numpy array, in a dataset
+    to tests that may run in other processes, without copying it into each
+    of them.
+
+    The buffer is copied once into shared memory (or, before Python 3.8, a
+    memory-mapped temporary file). When the generated test runs, it receives
+    a read-only view of the shared memory instead: a numpy array for numpy
+    arrays, or else a memoryview. Processes forked from this one, and
+    processes this value is pickled to, read the same memory:
+        @genty_dataset(
+            small=(genty_shared(SMALL_IMAGE),),
+            large=(genty_shared(LARGE_IMAGE),),
+        )
+        def test_resize(self, image):
+            ...
+
+    The shared memory is freed when the process that created it exits.
+    Shared values need Python 3.
+
+    :param buffer:
+        Object supporting the buffer protocol, such as bytes, a bytearray or
+        a numpy array.
+    :type buffer:
+        `bytes` or `bytearray` or `numpy.ndarray`
+    :param label:
+        The name identifying the value in test names. Defaults to its size.
+    :type label:
+        `unicode` or None
+    :return:
+        The shared buffer.
+    :rtype:
+        :class:`GentyShared`
+    :raises:
+        ValueError on Python 2.
+    """
+    return GentyShared(buffer, label)
+
+
+def _map_file(path):
+    """
+    :param path:
+        The path of the file backing a shared buffer.
+    :type path:
+        `unicode`
+    :return:
+        The file, mapped read-only.
+    :rtype:
+        :class:`mmap.mmap`
+    """
+    with open(path, 'rb') as mapped_file:
+        return mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _get_resource_tracker_pid():
+    """
+    :return:
+        The pid of the resource tracker of this process, if this process or
+        its parent started it, else None.
+    :rtype:
+        `int` or None
+    """
+    try:
+        from multiprocessing import resource_tracker
+    except ImportError:
+        return None
+    return getattr(getattr(resource_tracker, '_resource_tracker', None), '_pid', None)
+
+
+def _attach_shared_memory(name, tracker_pid):
+    """
+    :param name:
+        The name of a shared memory block created by another process.
+    :type name:
+        `unicode`
+    :param tracker_pid:
+        The pid of the resource tracker of the process that created the
+        block, if known.
+    :type tracker_pid:
+        `int` or None
+    :return:
+        The shared memory block, without registering it to be freed when
+        this process exits, since the process that created it does that.
+    :rtype:
+        :class:`multiprocessing.shared_memory.SharedMemory`
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # pylint:disable=unexpected-keyword-arg
+    except TypeError:
+        pass
+    # Python < 3.13 can't opt out of tracking. A resource tracker of this
+    # process' own would unlink the block when this process exits
+    # (bpo-39959), so unregister the block from it. Processes forked or
+    # spawned by multiprocessing share the tracker of their parent instead,
+    # where the block is registered already.
+    from multiprocessing import resource_tracker
+    tracker = resource_tracker._resource_tracker  # pylint:disable=protected-access
+    had_tracker = tracker._fd is not None  # pylint:disable=protected-access
+    memory = shared_memory.SharedMemory(name=name)
+    own_tracker_pid = _get_resource_tracker_pid()
+    if not had_tracker or (own_tracker_pid is not None and own_tracker_pid != tracker_pid):
+        resource_tracker.unregister(memory._name, 'shared_memory')  # pylint:disable=protected-access
+    return memory
+
+
+def _close_created():
+    """Free the shared buffers created by this process."""
+    for shared in _created:
+        shared.close()
+
+
+atexit.register(_close_created)
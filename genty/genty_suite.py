@@ -0,0 +1,712 @@
+# coding: utf-8
+
+from __future__ import absolute_import, unicode_literals
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import sys
+import traceback
+import unittest
+import warnings
+
+from .genty_report import get_reports, merge_reports
+
+
+DEFAULT_MAX_WORKERS = 8
+PREFETCH_ENV_VAR = 'GENTY_PREFETCH'
+PREFETCHED_ATTRIBUTE = 'genty_prefetched'
+
+
+def genty_threadsafe(max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Mark the tests generated from a test method as safe to run concurrently.
+
+    When run by a :class:`GentyTestSuite`, e.g. with 'python -m genty', the
+    tests generated from the decorated method run concurrently in a pool of
+    threads, each with its own TestCase instance. Results are reported in
+    the order the tests would have run in. This suits I/O bound tests whose
+    datasets are independent:
+        @genty_threadsafe(max_workers=16)
+        @genty_dataset(*ENDPOINTS)
+        def test_endpoint(self, endpoint):
+            ...
+
+    Only tests that are next to each other in the suite run together, so
+    ordering tests with :func:`genty.genty_loader.order_tests` can split
+    them up.
+
+    :param max_workers:
+        The maximum number of tests to run at the same time.
+    :type max_workers:
+        `int`
+    """
+    if max_workers < 1:
+        raise ValueError(
+            "Can't run tests on {0} threads. Please pick a value >= 1.".format(max_workers)
+        )
+
+    def wrap(test_method):
+        test_method.genty_threadsafe = max_workers
+        return test_method
+    return wrap
+
+
+def genty_isolated(batch_size=1, max_workers=1):
+    """
+    Mark the tests generated from a test method as needing to run in their
+    own process, e.g. because they change global state.
+
+    When run by a :class:`GentyTestSuite`, e.g. with 'python -m genty', the
+    tests generated from the decorated method run in processes forked from
+    the test runner, 'batch_size' tests per process. The forked processes
+    start with the modules the runner already imported and the class
+    fixtures it already set up, shared copy-on-write, instead of paying for
+    a new interpreter. Their results are sent back to the runner over a
+    pipe:
+        @genty_isolated(batch_size=10, max_workers=4)
+        @genty_dataset(*LOCALES)
+        def test_format_date(self, locale):
+            set_global_locale(locale)
+            ...
+
+    Without os.fork, e.g. on Windows, the tests run in the runner process.
+
+    :param batch_size:
+        The number of tests to run in each forked process.
+    :type batch_size:
+        `int`
+    :param max_workers:
+        The maximum number of forked processes to run at the same time.
+    :type max_workers:
+        `int`
+    """
+    if batch_size < 1:
+        raise ValueError(
+            "Can't run {0} tests per process. Please pick a value >= 1.".format(batch_size)
+        )
+    if max_workers < 1:
+        raise ValueError(
+            "Can't run tests in {0} processes. Please pick a value >= 1.".format(max_workers)
+        )
+
+    def wrap(test_method):
+        test_method.genty_isolated = (batch_size, max_workers)
+        return test_method
+    return wrap
+
+
+class GentyTestSuite(unittest.TestSuite):
+    """
+    Test suite running the tests generated by @genty from a method marked
+    with @genty_threadsafe concurrently, and those generated from a method
+    marked with @genty_isolated in forked processes.
+
+    When the GENTY_PREFETCH environment variable is set to a number of
+    threads, it also calls the dataproviders passed to @genty_dataprovider
+    with prefetch=True ahead of time: while a test runs, a pool of that many
+    threads calls the dataproviders of the next tests, at most that many
+    tests ahead. Prefetched values that no test used are dropped once the
+    test they were fetched for is done.
+    """
+    def run(self, result, debug=False):  # pylint:disable=arguments-differ
+        """Override of :meth:`TestSuite.run`."""
+        if debug:
+            return super(GentyTestSuite, self).run(result, debug)
+        self._tests = _batch_tests(self._tests)
+        prefetch_workers = _get_prefetch_workers()
+        if not prefetch_workers:
+            return self._run_tests(result)
+        tests = self._tests
+        prefetcher = _Prefetcher(tests, prefetch_workers)
+        self._tests = [
+            _PrefetchingTest(test, prefetcher, index) if isinstance(test, unittest.TestCase) else test
+            for index, test in enumerate(tests)
+        ]
+        try:
+            return self._run_tests(result)
+        finally:
+            prefetcher.close()
+
+    def _run_tests(self, result):
+        """
+        Run the tests like :meth:`TestSuite.run` does, handling the class and
+        module fixtures of the stand-ins for batches of tests as it would
+        for the tests they stand for.
+
+        :param result:
+            The result to report to.
+        :type result:
+            :class:`TestResult`
+        :return:
+            The result.
+        :rtype:
+            :class:`TestResult`
+        """
+        # pylint:disable=protected-access
+        top_level = False
+        if getattr(result, '_testRunEntered', False) is False:
+            result._testRunEntered = top_level = True
+
+        for index, test in enumerate(self):
+            if result.shouldStop:
+                break
+            fixture_test = _get_fixture_test(test)
+            if fixture_test is not None:
+                self._tearDownPreviousClass(fixture_test, result)
+                self._handleModuleFixture(fixture_test, result)
+                self._handleClassSetUp(fixture_test, result)
+                result._previousTestClass = type(fixture_test)
+                if getattr(type(fixture_test), '_classSetupFailed', False) \
+                        or getattr(result, '_moduleSetUpFailed', False):
+                    continue
+            test(result)
+            if getattr(self, '_cleanup', False):
+                self._removeTestAtIndex(index)
+
+        if top_level:
+            self._tearDownPreviousClass(None, result)
+            self._handleModuleTearDown(result)
+            result._testRunEntered = False
+        return result
+
+
+class _ConcurrentTests(object):
+    """
+    Stand-in for consecutive tests of a class that run concurrently.
+
+    :class:`GentyTestSuite` handles the class and module fixtures of its
+    :attr:`fixture_test` as it would for the tests.
+    """
+    def __init__(self, tests, max_workers):
+        super(_ConcurrentTests, self).__init__()
+        self._tests = tests
+        self._max_workers = max_workers
+
+    @property
+    def fixture_test(self):
+        """Return the test whose class and module fixtures the tests need."""
+        return self._tests[0]
+
+    def __call__(self, result):
+        workers = min(self._max_workers, len(self._tests))
+        pool = ThreadPool(workers)
+        try:
+            # Run as many tests at a time as there are threads, to stop
+            # between batches once the result asks to, e.g. with failfast.
+            for index in range(0, len(self._tests), workers):
+                if result.shouldStop:
+                    break
+                for recording in pool.map(_run_recording, self._tests[index:index + workers]):
+                    recording.replay(result)
+        finally:
+            pool.close()
+            pool.join()
+
+    def countTestCases(self):  # pylint:disable=invalid-name
+        """Implementation of :meth:`TestCase.countTestCases`."""
+        return len(self._tests)
+
+
+class _IsolatedTests(object):
+    """
+    Stand-in for consecutive tests of a class that run in forked processes.
+
+    :class:`GentyTestSuite` handles the class and module fixtures of its
+    :attr:`fixture_test` as it would for the tests. The fixtures are
+    therefore set up in the runner process, before forking.
+    """
+    def __init__(self, tests, batch_size, max_workers):
+        super(_IsolatedTests, self).__init__()
+        self._tests = tests
+        self._batch_size = batch_size
+        self._max_workers = max_workers
+
+    @property
+    def fixture_test(self):
+        """Return the test whose class and module fixtures the tests need."""
+        return self._tests[0]
+
+    def __call__(self, result):
+        if not hasattr(os, 'fork'):
+            for test in self._tests:
+                test(result)
+            return
+        batches = [
+            self._tests[index:index + self._batch_size]
+            for index in range(0, len(self._tests), self._batch_size)
+        ]
+        outcomes = _run_in_forked_processes(_run_isolated_batch, batches, self._max_workers)
+        for batch, (calls, exit_code) in zip(batches, outcomes):
+            if calls is None:
+                calls = _build_error_calls(
+                    len(batch),
+                    'The isolated process running this test exited with code {0}.'.format(exit_code),
+                )
+            _replay_calls(batch, calls, result)
+
+    def countTestCases(self):  # pylint:disable=invalid-name
+        """Implementation of :meth:`TestCase.countTestCases`."""
+        return len(self._tests)
+
+
+class RemoteTestError(Exception):
+    """
+    Exception standing for an error raised by a test in another process.
+    Its message is the traceback of the original error.
+    """
+    pass
+
+
+class _Prefetcher(object):
+    """
+    Calls the dataproviders of upcoming tests in a pool of threads.
+    """
+    def __init__(self, tests, workers):
+        super(_Prefetcher, self).__init__()
+        self._tests = tests
+        self._pool = ThreadPool(workers)
+        self._depth = workers
+        self._next_index = 0
+
+    def advance(self, index):
+        """
+        Start prefetching for the given test and the tests following it, up
+        to the depth of the pool.
+
+        :param index:
+            The index of the test about to run.
+        :type index:
+            `int`
+        """
+        last_index = min(index + self._depth, len(self._tests) - 1)
+        while self._next_index <= last_index:
+            test = self._tests[self._next_index]
+            self._next_index += 1
+            prefetch = _get_prefetch(test)
+            if prefetch is not None:
+                setattr(test, PREFETCHED_ATTRIBUTE, self._pool.apply_async(prefetch, (test,)))
+
+    def close(self):
+        """Wait for the pending prefetches, and stop the threads."""
+        self._pool.close()
+        self._pool.join()
+
+
+class _PrefetchingTest(object):
+    """
+    Stand-in for a test, prefetching for the tests following it before it
+    runs.
+
+    :class:`GentyTestSuite` handles the class and module fixtures of its
+    :attr:`fixture_test` as it would for the test.
+    """
+    def __init__(self, test, prefetcher, index):
+        super(_PrefetchingTest, self).__init__()
+        self._test = test
+        self._prefetcher = prefetcher
+        self._index = index
+
+    @property
+    def fixture_test(self):
+        """Return the test whose class and module fixtures it needs."""
+        return self._test
+
+    def __call__(self, result):
+        self._prefetcher.advance(self._index)
+        try:
+            return self._test(result)
+        finally:
+            # Drop the prefetched value if the test didn't use it, e.g.
+            # because it was skipped.
+            vars(self._test).pop(PREFETCHED_ATTRIBUTE, None)
+
+    def countTestCases(self):  # pylint:disable=invalid-name
+        """Implementation of :meth:`TestCase.countTestCases`."""
+        return self._test.countTestCases()
+
+
+class _RecordingResult(unittest.TestResult):
+    """
+    Test result recording the calls made to it, to replay them later on
+    another result.
+    """
+    _RECORDED_METHODS = (
+        'startTest',
+        'stopTest',
+        'addSuccess',
+        'addFailure',
+        'addError',
+        'addSkip',
+        'addExpectedFailure',
+        'addUnexpectedSuccess',
+        'addSubTest',
+        'addDuration',
+    )
+
+    def __init__(self):
+        super(_RecordingResult, self).__init__()
+        self._calls = []
+        for name in self._RECORDED_METHODS:
+            if hasattr(unittest.TestResult, name):
+                setattr(self, name, self._build_recorder(name))
+
+    def _build_recorder(self, name):
+        recorded_method = getattr(super(_RecordingResult, self), name)
+
+        def recorder(*args):
+            self._calls.append((name, args))
+            return recorded_method(*args)
+        return recorder
+
+    @property
+    def calls(self):
+        """Return the recorded calls, as tuples of method name and arguments."""
+        return self._calls
+
+    def replay(self, result):
+        """
+        Make the recorded calls on the given result.
+
+        :param result:
+            The result to replay the calls on.
+        :type result:
+            :class:`TestResult`
+        """
+        for name, args in self._calls:
+            method = getattr(result, name, None)
+            if method is not None:
+                method(*args)
+
+
+def _run_recording(test):
+    """
+    :param test:
+        The test to run.
+    :type test:
+        :class:`TestCase`
+    :return:
+        The result the test ran with, recording its outcome.
+    :rtype:
+        :class:`_RecordingResult`
+    """
+    result = _RecordingResult()
+    test(result)
+    return result
+
+
+def _get_fixture_test(test):
+    """
+    :param test:
+        A test, a stand-in for tests, or a suite.
+    :type test:
+        :class:`TestCase` or :class:`TestSuite` or `object`
+    :return:
+        The test whose class and module fixtures must be set up before
+        running it, or None for suites, which handle their own.
+    :rtype:
+        :class:`TestCase` or None
+    """
+    fixture_test = getattr(test, 'fixture_test', None)
+    if fixture_test is not None:
+        return fixture_test
+    try:
+        iter(test)
+    except TypeError:
+        return test
+    return None
+
+
+def _get_batch_key(test):
+    """
+    :param test:
+        A test.
+    :type test:
+        :class:`TestCase`
+    :return:
+        The class and original method name of a test generated from a
+        method marked with @genty_isolated or @genty_threadsafe, along with
+        the marker and its settings, or None.
+    :rtype:
+        `tuple` or None
+    """
+    method_name = getattr(test, '_testMethodName', None)
+    method = getattr(type(test), method_name, None) if method_name else None
+    test_info = getattr(method, 'genty_test_info', None)
+    if test_info is None:
+        return None
+    isolated = getattr(method, 'genty_isolated', None)
+    if isolated:
+        return type(test), test_info.method_name, 'isolated', isolated
+    max_workers = getattr(method, 'genty_threadsafe', None)
+    if max_workers:
+        return type(test), test_info.method_name, 'threadsafe', max_workers
+    return None
+
+
+def _batch_tests(tests):
+    """
+    Replace runs of consecutive tests generated from the same method marked
+    with @genty_threadsafe by a single :class:`_ConcurrentTests`, and those
+    marked with @genty_isolated by a single :class:`_IsolatedTests`.
+
+    :param tests:
+        The tests of a suite.
+    :type tests:
+        `list`
+    :return:
+        The tests, batched.
+    :rtype:
+        `list`
+    """
+    batched = []
+    batch = []
+    batch_key = None
+    for test in list(tests) + [None]:
+        key = _get_batch_key(test) if test is not None else None
+        if batch and key != batch_key:
+            _, _, marker, settings = batch_key
+            if marker == 'isolated':
+                batched.append(_IsolatedTests(batch, *settings))
+            elif len(batch) > 1:
+                batched.append(_ConcurrentTests(batch, settings))
+            else:
+                batched.extend(batch)
+            batch = []
+        if key is None:
+            if test is not None:
+                batched.append(test)
+        else:
+            batch.append(test)
+        batch_key = key
+    return batched
+
+
+def _run_in_forked_processes(function, items, max_workers):
+    """
+    Call a function on each item, each time in a new process forked from
+    this one. The function doesn't need to be picklable, its return values
+    do. The entries the processes record in the genty reports are merged
+    into the reports of this process, since they exit without writing them.
+
+    :param function:
+        The function to call.
+    :type function:
+        `callable`
+    :param items:
+        The items to call the function on.
+    :type items:
+        `list`
+    :param max_workers:
+        The maximum number of processes to run at the same time.
+    :type max_workers:
+        `int`
+    :return:
+        For each item, in order, the return value of the function, or None
+        if the process exited without returning one, and the exit code of
+        the process.
+    :rtype:
+        `list` of `tuple`
+    """
+    get_context = getattr(multiprocessing, 'get_context', None)
+    context = get_context('fork') if get_context else multiprocessing
+    outcomes = []
+    running = []
+    pending = list(items)
+    while pending or running:
+        while pending and len(running) < max_workers:
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_send_return_value, args=(function, pending.pop(0), sender))
+            process.start()
+            sender.close()
+            running.append((process, receiver))
+        process, receiver = running.pop(0)
+        try:
+            return_value, reports = receiver.recv()
+            merge_reports(reports)
+        except EOFError:
+            return_value = None
+        receiver.close()
+        process.join()
+        outcomes.append((return_value, process.exitcode))
+    return outcomes
+
+
+def _send_return_value(function, item, connection):
+    """
+    Call a function on an item, and send its return value over a pipe,
+    along with the entries recorded in the genty reports during the call.
+
+    :param function:
+        The function to call.
+    :type function:
+        `callable`
+    :param item:
+        The item to call the function on.
+    :type item:
+        varies
+    :param connection:
+        The end of the pipe to send the return value to.
+    :type connection:
+        :class:`multiprocessing.connection.Connection`
+    """
+    reports = get_reports()
+    return_value = function(item)
+    connection.send((return_value, get_reports(since=reports)))
+    connection.close()
+
+
+def _run_isolated_batch(tests):
+    """
+    Run tests, and turn the calls they made to their result into values
+    that can be sent between processes.
+
+    :param tests:
+        The tests to run.
+    :type tests:
+        `list` of :class:`TestCase`
+    :return:
+        The calls made to the result, as returned by
+        :func:`_serialize_calls`.
+    :rtype:
+        `list` of `tuple`
+    """
+    result = _RecordingResult()
+    for test in tests:
+        test(result)
+    return _serialize_calls(tests, result.calls)
+
+
+def _serialize_calls(tests, calls):
+    """
+    Turn the calls that tests made to a :class:`_RecordingResult` into
+    values that can be sent between processes, e.g. as JSON.
+
+    :param tests:
+        The tests that ran.
+    :type tests:
+        `list` of :class:`TestCase`
+    :param calls:
+        The calls recorded by the result.
+    :type calls:
+        `list` of `tuple`
+    :return:
+        The calls, as tuples of the name of the method, the index of the
+        test, and the remaining arguments, with errors formatted as strings.
+        Calls about something other than the tests, e.g. errors in class
+        fixtures, are reported on the first test.
+    :rtype:
+        `list` of `tuple`
+    """
+    serialized_calls = []
+    for name, args in calls:
+        test, arguments = args[0], list(args[1:])
+        if name == 'addSubTest':
+            # Sub tests can't be sent back, report their errors on the test.
+            _, err = arguments
+            if err is None:
+                continue
+            is_failure = issubclass(err[0], test.failureException)
+            name = 'addFailure' if is_failure else 'addError'
+            arguments = [err]
+        if name in ('addFailure', 'addError', 'addExpectedFailure'):
+            arguments = [''.join(traceback.format_exception(*arguments[0]))]
+        index = next((index for index, other in enumerate(tests) if other is test), 0)
+        serialized_calls.append((name, index, arguments))
+    return serialized_calls
+
+
+def _build_error_calls(count, message):
+    """
+    :param count:
+        The number of tests.
+    :type count:
+        `int`
+    :param message:
+        The error message.
+    :type message:
+        `unicode`
+    :return:
+        Serialized calls reporting the same error for each test.
+    :rtype:
+        `list` of `tuple`
+    """
+    calls = []
+    for index in range(count):
+        calls.extend([
+            ('startTest', index, []),
+            ('addError', index, [message]),
+            ('stopTest', index, []),
+        ])
+    return calls
+
+
+def _replay_calls(tests, calls, result):
+    """
+    Make the calls that tests made to their result in another process on
+    the given result.
+
+    :param tests:
+        The tests that ran in the other process.
+    :type tests:
+        `list` of :class:`TestCase`
+    :param calls:
+        The calls, as returned by :func:`_serialize_calls`.
+    :type calls:
+        `list` of `tuple`
+    :param result:
+        The result to make the calls on.
+    :type result:
+        :class:`TestResult`
+    """
+    for name, index, arguments in calls:
+        method = getattr(result, name, None)
+        if method is None:
+            continue
+        if name in ('addFailure', 'addError', 'addExpectedFailure'):
+            try:
+                raise RemoteTestError(arguments[0])
+            except RemoteTestError:
+                arguments = [sys.exc_info()]
+        method(tests[index], *arguments)
+
+
+def _get_prefetch(test):
+    """
+    :param test:
+        A test.
+    :type test:
+        :class:`TestCase`
+    :return:
+        Function taking the test and returning the params of its
+        dataprovider, if the test was generated with a dataprovider that can
+        be prefetched and isn't skipped, or None.
+    :rtype:
+        `function` or None
+    """
+    method_name = getattr(test, '_testMethodName', None)
+    method = getattr(type(test), method_name, None) if method_name else None
+    if getattr(type(test), '__unittest_skip__', False) or getattr(method, '__unittest_skip__', False):
+        return None
+    return getattr(method, 'genty_prefetch', None)
+
+
+def _get_prefetch_workers():
+    """
+    :return:
+        The number of threads prefetching dataprovider params, set by the
+        GENTY_PREFETCH environment variable, or 0 if prefetching is off.
+        Values that aren't a number of threads turn it off, with a warning.
+    :rtype:
+        `int`
+    """
+    value = os.environ.get(PREFETCH_ENV_VAR, '').strip()
+    if not value:
+        return 0
+    try:
+        workers = int(value)
+    except ValueError:
+        workers = -1
+    if workers < 0:
+        warnings.warn('{0}={1!r} is not a number of threads, not prefetching.'.format(PREFETCH_ENV_VAR, value))
+        return 0
+    return workers
@@ -0,0 +1,152 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import os
+import re
+
+import six
+
+from .genty_args import GentyArgs
+
+
+TAGS_ENV_VAR = 'GENTY_TAGS'
+
+_TOKENS = re.compile(r'\s*([()]|[^\s()]+)')
+_OPERATORS = ('and', 'or', 'not')
+
+
+def genty_tags(*tags):
+    """
+    Tag all the tests generated from the decorated method:
+        @genty_tags('network')
+        @genty_dataset(
+            genty_args('example.com'),
+            genty_args('example.org', _tags={'slow'}),
+        )
+        def test_resolve(self, host):
+            ...
+
+    Datasets passed with genty_args can add their own tags, with the '_tags'
+    keyword argument, which isn't passed to the test.
+
+    Setting the GENTY_TAGS environment variable to a boolean expression of
+    tags, e.g. 'network and not slow', only generates the tests whose tags
+    match it when @genty decorates the class. The other datasets are
+    dropped before any test method is built for them.
+
+    :param tags:
+        The tags.
+    :type tags:
+        `tuple` of `unicode`
+    """
+    def wrap(test_method):
+        test_method.genty_tags = frozenset(getattr(test_method, 'genty_tags', ())) | frozenset(tags)
+        return test_method
+    return wrap
+
+
+def parse_tag_expression(expression):
+    """
+    Parse a boolean expression of tags, made of tag names, 'and', 'or',
+    'not' and parentheses, e.g. '(network or db) and not slow'.
+
+    :param expression:
+        The expression.
+    :type expression:
+        `unicode`
+    :return:
+        Function taking a set of tags, and returning whether they match the
+        expression.
+    :rtype:
+        `function`
+    :raises:
+        ValueError if the expression is invalid.
+    """
+    tokens = _TOKENS.findall(expression)
+    if not tokens or ''.join(tokens) != re.sub(r'\s', '', expression):
+        raise ValueError('Invalid tag expression {0!r}.'.format(expression))
+    position = [0]
+
+    def peek():
+        return tokens[position[0]] if position[0] < len(tokens) else None
+
+    def take(expected=None):
+        token = peek()
+        if token is None or (expected is not None and token != expected):
+            raise ValueError('Invalid tag expression {0!r}: expected {1} at token {2}.'.format(
+                expression,
+                expected or 'a tag',
+                position[0] + 1,
+            ))
+        position[0] += 1
+        return token
+
+    def parse_or():
+        operands = [parse_and()]
+        while peek() == 'or':
+            take('or')
+            operands.append(parse_and())
+        return lambda tags: any(operand(tags) for operand in operands)
+
+    def parse_and():
+        operands = [parse_not()]
+        while peek() == 'and':
+            take('and')
+            operands.append(parse_not())
+        return lambda tags: all(operand(tags) for operand in operands)
+
+    def parse_not():
+        if peek() == 'not':
+            take('not')
+            operand = parse_not()
+            return lambda tags: not operand(tags)
+        if peek() == '(':
+            take('(')
+            operand = parse_or()
+            take(')')
+            return operand
+        tag = take()
+        if tag in _OPERATORS or tag == ')':
+            raise ValueError('Invalid tag expression {0!r}: unexpected {1!r}.'.format(expression, tag))
+        return lambda tags: tag in tags
+
+    matches = parse_or()
+    if peek() is not None:
+        raise ValueError('Invalid tag expression {0!r}: unexpected {1!r}.'.format(expression, peek()))
+    return matches
+
+
+def _get_tag_filter():
+    """
+    :return:
+        The tag expression set by the GENTY_TAGS environment variable,
+        parsed, or None if it isn't set.
+    :rtype:
+        `function` or None
+    """
+    expression = os.environ.get(TAGS_ENV_VAR, '').strip()
+    return parse_tag_expression(expression) if expression else None
+
+
+def _get_dataset_tags(func, dataset):
+    """
+    :param func:
+        The underlying test function.
+    :type func:
+        `function`
+    :param dataset:
+        The dataset, or None.
+    :type dataset:
+        `tuple` or :class:`GentyArgs` or None
+    :return:
+        The tags of the test function and of the dataset.
+    :rtype:
+        `frozenset` of `unicode`
+    """
+    tags = frozenset(getattr(func, 'genty_tags', ()))
+    if isinstance(dataset, GentyArgs):
+        dataset_tags = dataset.options.get('_tags', ())
+        if isinstance(dataset_tags, six.string_types):
+            dataset_tags = (dataset_tags,)
+        tags |= frozenset(dataset_tags)
+    return tags
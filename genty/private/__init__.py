@@ -1,9 +1,20 @@
 # coding: utf-8
 
 from __future__ import unicode_literals
+from collections import namedtuple
+import json
+import sys
 import six
 
 
+# Describes a generated test: its stable id and the parts its name is built
+# from. The dataprovider name, dataset name and repeat suffix can be None.
+GentyTestInfo = namedtuple(
+    'GentyTestInfo',
+    ['test_id', 'method_name', 'dataprovider_name', 'dataset_name', 'repeat_suffix'],
+)
+
+
 def format_kwarg(key, value):
     """
     Return a string of form:  "key=<value>"
@@ -48,3 +59,41 @@ def encode_non_ascii_string(string):
         encoded_string = encoded_string.decode()
 
     return encoded_string
+
+
+def reraise_with_note(note):
+    """
+    Re-raise the exception currently being handled, appending the given
+    note to its message so that it shows up in the test runner's output.
+
+    Exceptions whose args are not a single message are re-raised untouched.
+
+    :param note:
+        Extra information to add to the exception message.
+    :type note:
+        `unicode`
+    """
+    exc_type, exc_value, exc_traceback = sys.exc_info()
+    args = exc_value.args
+    if not args:
+        exc_value.args = (note,)
+    elif len(args) == 1 and isinstance(args[0], six.string_types):
+        exc_value.args = ('{0}\n{1}'.format(args[0], note),)
+    six.reraise(exc_type, exc_value, exc_traceback)
+
+
+def to_json(data):
+    """
+    :param data:
+        JSON serializable data.
+    :type data:
+        varies
+    :return:
+        The data as an indented JSON document with sorted keys.
+    :rtype:
+        `unicode`
+    """
+    text = json.dumps(data, indent=2, sort_keys=True, ensure_ascii=False)
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    return text
@@ -0,0 +1,93 @@
+# coding: utf-8
+
+from __future__ import division, unicode_literals
+import math
+import timeit
+
+try:
+    from time import perf_counter_ns
+except ImportError:
+    def perf_counter_ns():
+        """
+        Fallback for Pythons that predate :func:`time.perf_counter_ns`.
+
+        :return:
+            Value of the highest resolution clock available, in nanoseconds.
+        :rtype:
+            `int`
+        """
+        return int(timeit.default_timer() * 1e9)
+
+
+NANOSECONDS_PER_SECOND = 10 ** 9
+
+
+def ns_to_seconds(nanoseconds):
+    """
+    :param nanoseconds:
+        A duration in nanoseconds.
+    :type nanoseconds:
+        `int`
+    :return:
+        The same duration in seconds.
+    :rtype:
+        `float`
+    """
+    return nanoseconds / NANOSECONDS_PER_SECOND
+
+
+def percentile(sorted_samples, fraction):
+    """
+    Return the given percentile of some samples, interpolating linearly
+    between the closest ranks.
+
+    :param sorted_samples:
+        The samples, sorted in ascending order. Must not be empty.
+    :type sorted_samples:
+        `list` of `int` or `float`
+    :param fraction:
+        The percentile, as a fraction between 0 and 1.
+    :type fraction:
+        `float`
+    :return:
+        The value below which the given fraction of samples fall.
+    :rtype:
+        `float`
+    """
+    position = (len(sorted_samples) - 1) * fraction
+    lower = int(math.floor(position))
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    weight = position - lower
+    return sorted_samples[lower] * (1 - weight) + sorted_samples[upper] * weight
+
+
+def summarize(samples):
+    """
+    Summarize the distribution of some timing samples.
+
+    :param samples:
+        The samples, in nanoseconds. Must not be empty.
+    :type samples:
+        `list` of `int`
+    :return:
+        The count, min, max, mean, median, p95, p99 and (sample) standard
+        deviation of the samples, all in nanoseconds.
+    :rtype:
+        `dict` of `unicode` to `int` or `float`
+    """
+    sorted_samples = sorted(samples)
+    count = len(sorted_samples)
+    mean = sum(sorted_samples) / count
+    variance = 0.0
+    if count > 1:
+        variance = sum((sample - mean) ** 2 for sample in sorted_samples) / (count - 1)
+    return {
+        'count': count,
+        'min': sorted_samples[0],
+        'max': sorted_samples[-1],
+        'mean': mean,
+        'median': percentile(sorted_samples, 0.5),
+        'p95': percentile(sorted_samples, 0.95),
+        'p99': percentile(sorted_samples, 0.99),
+        'stddev': math.sqrt(variance),
+    }
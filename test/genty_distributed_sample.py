@@ -0,0 +1,23 @@
+# coding: utf-8
+
+"""Tests run by the workers in test_genty_distributed, loaded by their ids."""
+
+from __future__ import unicode_literals
+import unittest
+from genty import genty, genty_dataset
+
+
+@genty
+class SampleTests(unittest.TestCase):
+    set_up_classes = []
+
+    @classmethod
+    def setUpClass(cls):
+        cls.set_up_classes.append(cls)
+
+    @genty_dataset(*range(5))
+    def test_value(self, value):
+        self.assertNotEqual(3, value, 'three')
+
+    def test_plain(self):
+        pass
@@ -2,6 +2,7 @@
 
 from __future__ import unicode_literals
 
+import threading
 from unittest import TestCase as _TestCase
 
 import six
@@ -17,3 +18,29 @@ class TestCase(_TestCase):
     if six.PY3:
         # pylint:disable=no-member,maybe-no-member
         assertItemsEqual = _TestCase.assertCountEqual
+
+
+class FakeClock(object):
+    """
+    Stands in for perf_counter_ns and time.sleep, so that tests measuring
+    durations don't depend on the speed of the machine. Time only moves
+    forward when a thread sleeps, up to the time it read last plus the
+    duration of the sleep, so that threads sleeping until the same due time
+    don't add up their sleeps.
+    """
+
+    def __init__(self):
+        self._now = 0
+        self._last_reads = {}
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self._last_reads[threading.current_thread()] = self._now
+            return self._now
+
+    def sleep(self, seconds):
+        with self._lock:
+            last_read = self._last_reads.get(threading.current_thread(), self._now)
+            self._now = max(self._now, last_read + int(round(seconds * 10 ** 9)))
+            self._last_reads[threading.current_thread()] = self._now
@@ -3,10 +3,16 @@
 from __future__ import unicode_literals
 import functools
 import inspect
+import os
+import threading
+from unittest import SkipTest, skipUnless
 from mock import patch
 import six
-from genty import genty, genty_args, genty_dataset, genty_repeat, genty_dataprovider
+from genty import genty, genty_args, genty_dataset, genty_lazy, genty_repeat, genty_dataprovider
 from genty.genty import REPLACE_FOR_PERIOD_CHAR
+from genty.genty_dataset import clear_memoized_dataproviders
+from genty.genty_repeat import _map_in_forked_processes
+from genty.genty_report import get_report
 from genty.private import encode_non_ascii_string
 from test.test_case_base import TestCase
 
@@ -155,6 +161,118 @@ def test_decorated(self, value1, value2, value3):
             )(),
         )
 
+    def test_genty_dataproviders_can_be_nested(self):
+        @genty
+        class SomeClass(object):
+            @genty_dataset(eu=('eu',), us=('us',))
+            def start_server(self, region):
+                return 'server-' + region
+
+            @genty_dataprovider(start_server)
+            def create_tenant(self, server):
+                return server + '/tenant'
+
+            @genty_dataprovider(create_tenant)
+            def test_login(self, tenant):
+                return tenant
+
+        instance = SomeClass()
+        self.assertEqual(
+            'server-eu/tenant',
+            getattr(instance, "test_login_create_tenant(start_server(eu))")(),
+        )
+        self.assertEqual(
+            'server-us/tenant',
+            getattr(instance, "test_login_create_tenant(start_server(us))")(),
+        )
+
+    def test_genty_memoized_dataproviders_are_called_once_per_dataset(self):
+        self.addCleanup(clear_memoized_dataproviders)
+        calls = []
+
+        @genty_dataset(eu=('eu',), us=('us',))
+        def start_server(_, region):
+            calls.append(region)
+            return 'server-' + region
+
+        @genty_dataprovider(start_server, memoize=True)
+        def create_tenant(_, server):
+            calls.append(server)
+            return server + '/tenant'
+
+        @genty
+        class SomeClass(object):
+            @genty_dataprovider(create_tenant)
+            def test_login(self, tenant):
+                return tenant
+
+            @genty_dataprovider(create_tenant)
+            def test_logout(self, tenant):
+                return tenant
+
+        instance = SomeClass()
+        getattr(instance, "test_login_create_tenant(start_server(eu))")()
+        getattr(instance, "test_logout_create_tenant(start_server(eu))")()
+        getattr(instance, "test_logout_create_tenant(start_server(us))")()
+
+        # start_server is memoized, create_tenant isn't.
+        self.assertEqual(['eu', 'server-eu', 'server-eu', 'us', 'server-us'], calls)
+
+        clear_memoized_dataproviders(start_server)
+        getattr(instance, "test_login_create_tenant(start_server(eu))")()
+        self.assertEqual('eu', calls[-2])
+
+    def test_genty_memoizes_dataproviders_only_where_asked_to(self):
+        self.addCleanup(clear_memoized_dataproviders)
+        calls = []
+
+        @genty_dataset(eu=('eu',))
+        def start_server(_, region):
+            calls.append(region)
+            return 'server-' + region
+
+        @genty
+        class SomeClass(object):
+            @genty_dataprovider(start_server, memoize=True)
+            def test_memoized(self, server):
+                return server
+
+            @genty_dataprovider(start_server)
+            def test_fresh(self, server):
+                return server
+
+        instance = SomeClass()
+        for _ in range(2):
+            getattr(instance, "test_memoized_start_server(eu)")()
+            getattr(instance, "test_fresh_start_server(eu)")()
+
+        self.assertEqual(['eu'] * 3, calls)
+        self.assertFalse(hasattr(start_server, 'genty_memoized'))
+
+    def test_genty_drops_identical_datasets_when_deduping(self):
+        def build():
+            @genty
+            class SomeClass(object):
+                @genty_dataset(
+                    (1, 2),
+                    same=(1, 2),
+                    other=(2, 3),
+                )
+                def test_something(self, number, letter):
+                    return number, letter
+            return SomeClass
+
+        with patch.dict(os.environ, {'GENTY_DUPLICATES': 'keep'}):
+            self.assertEqual(3, len(build().genty_generated_tests))
+        with patch.dict(os.environ, {'GENTY_DUPLICATES': 'dedupe'}):
+            self.assertEqual(
+                ['test_something(1, 2)', 'test_something(other)'],
+                sorted(build().genty_generated_tests),
+            )
+        with patch.dict(os.environ, {'GENTY_DUPLICATES': 'error'}):
+            with self.assertRaises(ValueError):
+                build()
+
     def test_dataprovider_args_can_use_genty_args(self):
         @genty
         class SomeClass(object):
@@ -537,3 +655,225 @@ def test_method(self, number, default=None, named=None):
         instance = TestClass()
         # pylint:disable=no-member
         self.assertItemsEqual((42, None, 'named_arg'), instance.test_method_builder())
+
+    def test_genty_runs_repeat_until_failure_inside_a_single_test(self):
+        calls = []
+
+        @genty
+        class SomeClass(object):
+            @genty_repeat(until_failure=True, max_count=50)
+            @genty_dataset(3, 1000)
+            def test_flaky(self, fail_on):
+                calls.append(fail_on)
+                assert len(calls) != fail_on, 'boom'
+
+        instance = SomeClass()
+
+        self.assertEqual(2, self._count_test_methods(SomeClass))
+        with self.assertRaises(AssertionError) as context:
+            getattr(instance, 'test_flaky(3)')()
+        self.assertEqual(3, len(calls))
+        self.assertIn('boom', str(context.exception))
+        self.assertIn('Failed on iteration 3', str(context.exception))
+        report = get_report('repeat')
+        test_id = getattr(SomeClass, 'test_flaky(3)').genty_test_id  # pylint:disable=no-member
+        self.assertEqual('failure', report[test_id]['stopped_by'])
+        self.assertEqual(3, report[test_id]['failed_iteration'])
+
+        del calls[:]
+        getattr(instance, 'test_flaky(1000)')()
+        self.assertEqual(50, len(calls))
+        test_id = getattr(SomeClass, 'test_flaky(1000)').genty_test_id  # pylint:disable=no-member
+        self.assertEqual('max_count', get_report('repeat')[test_id]['stopped_by'])
+
+    def test_genty_builds_unicode_test_ids_for_non_ascii_dataset_names(self):
+        @genty
+        class SomeClass(object):
+            @genty_dataset('ĉ.d')
+            def test_something(self, value):
+                pass
+
+        method_name, = [name for name in dir(SomeClass) if name.startswith(str('test_something('))]
+        test_id = getattr(SomeClass, method_name).genty_test_id
+        self.assertIsInstance(test_id, six.text_type)
+        self.assertTrue(test_id.startswith('{0}.SomeClass.test_something('.format(__name__)))
+
+    def test_genty_stops_repeat_until_failure_when_time_budget_is_spent(self):
+        @genty
+        class SomeClass(object):
+            @genty_repeat(until_failure=True, time_budget=0.01)
+            def test_forever(self):
+                pass
+
+        getattr(SomeClass(), 'test_forever')()
+        report = get_report('repeat')
+        test_id = '{0}.SomeClass.test_forever'.format(__name__)
+        self.assertEqual('time_budget', report[test_id]['stopped_by'])
+        self.assertGreater(report[test_id]['elapsed_seconds'], 0.01)
+
+    def test_genty_leak_check_fails_tests_whose_memory_grows_steadily(self):
+        leaked = []
+
+        class Leaked(object):
+            def __init__(self):
+                self.payload = list(range(1000))
+
+        @genty
+        class SomeClass(object):
+            @genty_repeat(10, leak_check=True)
+            @genty_dataset(leaky=(True,), clean=(False,))
+            def test_request(self, leaky):
+                request = Leaked()
+                if leaky:
+                    leaked.append(request)
+
+        instance = SomeClass()
+        self.assertEqual(2, self._count_test_methods(SomeClass))
+        getattr(instance, 'test_request(clean)')()
+        with self.assertRaises(AssertionError) as context:
+            getattr(instance, 'test_request(leaky)')()
+
+        self.assertEqual(10, len(leaked))
+        self.assertIn('Growing types: ', str(context.exception))
+        self.assertIn('Leaked +9', str(context.exception))
+        report = get_report('leak')
+        self.assertTrue(report['{0}.SomeClass.test_request(leaky)'.format(__name__)]['leaking'])
+        self.assertFalse(report['{0}.SomeClass.test_request(clean)'.format(__name__)]['leaking'])
+
+    def test_genty_builds_lazy_datasets_when_the_test_runs(self):
+        calls = []
+
+        def load_corpus():
+            calls.append('corpus')
+            return 'a', 'b'
+
+        def load_options():
+            calls.append('options')
+            return genty_args(key='value')
+
+        @genty
+        class SomeClass(object):
+            @genty_repeat(2)
+            @genty_dataset(genty_lazy(load_corpus, 'corpus'), options=genty_lazy(load_options))
+            def test_lazy(self, *args, **kwargs):
+                return args, kwargs
+
+        self.assertEqual([], calls)
+        instance = SomeClass()
+        self.assertEqual((('a', 'b'), {}), getattr(instance, 'test_lazy(corpus) iteration_1')())
+        self.assertEqual((('a', 'b'), {}), getattr(instance, 'test_lazy(corpus) iteration_2')())
+        self.assertEqual(((), {'key': 'value'}), getattr(instance, 'test_lazy(options) iteration_1')())
+        self.assertEqual(['corpus', 'options'], calls)
+
+    def test_genty_builds_lazy_dataprovider_datasets_when_the_test_runs(self):
+        @genty
+        class SomeClass(object):
+            @genty_dataset(genty_lazy(lambda: 7, 'seven'))
+            def my_param_factory(self, value):
+                return value * 2
+
+            @genty_dataprovider(my_param_factory)
+            def test_decorated(self, value):
+                return value
+
+        self.assertEqual(14, getattr(SomeClass(), 'test_decorated_my_param_factory(seven)')())
+
+    def test_genty_runs_repeat_iterations_concurrently(self):
+        threads = set()
+        barrier = []
+        lock = threading.Lock()
+        all_started = threading.Event()
+
+        @genty
+        class SomeClass(object):
+            @genty_repeat(8, concurrency=4)
+            @genty_dataset(passing=(None,), failing=(5,))
+            def test_contended(self, failing_iteration):
+                with lock:
+                    barrier.append(None)
+                    iteration = len(barrier)
+                    if iteration == 4:
+                        all_started.set()
+                assert all_started.wait(5), 'iterations did not run concurrently'
+                threads.add(threading.current_thread().name)
+                assert iteration != failing_iteration, 'boom'
+
+        instance = SomeClass()
+        self.assertEqual(2, self._count_test_methods(SomeClass))
+        getattr(instance, 'test_contended(passing)')()
+        self.assertEqual(4, len(threads))
+        entry = get_report('concurrency')['{0}.SomeClass.test_contended(passing)'.format(__name__)]
+        self.assertEqual(8, entry['count'])
+        self.assertGreater(entry['throughput'], 0)
+
+        del barrier[:]
+        with self.assertRaises(AssertionError) as context:
+            getattr(instance, 'test_contended(failing)')()
+        self.assertIn('1 of 8 iterations failed', str(context.exception))
+        self.assertIn('AssertionError: boom', str(context.exception))
+        entry = get_report('concurrency')['{0}.SomeClass.test_contended(failing)'.format(__name__)]
+        self.assertEqual(1, len(entry['failed_iterations']))
+
+    def test_genty_skips_concurrent_repeats_whose_iterations_skip(self):
+        @genty
+        class SomeClass(object):
+            @genty_repeat(4, concurrency=2)
+            def test_skipping(self):
+                raise SkipTest('not today')
+
+        with self.assertRaises(SkipTest) as context:
+            SomeClass().test_skipping()
+        self.assertEqual('not today', str(context.exception))
+        entry = get_report('concurrency')['{0}.SomeClass.test_skipping'.format(__name__)]
+        self.assertEqual([], entry['failed_iterations'])
+        self.assertEqual(4, entry['skipped_iterations'])
+
+    def test_genty_passes_concurrent_repeats_whose_iterations_partly_skip(self):
+        calls = []
+
+        @genty
+        class SomeClass(object):
+            @genty_repeat(4, concurrency=1)
+            def test_sometimes_skipping(self):
+                calls.append(None)
+                if len(calls) % 2:
+                    raise SkipTest('not today')
+
+        SomeClass().test_sometimes_skipping()
+        entry = get_report('concurrency')['{0}.SomeClass.test_sometimes_skipping'.format(__name__)]
+        self.assertEqual([], entry['failed_iterations'])
+        self.assertEqual(2, entry['skipped_iterations'])
+
+    @skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_genty_runs_repeat_iterations_in_processes(self):
+        parent = os.getpid()
+
+        @genty
+        class SomeClass(object):
+            @genty_repeat(4, concurrency=2, processes=True)
+            def test_forked(self):
+                assert os.getpid() != parent
+
+        SomeClass().test_forked()
+        entry = get_report('concurrency')['{0}.SomeClass.test_forked'.format(__name__)]
+        self.assertEqual([], entry['failed_iterations'])
+        self.assertTrue(entry['processes'])
+
+    @skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_forked_processes_call_functions_that_cannot_be_pickled(self):
+        parent = os.getpid()
+
+        results = _map_in_forked_processes(lambda item: (item, os.getpid() != parent), range(4), 2)
+
+        self.assertEqual([(item, True) for item in range(4)], results)
+
+    @skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_forked_processes_that_exit_early_raise_an_error(self):
+        def crash(item):
+            if item == 2:
+                os._exit(3)  # pylint:disable=protected-access
+            return item
+
+        with self.assertRaises(RuntimeError) as context:
+            _map_in_forked_processes(crash, range(4), 2)
+        self.assertIn('exited with code 3', str(context.exception))
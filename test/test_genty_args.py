@@ -75,3 +75,17 @@ def test_genty_args_yields_args_and_kwargs(self, args_tuple, kwargs_dict):
         for arg in args_tuple:
             formatted_arg = format_arg(arg)
             self.assertIn(formatted_arg, gargs)
+
+    def test_genty_args_keeps_reserved_options_apart(self):
+        gargs = genty_args(1, fruit='apple', _max_ms=5, _max_bytes=1024)
+
+        self.assertEqual({'fruit': 'apple'}, gargs.kwargs)
+        self.assertEqual({'_max_ms': 5, '_max_bytes': 1024}, gargs.options)
+        self.assertEqual(['1', 'fruit={0!r}'.format('apple')], list(gargs))
+
+    def test_genty_args_keeps_tags_apart(self):
+        gargs = genty_args(1, _tags={'slow'})
+
+        self.assertEqual({}, gargs.kwargs)
+        self.assertEqual({'_tags': {'slow'}}, gargs.options)
+        self.assertEqual(['1'], list(gargs))
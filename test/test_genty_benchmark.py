@@ -0,0 +1,223 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import gc
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import warnings
+from mock import patch
+import six
+from genty import genty, genty_benchmark, genty_dataprovider, genty_dataset
+from genty.genty_benchmark import BASELINE_ENV_VAR, TOLERANCE_ENV_VAR, save_baseline
+from genty.genty_report import clear_reports, get_report
+from genty.private.timing import summarize
+from test.test_case_base import FakeClock, TestCase
+
+
+class GentyBenchmarkTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_benchmark`."""
+
+    def setUp(self):
+        super(GentyBenchmarkTest, self).setUp()
+        clear_reports()
+
+    def test_benchmark_decorator_stores_settings(self):
+        @genty_benchmark(warmup=3, iterations=7, min_time=0.5, disable_gc=True, tolerance=0.2, statistic='p95', stddevs=2)
+        def some_func():
+            pass
+
+        settings = some_func.genty_benchmark  # pylint:disable=no-member
+        self.assertEqual((3, 7, 0.5, True, 0.2, 'p95', 2), tuple(settings))
+
+    def test_benchmark_rejects_non_positive_iterations(self):
+        with self.assertRaises(ValueError):
+            genty_benchmark(iterations=0)
+
+    def test_benchmark_rejects_negative_stddevs(self):
+        with self.assertRaises(ValueError):
+            genty_benchmark(stddevs=-1)
+
+    def test_benchmark_rejects_unknown_statistics(self):
+        with self.assertRaises(ValueError):
+            genty_benchmark(statistic='p42')
+
+    def test_benchmark_records_timings_per_dataset(self):
+        calls = []
+
+        @genty
+        class SomeClass(object):
+            @genty_benchmark(warmup=2, iterations=5)
+            @genty_dataset(small=(1,), large=(2,))
+            def test_something(self, size):
+                calls.append(size)
+                return size
+
+        instance = SomeClass()
+        self.assertEqual(1, getattr(instance, 'test_something(small)')())
+        self.assertEqual(2, getattr(instance, 'test_something(large)')())
+
+        self.assertEqual([1] * 7 + [2] * 7, calls)
+        report = get_report('benchmark')
+        self.assertEqual(
+            {
+                '{0}.SomeClass.test_something(small)'.format(__name__),
+                '{0}.SomeClass.test_something(large)'.format(__name__),
+            },
+            set(report),
+        )
+        for entry in report.values():
+            self.assertEqual(5, entry['count'])
+            self.assertEqual(2, entry['warmup'])
+            self.assertLessEqual(entry['min'], entry['median'])
+            self.assertLessEqual(entry['median'], entry['p99'])
+            self.assertLessEqual(entry['p99'], entry['max'])
+
+    def test_benchmark_calls_the_dataprovider_once_outside_the_timings(self):
+        calls = []
+
+        def build_size(_):
+            calls.append('dataprovider')
+            return 3
+
+        @genty
+        class SomeClass(object):
+            @genty_benchmark(warmup=1, iterations=2)
+            @genty_dataprovider(build_size)
+            def test_something(self, size):
+                calls.append(size)
+
+        getattr(SomeClass(), 'test_something_build_size')()
+
+        self.assertEqual(['dataprovider', 3, 3, 3], calls)
+
+    def test_benchmark_can_disable_gc_while_timing(self):
+        gc_states = []
+
+        @genty
+        class SomeClass(object):
+            @genty_benchmark(warmup=0, iterations=2, disable_gc=True)
+            def test_something(self):
+                gc_states.append(gc.isenabled())
+
+        SomeClass().test_something()
+
+        self.assertEqual([False, False], gc_states)
+        self.assertTrue(gc.isenabled())
+
+    def _build_benchmarked_class(self, durations=None, **kwargs):
+        # Timed with a fake clock, each call taking the given durations in
+        # turn, or else the dataset value, in nanoseconds.
+        clock = FakeClock()
+        # genty.genty_benchmark is the decorator, exported by the package.
+        benchmark_module = importlib.import_module('genty.genty_benchmark')
+        patcher = patch.object(benchmark_module, 'perf_counter_ns', clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        durations = iter(durations or ())
+        kwargs.setdefault('tolerance', 0.5)
+
+        @genty
+        class SomeClass(object):
+            @genty_benchmark(warmup=0, iterations=3, **kwargs)
+            @genty_dataset(fast=(1000,), slow=(2000,))
+            def test_something(self, duration):
+                clock.sleep(next(durations, duration) / 1e9)
+
+        return SomeClass
+
+    def _write_baseline(self, medians, stddev=None):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'baseline.json')
+        baseline = {}
+        for name, median in medians.items():
+            entry = {'median': median}
+            if stddev is not None:
+                entry['stddev'] = stddev
+            baseline['{0}.SomeClass.test_something({1})'.format(__name__, name)] = entry
+        with io.open(path, 'w', encoding='utf-8') as baseline_file:
+            baseline_file.write(six.text_type(json.dumps(baseline)))
+        return path
+
+    def test_benchmark_fails_tests_that_regressed_beyond_tolerance(self):
+        path = self._write_baseline({'fast': 2000, 'slow': 1000})
+        some_class = self._build_benchmarked_class()
+        instance = some_class()
+
+        with patch.dict(os.environ, {BASELINE_ENV_VAR: path}):
+            getattr(instance, 'test_something(fast)')()
+            with self.assertRaises(AssertionError) as context:
+                getattr(instance, 'test_something(slow)')()
+
+        self.assertIn(
+            'test_something(slow) regressed: median of 2000ns vs 1000ns in the baseline (+100.0%, tolerance 50.0%, noise 0ns)',
+            str(context.exception),
+        )
+        entry = get_report('benchmark')['{0}.SomeClass.test_something(fast)'.format(__name__)]
+        self.assertEqual(2000, entry['baseline'])
+        self.assertEqual(-0.5, entry['change'])
+
+    def test_benchmark_tolerance_can_be_overridden_per_run(self):
+        path = self._write_baseline({'slow': 1500})
+        instance = self._build_benchmarked_class()()
+
+        with patch.dict(os.environ, {BASELINE_ENV_VAR: path, TOLERANCE_ENV_VAR: '0.2'}):
+            with self.assertRaises(AssertionError) as context:
+                getattr(instance, 'test_something(slow)')()
+        with patch.dict(os.environ, {BASELINE_ENV_VAR: path, TOLERANCE_ENV_VAR: 'loose'}):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                getattr(instance, 'test_something(slow)')()
+
+        self.assertIn('tolerance 20.0%', str(context.exception))
+        self.assertIn(TOLERANCE_ENV_VAR, str(caught[0].message))
+
+    def test_benchmark_ignores_slowdowns_within_the_spread_of_timings(self):
+        # A median of 1100ns, 10% slower, with a stddev of about 2300ns.
+        durations = [1000, 1100, 5000]
+        path = self._write_baseline({'fast': 1000}, stddev=50)
+
+        with patch.dict(os.environ, {BASELINE_ENV_VAR: path}):
+            instance = self._build_benchmarked_class(durations, tolerance=0.05)()
+            getattr(instance, 'test_something(fast)')()
+            instance = self._build_benchmarked_class(durations, tolerance=0.05, stddevs=0)()
+            with self.assertRaises(AssertionError):
+                getattr(instance, 'test_something(fast)')()
+
+    def test_benchmark_passes_tests_missing_from_baseline(self):
+        path = self._write_baseline({})
+        instance = self._build_benchmarked_class()()
+
+        with patch.dict(os.environ, {BASELINE_ENV_VAR: path}):
+            getattr(instance, 'test_something(slow)')()
+
+    def test_save_baseline_merges_results_into_existing_file(self):
+        path = self._write_baseline({'fast': 1.0, 'slow': 2.0})
+        instance = self._build_benchmarked_class()()
+        getattr(instance, 'test_something(slow)')()
+
+        save_baseline(path)
+
+        with io.open(path, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        fast = baseline['{0}.SomeClass.test_something(fast)'.format(__name__)]
+        slow = baseline['{0}.SomeClass.test_something(slow)'.format(__name__)]
+        self.assertEqual({'median': 1.0}, fast)
+        self.assertEqual(3, slow['count'])
+        self.assertEqual(2000, slow['median'])
+        self.assertEqual(0, slow['stddev'])
+
+    def test_summarize_computes_the_distribution(self):
+        summary = summarize(list(range(1, 101)))
+
+        self.assertEqual(100, summary['count'])
+        self.assertEqual(1, summary['min'])
+        self.assertEqual(100, summary['max'])
+        self.assertAlmostEqual(50.5, summary['median'])
+        self.assertAlmostEqual(95.05, summary['p95'])
+        self.assertAlmostEqual(99.01, summary['p99'])
+        self.assertAlmostEqual(29.011, summary['stddev'], places=3)
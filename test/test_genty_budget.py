@@ -0,0 +1,143 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import importlib
+from unittest import skipUnless
+from mock import patch
+from genty import genty, genty_args, genty_budget, genty_dataprovider, genty_dataset
+from genty.genty_budget import tracemalloc
+from genty.genty_report import clear_reports, get_report
+from test.test_case_base import FakeClock, TestCase
+
+
+class GentyBudgetTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_budget`."""
+
+    def setUp(self):
+        super(GentyBudgetTest, self).setUp()
+        clear_reports()
+        self._clock = FakeClock()
+        # genty.genty_budget is the decorator, exported by the package.
+        budget_module = importlib.import_module('genty.genty_budget')
+        patcher = patch.object(budget_module, 'perf_counter_ns', self._clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_budget_decorator_stores_budget(self):
+        @genty_budget(max_ms=5)
+        def some_func():
+            pass
+
+        self.assertEqual((5, None), tuple(some_func.genty_budget))  # pylint:disable=no-member
+
+    def test_budget_requires_a_limit(self):
+        with self.assertRaises(ValueError):
+            genty_budget()
+        with self.assertRaises(ValueError):
+            genty_budget(max_ms=0)
+
+    def test_test_within_budget_passes_and_is_recorded(self):
+        sleep = self._clock.sleep
+
+        @genty
+        class SomeClass(object):
+            @genty_budget(max_ms=1000)
+            def test_fast(self):
+                sleep(0.005)
+
+        SomeClass().test_fast()
+
+        entry = get_report('budget')['{0}.SomeClass.test_fast'.format(__name__)]
+        self.assertEqual(5, entry['elapsed_ms'])
+        self.assertEqual(1000, entry['max_ms'])
+
+    def test_test_over_time_budget_fails_with_the_overrun(self):
+        sleep = self._clock.sleep
+
+        @genty
+        class SomeClass(object):
+            @genty_budget(max_ms=1)
+            def test_slow(self):
+                sleep(0.02)
+
+        with self.assertRaises(AssertionError) as context:
+            SomeClass().test_slow()
+
+        message = str(context.exception)
+        self.assertIn('SomeClass.test_slow took 20.000 ms, 19.000 ms (1900%) over its budget of 1 ms', message)
+
+    def test_budget_returns_what_the_test_returns(self):
+        @genty
+        class SomeClass(object):
+            @genty_budget(max_ms=1000)
+            def test_fast(self):
+                return 'result'
+
+        self.assertEqual('result', SomeClass().test_fast())
+
+    def test_budget_does_not_count_the_dataprovider_call(self):
+        sleep = self._clock.sleep
+
+        def build_duration(_):
+            sleep(0.02)
+            return 0
+
+        @genty
+        class SomeClass(object):
+            @genty_budget(max_ms=10)
+            @genty_dataprovider(build_duration)
+            def test_sleep(self, duration):
+                sleep(duration)
+
+        getattr(SomeClass(), 'test_sleep_build_duration')()
+
+    def test_datasets_override_the_budget(self):
+        sleep = self._clock.sleep
+
+        @genty
+        class SomeClass(object):
+            @genty_budget(max_ms=1)
+            @genty_dataset(
+                tight=(0.02,),
+                loose=genty_args(0.02, _max_ms=1000),
+            )
+            def test_sleep(self, duration):
+                sleep(duration)
+
+        instance = SomeClass()
+        getattr(instance, 'test_sleep(loose)')()
+        with self.assertRaises(AssertionError):
+            getattr(instance, 'test_sleep(tight)')()
+
+    def test_datasets_can_set_a_budget_alone(self):
+        sleep = self._clock.sleep
+
+        @genty
+        class SomeClass(object):
+            @genty_dataset(slow=genty_args(0.02, _max_ms=1))
+            def test_sleep(self, duration):
+                sleep(duration)
+
+        with self.assertRaises(AssertionError):
+            getattr(SomeClass(), 'test_sleep(slow)')()
+
+    @skipUnless(tracemalloc is not None, 'tracemalloc is not available')
+    def test_test_over_byte_budget_fails_with_the_overrun(self):
+        kept = []
+
+        @genty
+        class SomeClass(object):
+            @genty_budget(max_bytes=100000)
+            @genty_dataset(small=(10,), large=(1000000,))
+            def test_allocate(self, size):
+                kept.append(bytearray(size))
+
+        instance = SomeClass()
+        getattr(instance, 'test_allocate(small)')()
+        with self.assertRaises(AssertionError) as context:
+            getattr(instance, 'test_allocate(large)')()
+
+        self.assertIn('over its budget of 100000 bytes', str(context.exception))
+        entry = get_report('budget')['{0}.SomeClass.test_allocate(large)'.format(__name__)]
+        self.assertGreaterEqual(entry['peak_bytes'], 1000000)
+        self.assertFalse(tracemalloc.is_tracing())
@@ -0,0 +1,117 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import functools
+import os
+import shutil
+import tempfile
+import warnings
+from mock import patch
+from genty import genty_cached
+from test.test_case_base import TestCase
+
+
+class GentyCacheTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_cache`."""
+
+    def setUp(self):
+        super(GentyCacheTest, self).setUp()
+        self._cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._cache_dir)
+        self._calls = []
+
+    def _build_datasets(self):
+        self._calls.append(None)
+        return [(1, 'one'), (2, 'two')]
+
+    def _cached(self, *args, **kwargs):
+        with patch.dict(os.environ, {'GENTY_CACHE_DIR': self._cache_dir}):
+            return genty_cached(*args, **kwargs)
+
+    def test_cached_calls_factory_when_caching_is_disabled(self):
+        with patch.dict(os.environ, {'GENTY_CACHE_DIR': ''}):
+            self.assertEqual([(1, 'one'), (2, 'two')], genty_cached(self._build_datasets))
+            genty_cached(self._build_datasets)
+
+        self.assertEqual(2, len(self._calls))
+        self.assertEqual([], os.listdir(self._cache_dir))
+
+    def test_cached_loads_datasets_from_the_cache(self):
+        first = self._cached(self._build_datasets)
+        second = self._cached(self._build_datasets)
+
+        self.assertEqual(1, len(self._calls))
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(os.listdir(self._cache_dir)))
+
+    def test_cached_rebuilds_when_a_dependency_changes(self):
+        dependency = os.path.join(self._cache_dir, 'cases.txt')
+        with open(dependency, 'w') as dependency_file:
+            dependency_file.write('a')
+        self._cached(self._build_datasets, [dependency])
+        with open(dependency, 'w') as dependency_file:
+            dependency_file.write('ab')
+
+        self._cached(self._build_datasets, [dependency])
+        self._cached(self._build_datasets, [dependency])
+
+        self.assertEqual(2, len(self._calls))
+
+    def test_cached_rebuilds_when_the_source_changes(self):
+        self._cached(self._build_datasets)
+
+        with patch('genty.genty_cache._build_cache_key', return_value='edited'):
+            self._cached(self._build_datasets)
+
+        self.assertEqual(2, len(self._calls))
+
+    def test_cached_rebuilds_corrupt_caches(self):
+        self._cached(self._build_datasets)
+        cache_path = os.path.join(self._cache_dir, os.listdir(self._cache_dir)[0])
+        with open(cache_path, 'wb') as cache_file:
+            cache_file.write(b'garbage')
+
+        self.assertEqual([(1, 'one'), (2, 'two')], self._cached(self._build_datasets))
+        self.assertEqual(2, len(self._calls))
+
+    def test_cached_warns_about_datasets_that_cannot_be_pickled(self):
+        def build_unpicklable():
+            return [(lambda: None,)]
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            datasets = self._cached(build_unpicklable)
+
+        self.assertEqual(1, len(datasets))
+        self.assertEqual(1, len(caught))
+        self.assertEqual([], [name for name in os.listdir(self._cache_dir) if name.endswith('.tmp')])
+
+    def test_cached_tells_closures_and_lambdas_apart(self):
+        def make(value):
+            def build():
+                return [value, value]
+            return build
+
+        self.assertEqual([1, 1], self._cached(make(1)))
+        self.assertEqual([2, 2], self._cached(make(2)))
+        self.assertEqual([1, 1], self._cached(make(1)))
+        self.assertEqual(['a'], self._cached(lambda: ['a']))
+        self.assertEqual(['b'], self._cached(lambda: ['b']))
+
+    def test_cached_accepts_partials(self):
+        def build(value):
+            return [value]
+
+        self.assertEqual([1], self._cached(functools.partial(build, 1)))
+        self.assertEqual([2], self._cached(functools.partial(build, 2)))
+        self.assertEqual(2, len(os.listdir(self._cache_dir)))
+
+    def test_cached_needs_a_key_for_factories_it_cannot_hash(self):
+        marker = object()
+
+        def build():
+            return [marker is not None]
+
+        with self.assertRaises(ValueError):
+            self._cached(build)
+        self.assertEqual([True], self._cached(build, key='marker'))
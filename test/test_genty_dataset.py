@@ -1,8 +1,11 @@
 # coding: utf-8
 
 from __future__ import unicode_literals
-
-from genty import genty_dataset, genty_dataprovider
+import os
+import warnings
+from mock import patch
+from genty import genty_args, genty_dataset, genty_dataprovider, genty_lazy
+from genty.genty_dataset import dataset_hash
 from test.test_case_base import TestCase
 
 
@@ -200,3 +203,55 @@ def test_method():
             {"55, 66": (55, 66)},
             test_method.genty_datasets,
         )
+
+    def test_dataset_hash_depends_on_reserved_options(self):
+        self.assertNotEqual(dataset_hash((1, 'a')), dataset_hash(genty_args(1, 'a', _tags='slow')))
+        self.assertNotEqual(dataset_hash(genty_args(1, _max_ms=5)), dataset_hash(genty_args(1, _max_ms=50)))
+        self.assertNotEqual(dataset_hash(genty_args(1, _max_ms=5)), dataset_hash(genty_args(1, _max_bytes=5)))
+        self.assertEqual(
+            dataset_hash(genty_args(1, _tags={'slow', 'db'})),
+            dataset_hash(genty_args(1, _tags={'db', 'slow'})),
+        )
+
+    def test_dataset_hash_depends_on_content_only(self):
+        self.assertEqual(
+            dataset_hash(({'a': [1, 2], 'b': {3, 4}},)),
+            dataset_hash(({'b': {4, 3}, 'a': [1, 2]},)),
+        )
+        self.assertEqual(dataset_hash((1, 'a')), dataset_hash(genty_args(1, 'a')))
+        self.assertNotEqual(dataset_hash((1, 'a')), dataset_hash((1, b'a')))
+        self.assertNotEqual(dataset_hash((1,)), dataset_hash((1.0,)))
+        self.assertNotEqual(dataset_hash(((1, 2),)), dataset_hash(([1, 2],)))
+        self.assertNotEqual(dataset_hash(genty_args(1)), dataset_hash(genty_args(a=1)))
+
+    def test_dataset_hash_is_none_without_a_stable_representation(self):
+        self.assertIsNone(dataset_hash((object(),)))
+        self.assertIsNone(dataset_hash((lambda: None,)))
+        self.assertIsNone(dataset_hash(genty_lazy(lambda: (1,), 'one')))
+
+    def test_overridden_datasets_are_reported_unless_kept(self):
+        def build():
+            @genty_dataset(fast=(2,))
+            @genty_dataset(fast=(1,), slow=(3,))
+            def some_func():
+                pass
+            return some_func
+
+        with patch.dict(os.environ, {'GENTY_DUPLICATES': 'keep'}):
+            self.assertEqual({'fast': (2,), 'slow': (3,)}, build().genty_datasets)
+        with patch.dict(os.environ, {'GENTY_DUPLICATES': 'warn'}):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                build()
+        self.assertEqual(1, len(caught))
+        with patch.dict(os.environ, {'GENTY_DUPLICATES': 'error'}):
+            with self.assertRaises(ValueError):
+                build()
+
+    def test_unknown_duplicate_policy_is_rejected(self):
+        with patch.dict(os.environ, {'GENTY_DUPLICATES': 'drop'}):
+            with self.assertRaises(ValueError):
+                @genty_dataset(fast=(2,))
+                @genty_dataset(fast=(1,))
+                def some_func():  # pylint:disable=unused-variable
+                    pass
@@ -0,0 +1,225 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import json
+import socket
+import threading
+import unittest
+from unittest import skipUnless
+from mock import Mock, patch
+from genty.genty_distributed import GentyCoordinator, _load_test, main, run_worker
+from genty.genty_loader import GentyTestLoader
+from genty.genty_report import clear_reports, record
+from test import genty_distributed_sample
+from test.test_case_base import TestCase
+
+
+def _has_ipv6_loopback():
+    if not socket.has_ipv6:
+        return False
+    try:
+        probe = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+    except socket.error:
+        return False
+    try:
+        probe.bind(('::1', 0))
+    except socket.error:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+class GentyDistributedTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_distributed`."""
+
+    def setUp(self):
+        super(GentyDistributedTest, self).setUp()
+        self._tests = GentyTestLoader().loadTestsFromTestCase(
+            # Not imported directly, so that the test runner doesn't collect it.
+            genty_distributed_sample.SampleTests,
+        )
+        self._threads = []
+
+    def _start(self, target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _run(self, coordinator):
+        result = unittest.TestResult()
+        coordinator.run(result)
+        for thread in self._threads:
+            thread.join(5)
+        return result
+
+    def _assert_sample_results(self, result):
+        self.assertEqual(6, result.testsRun)
+        self.assertEqual([], result.errors)
+        self.assertEqual(1, len(result.failures))
+        failed_test, failure = result.failures[0]
+        self.assertEqual('test_value(3)', failed_test._testMethodName)  # pylint:disable=protected-access
+        self.assertIn('three', failure)
+
+    def test_workers_run_all_tests_and_stream_results_back(self):
+        coordinator = GentyCoordinator(self._tests, batch_size=2)
+        tests_run = []
+        for _ in range(3):
+            self._start(lambda: tests_run.append(run_worker(coordinator.address)))
+
+        result = self._run(coordinator)
+
+        self._assert_sample_results(result)
+        self.assertEqual(6, sum(tests_run))
+
+    def test_batch_of_lost_worker_is_reassigned(self):
+        coordinator = GentyCoordinator(self._tests, batch_size=3)
+        received = []
+
+        def lose_batch():
+            connection = socket.create_connection(coordinator.address)
+            connection.sendall(b'{"type": "ready"}\n')
+            received.append(json.loads(connection.makefile('rb').readline().decode('utf-8')))
+            connection.close()
+            run_worker(coordinator.address)
+
+        self._start(lose_batch)
+        result = self._run(coordinator)
+
+        self._assert_sample_results(result)
+        self.assertEqual('batch', received[0]['type'])
+        self.assertEqual(3, len(received[0]['tests']))
+
+    def test_batch_is_reported_as_errors_after_max_attempts(self):
+        coordinator = GentyCoordinator(self._tests, batch_size=6, max_attempts=1)
+
+        def lose_batch():
+            connection = socket.create_connection(coordinator.address)
+            connection.sendall(b'{"type": "ready"}\n')
+            connection.makefile('rb').readline()
+            connection.close()
+
+        self._start(lose_batch)
+        result = self._run(coordinator)
+
+        self.assertEqual(6, result.testsRun)
+        self.assertEqual(6, len(result.errors))
+        self.assertIn('Lost the worker', result.errors[0][1])
+
+    def test_batch_of_unresponsive_worker_is_reassigned(self):
+        coordinator = GentyCoordinator(self._tests, batch_size=6, worker_timeout=0.2)
+        released = threading.Event()
+
+        def hang():
+            connection = socket.create_connection(coordinator.address)
+            connection.sendall(b'{"type": "ready"}\n')
+            reader = connection.makefile('rb')
+            reader.readline()
+            released.wait(10)
+            reader.close()
+            connection.close()
+
+        self._start(hang)
+        self._start(run_worker, coordinator.address)
+        result = unittest.TestResult()
+        coordinator.run(result)
+        released.set()
+        for thread in self._threads:
+            thread.join(5)
+
+        self._assert_sample_results(result)
+
+    def test_only_tests_without_reported_results_are_reassigned(self):
+        coordinator = GentyCoordinator(self._tests, batch_size=6)
+        test_ids = [test.id() for test in self._tests]
+        lost_test_id = test_ids[2]
+        tests_run = []
+
+        class LossyResult(unittest.TestResult):
+            lost = False
+
+            def startTest(self, test):  # pylint:disable=invalid-name
+                if test.id() == lost_test_id and not self.lost:
+                    self.lost = True
+                    raise ValueError('Lost the connection.')
+                super(LossyResult, self).startTest(test)
+
+        def run_workers():
+            tests_run.append(run_worker(coordinator.address))
+            tests_run.append(run_worker(coordinator.address))
+
+        self._start(run_workers)
+        result = LossyResult()
+        coordinator.run(result)
+        for thread in self._threads:
+            thread.join(5)
+
+        self._assert_sample_results(result)
+        self.assertEqual([6, 4], tests_run)
+
+    @skipUnless(_has_ipv6_loopback(), 'IPv6 is not available')
+    def test_coordinator_listens_on_ipv6_hosts(self):
+        coordinator = GentyCoordinator(self._tests, host='::1')
+        self._start(run_worker, coordinator.address)
+
+        result = self._run(coordinator)
+
+        self._assert_sample_results(result)
+
+    def test_worker_loads_tests_from_their_ids(self):
+        coordinator = GentyCoordinator(self._tests)
+        ids = []
+
+        def record_ids():
+            connection = socket.create_connection(coordinator.address)
+            reader = connection.makefile('rb')
+            connection.sendall(b'{"type": "ready"}\n')
+            ids.extend(json.loads(reader.readline().decode('utf-8'))['tests'])
+            reader.close()
+            connection.close()
+            run_worker(coordinator.address)
+
+        self._start(record_ids)
+        self._run(coordinator)
+
+        self.assertIn('test.genty_distributed_sample.SampleTests.test_value(0)', ids)
+
+    def test_worker_instantiates_tests_without_the_loader(self):
+        coordinator = GentyCoordinator(self._tests)
+        loader = Mock(GentyTestLoader)
+        self._start(run_worker, coordinator.address, loader)
+
+        result = self._run(coordinator)
+
+        self._assert_sample_results(result)
+        self.assertFalse(loader.loadTestsFromName.called)
+
+    def test_tests_that_cannot_be_loaded_fail(self):
+        loader = Mock(GentyTestLoader)
+        loader.loadTestsFromName.return_value = unittest.TestSuite()
+        loader.errors = []
+        test_ids = ['test.genty_distributed_sample.SampleTests.test_missing', 'unknown']
+
+        tests = [_load_test(loader, test_id, {}) for test_id in test_ids]
+        result = unittest.TestResult()
+        unittest.TestSuite(tests).run(result)
+
+        self.assertEqual(test_ids, [test.id() for test, _ in result.errors])
+        self.assertIn('Could not load test unknown', result.errors[1][1])
+
+    def test_workers_send_report_entries_back_once(self):
+        clear_reports()
+        self.addCleanup(clear_reports)
+        record('some_kind', 'test_id', {'value': 1})
+        coordinator = GentyCoordinator(self._tests, batch_size=3)
+        self._start(run_worker, coordinator.address)
+
+        with patch('genty.genty_distributed.merge_reports') as merge_reports:
+            self._run(coordinator)
+
+        merge_reports.assert_called_once_with({'some_kind': {'test_id': {'value': 1}}})
+
+    def test_coordinator_only_listens_on_other_hosts_when_allowed(self):
+        with self.assertRaises(SystemExit), patch('sys.stderr'):
+            main(['coordinator', '--host', '0.0.0.0'])
@@ -0,0 +1,296 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import os
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import skipIf, skipUnless
+from mock import patch
+from genty import genty, genty_dataset, genty_repeat
+from genty.genty_instrument import (
+    DURATIONS_ENV_VAR,
+    PROFILE_DIR_ENV_VAR,
+    PROFILE_MODE_ENV_VAR,
+    PROFILE_THRESHOLD_ENV_VAR,
+    RUSAGE_ENV_VAR,
+    TRACEMALLOC_ENV_VAR,
+    _build_profile_path,
+    load_durations,
+    resource,
+    save_durations,
+    tracemalloc,
+)
+from genty.genty_report import clear_reports, get_report, get_sorted_report
+from test.test_case_base import TestCase
+
+
+class GentyInstrumentTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_instrument`."""
+
+    def setUp(self):
+        super(GentyInstrumentTest, self).setUp()
+        clear_reports()
+
+    def test_tests_are_not_wrapped_without_instrumentation(self):
+        def undecorated(self):
+            return self
+
+        with patch.dict(os.environ, {TRACEMALLOC_ENV_VAR: ''}):
+            @genty
+            class SomeClass(object):
+                test_something = undecorated
+
+        self.assertIs(undecorated, SomeClass.__dict__['test_something'])
+
+    def test_environment_is_read_once_per_decorated_class(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'durations.json')
+        with patch.dict(os.environ, {DURATIONS_ENV_VAR: path}):
+            with patch('genty.genty_instrument._get_profile_settings', return_value=None) as get_settings:
+                @genty
+                class SomeClass(object):
+                    @genty_dataset(*range(20))
+                    def test_something(self, value):
+                        pass
+
+        self.assertEqual(1, get_settings.call_count)
+        getattr(SomeClass(), 'test_something(3)')()
+        self.assertEqual(1, len(get_report('duration')))
+
+    @skipIf(tracemalloc is None, 'tracemalloc is not available')
+    def test_tracemalloc_records_memory_per_dataset(self):
+        kept = []
+
+        with patch.dict(os.environ, {TRACEMALLOC_ENV_VAR: '3'}):
+            @genty
+            class SomeClass(object):
+                @genty_dataset(small=(1000,), large=(1000000,))
+                def test_allocate(self, size):
+                    kept.append(bytearray(size))
+
+        instance = SomeClass()
+        getattr(instance, 'test_allocate(small)')()
+        getattr(instance, 'test_allocate(large)')()
+
+        self.assertFalse(tracemalloc.is_tracing())
+        report = get_report('memory')
+        large = report['{0}.SomeClass.test_allocate(large)'.format(__name__)]
+        self.assertEqual('test_allocate', large['method'])
+        self.assertEqual('large', large['dataset'])
+        self.assertGreaterEqual(large['peak_bytes'], 1000000)
+        self.assertGreaterEqual(large['net_bytes'], 1000000)
+        self.assertLessEqual(len(large['top_sites']), 3)
+        self.assertIn(__file__.rstrip('c'), large['top_sites'][0]['site'])
+        self.assertEqual(
+            ['large', 'small'],
+            [entry['dataset'] for entry in get_sorted_report('memory')],
+        )
+
+    def test_durations_are_recorded_and_merged_into_the_history(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'durations.json')
+
+        with patch.dict(os.environ, {DURATIONS_ENV_VAR: path}):
+            @genty
+            class SomeClass(object):
+                @genty_dataset(passing=(True,), failing=(False,))
+                def test_something(self, passes):
+                    assert passes
+
+        instance = SomeClass()
+        for _ in range(2):
+            getattr(instance, 'test_something(passing)')()
+            with self.assertRaises(AssertionError):
+                getattr(instance, 'test_something(failing)')()
+            save_durations(path)
+
+        history = load_durations(path)
+        passing = history['{0}.SomeClass.test_something(passing)'.format(__name__)]
+        failing = history['{0}.SomeClass.test_something(failing)'.format(__name__)]
+        self.assertEqual(2, passing['runs'])
+        self.assertFalse(passing['failed'])
+        self.assertTrue(failing['failed'])
+        self.assertGreater(passing['duration'], 0)
+
+    def _build_profiled_class(self, profile_dir, mode, calls):
+        def slow_helper():
+            time.sleep(0.03)
+
+        environment = {
+            PROFILE_DIR_ENV_VAR: profile_dir,
+            PROFILE_THRESHOLD_ENV_VAR: '10',
+            PROFILE_MODE_ENV_VAR: mode,
+        }
+        with patch.dict(os.environ, environment):
+            @genty
+            class SomeClass(object):
+                @genty_dataset(fast=(False,), slow=(True,))
+                def test_something(self, slow):
+                    calls.append(slow)
+                    if slow:
+                        slow_helper()
+
+        instance = SomeClass()
+        getattr(instance, 'test_something(fast)')()
+        getattr(instance, 'test_something(slow)')()
+
+    def _assert_slow_test_profiled(self, profile_dir):
+        test_id = '{0}.SomeClass.test_something(slow)'.format(__name__)
+        self.assertEqual([test_id + '.pstats'], os.listdir(profile_dir))
+        stats = pstats.Stats(os.path.join(profile_dir, test_id + '.pstats'))
+        profiled_functions = [function for _, _, function in stats.stats]
+        self.assertIn('slow_helper', profiled_functions)
+        self.assertEqual(
+            os.path.join(profile_dir, test_id + '.pstats'),
+            get_report('profile')[test_id]['path'],
+        )
+
+    def test_slow_tests_are_rerun_under_the_profiler(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        calls = []
+
+        self._build_profiled_class(profile_dir, 'rerun', calls)
+
+        self.assertEqual([False, True, True], calls)
+        self._assert_slow_test_profiled(profile_dir)
+
+    def test_tests_can_always_run_under_the_profiler(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        calls = []
+
+        self._build_profiled_class(profile_dir, 'always', calls)
+
+        self.assertEqual([False, True], calls)
+        self._assert_slow_test_profiled(profile_dir)
+
+    def test_profile_reruns_are_not_measured_and_skip_failed_tests(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        calls = []
+        environment = {
+            PROFILE_DIR_ENV_VAR: profile_dir,
+            PROFILE_THRESHOLD_ENV_VAR: '10',
+            DURATIONS_ENV_VAR: os.path.join(profile_dir, 'durations.json'),
+        }
+        with patch.dict(os.environ, environment):
+            @genty
+            class SomeClass(object):
+                @genty_dataset(passing=(True,), failing=(False,))
+                def test_something(self, passes):
+                    calls.append(passes)
+                    time.sleep(0.03)
+                    assert passes
+
+        instance = SomeClass()
+        getattr(instance, 'test_something(passing)')()
+        with self.assertRaises(AssertionError):
+            getattr(instance, 'test_something(failing)')()
+
+        self.assertEqual([True, True, False], calls)
+        durations = get_report('duration')
+        passing = durations['{0}.SomeClass.test_something(passing)'.format(__name__)]
+        self.assertLess(passing['duration'], 0.055)
+        self.assertEqual(1, len(get_report('profile')))
+
+    def test_profile_reruns_only_the_test_body_with_fresh_fixtures(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        events = []
+        environment = {
+            PROFILE_DIR_ENV_VAR: profile_dir,
+            PROFILE_THRESHOLD_ENV_VAR: '10',
+        }
+        with patch.dict(os.environ, environment):
+            @genty
+            class SomeTests(unittest.TestCase):
+                def setUp(self):
+                    events.append('setUp')
+
+                def tearDown(self):
+                    events.append('tearDown')
+
+                @genty_repeat(3, concurrency=1)
+                def test_something(self):
+                    events.append('body')
+                    time.sleep(0.01)
+
+        result = unittest.TestResult()
+        SomeTests('test_something').run(result)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(
+            ['setUp', 'body', 'body', 'body', 'tearDown', 'setUp', 'body', 'tearDown'],
+            events,
+        )
+        self.assertEqual(1, len(get_report('profile')))
+
+    def test_profile_paths_are_safe_file_names(self):
+        path = _build_profile_path('profiles', 'module.Class.test_path(\'a/b\')')
+        long_path = _build_profile_path('profiles', 'module.Class.test_long({0})'.format('x' * 300))
+
+        self.assertEqual(os.path.join('profiles', "module.Class.test_path('a_b').pstats"), path)
+        self.assertLess(len(os.path.basename(long_path)), 200)
+        self.assertNotEqual(
+            long_path,
+            _build_profile_path('profiles', 'module.Class.test_long({0})'.format('x' * 301)),
+        )
+
+    @skipUnless(resource is not None, 'resource is not available')
+    def test_rusage_is_recorded_per_test_and_summed_per_method(self):
+        with patch.dict(os.environ, {RUSAGE_ENV_VAR: '1'}):
+            @genty
+            class SomeClass(object):
+                @genty_repeat(2)
+                @genty_dataset(idle=(0,), busy=(200000,))
+                def test_something(self, iterations):
+                    sum(range(iterations))
+
+        instance = SomeClass()
+        for name in SomeClass.genty_generated_tests:  # pylint:disable=no-member
+            getattr(instance, name)()
+
+        report = get_report('rusage')
+        self.assertEqual(4, len(report))
+        busy = report['{0}.SomeClass.test_something(busy) iteration_1'.format(__name__)]
+        self.assertEqual('test_something', busy['method'])
+        self.assertEqual('busy', busy['dataset'])
+        self.assertGreater(busy['max_rss_bytes'], 0)
+        for counter in ('user_seconds', 'system_seconds', 'voluntary_context_switches', 'block_inputs'):
+            self.assertGreaterEqual(busy[counter], 0)
+
+        totals = get_report('rusage_by_method')['{0}.SomeClass.test_something'.format(__name__)]
+        self.assertEqual(4, totals['runs'])
+        self.assertEqual(2, totals['datasets']['busy']['runs'])
+        self.assertAlmostEqual(
+            totals['user_seconds'],
+            sum(entry['user_seconds'] for entry in report.values()),
+        )
+
+    @skipUnless(resource is not None, 'resource is not available')
+    def test_rusage_counts_the_process_for_concurrent_tests(self):
+        with patch.dict(os.environ, {RUSAGE_ENV_VAR: '1'}):
+            @genty
+            class SomeClass(object):
+                @genty_repeat(4, concurrency=2)
+                def test_concurrent(self):
+                    pass
+
+                def test_plain(self):
+                    pass
+
+        instance = SomeClass()
+        with patch.object(resource, 'getrusage', wraps=resource.getrusage) as getrusage:
+            instance.test_concurrent()
+            self.assertEqual(resource.RUSAGE_SELF, getrusage.call_args[0][0])
+            instance.test_plain()
+            self.assertEqual(
+                getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF),
+                getrusage.call_args[0][0],
+            )
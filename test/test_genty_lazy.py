@@ -0,0 +1,68 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import functools
+from genty import genty_args, genty_dataset, genty_lazy
+from test.test_case_base import TestCase
+
+
+class GentyLazyTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_lazy`."""
+
+    def test_factory_is_not_called_until_resolved(self):
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return 5
+
+        lazy = genty_lazy(factory)
+
+        self.assertEqual([], calls)
+        self.assertEqual((5,), lazy.resolve())
+        self.assertEqual([1], calls)
+
+    def test_resolved_dataset_is_cached_by_default(self):
+        calls = []
+
+        lazy = genty_lazy(lambda: calls.append(1) or (1, 2))
+
+        self.assertIs(lazy.resolve(), lazy.resolve())
+        self.assertEqual([1], calls)
+
+    def test_resolved_dataset_can_be_rebuilt_each_time(self):
+        lazy = genty_lazy(lambda: [], cache=False)
+
+        self.assertIsNot(lazy.resolve(), lazy.resolve())
+
+    def test_genty_args_are_kept_as_is(self):
+        args = genty_args(1, key='value')
+
+        self.assertIs(args, genty_lazy(lambda: args).resolve())
+
+    def test_label_defaults_to_the_factory_name(self):
+        def load_schema():
+            pass
+
+        self.assertEqual('load_schema', genty_lazy(load_schema).label)
+        self.assertEqual('schema', genty_lazy(load_schema, 'schema').label)
+
+    def test_label_of_partial_factories_includes_their_arguments(self):
+        factory = functools.partial(dict, b=2, a=1)
+
+        self.assertEqual('dict(a=1, b=2)', genty_lazy(factory).label)
+        self.assertEqual(({'a': 1, 'b': 2},), genty_lazy(factory).resolve())
+
+    def test_label_of_callable_objects_is_their_class_name(self):
+        class LoadSchema(object):
+            def __call__(self):
+                return 'schema'
+
+        self.assertEqual('LoadSchema', genty_lazy(LoadSchema()).label)
+
+    def test_dataset_name_comes_from_the_label(self):
+        @genty_dataset(genty_lazy(lambda: 1, 'one'))
+        def some_func():
+            pass
+
+        self.assertEqual(['one'], list(some_func.genty_datasets))  # pylint:disable=no-member
@@ -0,0 +1,139 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import importlib
+from unittest import SkipTest
+from mock import patch
+from genty import genty, genty_dataprovider, genty_dataset, genty_load, genty_resource
+from genty.genty_report import clear_reports, get_report
+from test.test_case_base import FakeClock, TestCase
+
+
+class GentyLoadTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_load`."""
+
+    def setUp(self):
+        super(GentyLoadTest, self).setUp()
+        clear_reports()
+        self._clock = FakeClock()
+        # genty.genty_load is the decorator, exported by the package.
+        load_module = importlib.import_module('genty.genty_load')
+        # The clock also stands in for the time module, of which genty_load
+        # only uses sleep.
+        for name in ('perf_counter_ns', 'time'):
+            patcher = patch.object(load_module, name, self._clock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_load_decorator_stores_settings(self):
+        @genty_load(rate=100, duration=2, workers=4)
+        def some_func():
+            pass
+
+        self.assertEqual((100, 2, 4), tuple(some_func.genty_load))  # pylint:disable=no-member
+
+    def test_load_rejects_non_positive_rates(self):
+        with self.assertRaises(ValueError):
+            genty_load(rate=0, duration=1)
+
+    def test_load_drives_each_dataset_at_the_target_rate(self):
+        calls = []
+
+        @genty
+        class SomeClass(object):
+            @genty_load(rate=200, duration=0.1, workers=4)
+            @genty_dataset(first=(1,), second=(2,))
+            def test_scenario(self, value):
+                calls.append(value)
+
+        instance = SomeClass()
+        getattr(instance, 'test_scenario(first)')()
+        getattr(instance, 'test_scenario(second)')()
+
+        self.assertEqual([1] * 20 + [2] * 20, calls)
+        entry = get_report('load')['{0}.SomeClass.test_scenario(first)'.format(__name__)]
+        self.assertEqual(20, entry['calls'])
+        # The last call was due after 95ms.
+        self.assertAlmostEqual(0.095, entry['elapsed_seconds'])
+        self.assertEqual(0, entry['errors'])
+        self.assertLessEqual(entry['p50'], entry['p99.99'])
+        self.assertLessEqual(entry['p99.99'], entry['max'])
+
+    def test_load_latency_includes_time_queued_behind_slow_calls(self):
+        sleep = self._clock.sleep
+
+        @genty
+        class SomeClass(object):
+            @genty_load(rate=100, duration=0.05, workers=1)
+            def test_slow(self):
+                sleep(0.02)
+
+        SomeClass().test_slow()
+
+        entry = get_report('load')['{0}.SomeClass.test_slow'.format(__name__)]
+        # The last of the 5 calls was due after 40ms, but only started after
+        # the 4 previous calls took 80ms.
+        self.assertEqual(60 * 10 ** 6, entry['max'])
+        self.assertEqual(20 * 10 ** 6, entry['service_time_p50'])
+        self.assertAlmostEqual(50, entry['throughput'])
+
+    def test_load_fails_if_any_call_fails(self):
+        calls = []
+
+        @genty
+        class SomeClass(object):
+            @genty_load(rate=1000, duration=0.01)
+            def test_failing(self):
+                calls.append(None)
+                assert len(calls) != 3, 'boom'
+
+        with self.assertRaises(AssertionError) as context:
+            SomeClass().test_failing()
+
+        self.assertIn('1 of 10 calls failed', str(context.exception))
+
+    def test_load_calls_the_dataprovider_and_checks_out_resources_once(self):
+        provided = []
+        built = []
+        connections = []
+
+        def connect():
+            built.append(None)
+            return object()
+
+        @genty
+        class SomeClass(object):
+            @genty_dataset(3)
+            def provide(self, value):
+                provided.append(value)
+                return value * 2
+
+            @genty_load(rate=1000, duration=0.01, workers=2)
+            @genty_resource('connection', connect, scope='test')
+            @genty_dataprovider(provide)
+            def test_scenario(self, value, connection):
+                connections.append((value, connection))
+
+        getattr(SomeClass(), 'test_scenario_provide(3)')()
+
+        self.assertEqual([3], provided)
+        self.assertEqual(1, len(built))
+        self.assertEqual(10, len(connections))
+        self.assertEqual(1, len(set(connections)))
+        self.assertEqual(6, connections[0][0])
+
+    def test_load_skips_the_test_when_a_call_skips(self):
+        calls = []
+
+        @genty
+        class SomeClass(object):
+            @genty_load(rate=1000, duration=0.05, workers=1)
+            def test_skipping(self):
+                calls.append(None)
+                raise SkipTest('not today')
+
+        with self.assertRaises(SkipTest):
+            SomeClass().test_skipping()
+
+        self.assertEqual(1, len(calls))
+        self.assertNotIn('{0}.SomeClass.test_skipping'.format(__name__), get_report('load'))
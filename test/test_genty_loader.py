@@ -0,0 +1,236 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import os
+import types
+import unittest
+from unittest import TestCase as _TestCase
+from mock import patch
+from genty import genty, genty_args, genty_dataprovider, genty_dataset, genty_lazy, genty_repeat
+from genty.genty_loader import GentyTestLoader, ORDER_ENV_VAR, genty_load_tests, get_registered_test_names, order_tests
+from test.test_case_base import TestCase
+
+
+def _build_test_classes():
+    # Built on demand, so that the test runner doesn't collect them.
+    @genty
+    class SomeTests(_TestCase):
+        @genty_dataset('fast', 'slow', 'broken')
+        def test_something(self, _):
+            pass
+
+        def test_plain(self):
+            pass
+
+    @genty
+    class OtherTests(_TestCase):
+        def test_other(self):
+            pass
+
+    return SomeTests, OtherTests
+
+
+def _something(value):
+    # The repr of the value, since Python 2 prefixes unicode strings with u.
+    return 'test_something({0!r})'.format(value)
+
+
+def _test_id(name, class_name='SomeTests'):
+    return '{0}.{1}.{2}'.format(__name__, class_name, name)
+
+
+DURATIONS = {
+    _test_id(_something('fast')): {'duration': 0.1, 'failed': False, 'runs': 1},
+    _test_id(_something('slow')): {'duration': 5.0, 'failed': False, 'runs': 1},
+    _test_id(_something('broken')): {'duration': 0.2, 'failed': True, 'runs': 1},
+    _test_id('test_other', 'OtherTests'): {'duration': 9.0, 'failed': False, 'runs': 1},
+}
+
+
+class GentyLoaderTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_loader`."""
+
+    def setUp(self):
+        super(GentyLoaderTest, self).setUp()
+        self._some_tests, self._other_tests = _build_test_classes()
+
+    def _load(self, *classes):
+        loader = GentyTestLoader(order='default')
+        tests = [loader.loadTestsFromTestCase(cls) for cls in classes]
+        return tests
+
+    @staticmethod
+    def _names(suite):
+        return [test._testMethodName for test in suite]   # pylint:disable=protected-access
+
+    def test_default_order_keeps_the_loader_order(self):
+        suite = order_tests(self._load(self._some_tests), 'default', DURATIONS)
+
+        self.assertEqual(get_registered_test_names(self._some_tests), self._names(suite))
+
+    def test_longest_order_runs_slowest_tests_first(self):
+        suite = order_tests(self._load(self._some_tests), 'longest', DURATIONS)
+
+        # test_plain has no history, so it counts as an average test.
+        self.assertEqual(
+            [_something('slow'), 'test_plain', _something('broken'), _something('fast')],
+            self._names(suite),
+        )
+
+    def test_failed_order_runs_failed_tests_first(self):
+        suite = order_tests(self._load(self._some_tests), 'failed', DURATIONS)
+
+        self.assertEqual(_something('broken'), self._names(suite)[0])
+
+    def test_tests_stay_grouped_by_class(self):
+        suite = order_tests(self._load(self._some_tests, self._other_tests), 'longest', DURATIONS)
+
+        self.assertEqual(
+            ['test_other', _something('slow'), 'test_plain', _something('broken'), _something('fast')],
+            self._names(suite),
+        )
+
+    def test_order_defaults_to_the_environment(self):
+        with patch.dict(os.environ, {ORDER_ENV_VAR: 'longest'}):
+            suite = order_tests(self._load(self._some_tests), durations=DURATIONS)
+
+        self.assertEqual(_something('slow'), self._names(suite)[0])
+
+    def test_unknown_order_is_rejected(self):
+        with self.assertRaises(ValueError):
+            order_tests([], 'random')
+
+    def _assert_grouped(self, suite, groups):
+        # The order of the groups follows the class dict, which is arbitrary
+        # on Python 2, so only check that each group runs back-to-back.
+        names = self._names(suite)
+        self.assertItemsEqual([name for group in groups for name in group], names)
+        for group in groups:
+            indexes = sorted(names.index(name) for name in group)
+            self.assertEqual(list(range(indexes[0], indexes[0] + len(group))), indexes)
+
+    def test_locality_order_runs_tests_sharing_a_dataset_back_to_back(self):
+        @genty_dataset(1, 2)
+        def build_input(value):
+            return value
+
+        @genty
+        class LocalTests(_TestCase):
+            @genty_dataprovider(build_input)
+            def test_parse(self, _):
+                pass
+
+            @genty_dataprovider(build_input)
+            def test_render(self, _):
+                pass
+
+            @genty_repeat(2)
+            @genty_dataset(1)
+            def test_repeated(self, _):
+                pass
+
+        suite = order_tests(self._load(LocalTests), 'locality')
+
+        self._assert_grouped(suite, [
+            ['test_parse_build_input(1)', 'test_render_build_input(1)'],
+            ['test_parse_build_input(2)', 'test_render_build_input(2)'],
+            ['test_repeated(1) iteration_1', 'test_repeated(1) iteration_2'],
+        ])
+
+    def test_locality_order_groups_datasets_by_content(self):
+        @genty
+        class LocalTests(_TestCase):
+            @genty_dataset(1, 2)
+            def test_parse(self, _):
+                pass
+
+            @genty_dataset(one=genty_args(1), two=(2,))
+            def test_render(self, _):
+                pass
+
+        suite = order_tests(self._load(LocalTests), 'locality')
+
+        self._assert_grouped(suite, [
+            ['test_parse(1)', 'test_render(one)'],
+            ['test_parse(2)', 'test_render(two)'],
+        ])
+
+    def test_locality_order_falls_back_to_names_for_lazy_datasets(self):
+        @genty
+        class LocalTests(_TestCase):
+            @genty_dataset(item=genty_lazy(list))
+            def test_parse(self, _):
+                pass
+
+            @genty_dataset(item=genty_lazy(list))
+            def test_render(self, _):
+                pass
+
+            def test_plain(self):
+                pass
+
+        suite = order_tests(self._load(LocalTests), 'locality')
+
+        self._assert_grouped(suite, [['test_parse(item)', 'test_render(item)'], ['test_plain']])
+
+    def test_loader_orders_tests_of_modules(self):
+        module = types.ModuleType(str('some_module'))
+        module.SomeTests = self._some_tests
+        loader = GentyTestLoader(order='longest', durations=DURATIONS)
+
+        suite = loader.loadTestsFromModule(module)
+
+        self.assertEqual(_something('slow'), self._names(suite)[0])
+
+    def test_load_tests_helper_orders_tests(self):
+        load_tests = genty_load_tests('failed', DURATIONS)
+
+        suite = load_tests(None, self._load(self._some_tests), None)
+
+        self.assertEqual(_something('broken'), self._names(suite)[0])
+
+    def test_genty_registers_generated_test_names_in_order(self):
+        self.assertItemsEqual(
+            [_something('fast'), _something('slow'), _something('broken'), 'test_plain'],
+            self._some_tests.genty_generated_tests,
+        )
+
+    def test_loader_reads_test_names_from_the_registry(self):
+        class SubTests(self._some_tests):   # pylint:disable=no-init
+            pass
+
+        loader = GentyTestLoader()
+        with patch.object(unittest.TestLoader, 'getTestCaseNames', side_effect=AssertionError):
+            names = loader.getTestCaseNames(SubTests)
+
+        self.assertEqual(get_registered_test_names(self._some_tests), names)
+
+    def test_loader_only_scans_classes_without_a_registry(self):
+        class SubTests(self._some_tests):   # pylint:disable=no-init
+            def test_extra(self):
+                pass
+
+        with patch.object(unittest.TestLoader, 'getTestCaseNames', side_effect=AssertionError):
+            names = GentyTestLoader().getTestCaseNames(SubTests)
+
+        self.assertEqual(['test_extra'] + get_registered_test_names(self._some_tests), names)
+
+    def test_loader_falls_back_to_the_stock_behavior_without_any_registry(self):
+        class PlainTests(_TestCase):
+            def test_b(self):
+                pass
+
+            def test_a(self):
+                pass
+
+        self.assertIsNone(get_registered_test_names(PlainTests))
+        self.assertEqual(['test_a', 'test_b'], GentyTestLoader().getTestCaseNames(PlainTests))
+
+    def test_loader_sorts_test_names_with_a_custom_order(self):
+        loader = GentyTestLoader()
+        loader.sortTestMethodsUsing = lambda first, second: (first > second) - (first < second)
+
+        self.assertEqual(
+            sorted(['test_plain', _something('broken'), _something('fast'), _something('slow')]),
+            loader.getTestCaseNames(self._some_tests),
+        )
@@ -0,0 +1,121 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+from mock import patch
+from genty import genty, genty_dataset
+from genty.genty_manifest import code_hash, is_changed, load_manifest, save_manifest
+from genty.genty_report import clear_reports, get_report
+from test.test_case_base import TestCase
+
+
+def _build_class(*datasets):
+    @genty
+    class SomeClass(object):
+        @genty_dataset(*datasets)
+        def test_double(self, value):
+            return value * 2
+
+        def test_plain(self):
+            return 'plain'
+
+    return SomeClass
+
+
+def _build_changed_class(*datasets):
+    @genty
+    class SomeClass(object):
+        @genty_dataset(*datasets)
+        def test_double(self, value):
+            return value + value
+
+        def test_plain(self):
+            return 'plain'
+
+    return SomeClass
+
+
+class GentyManifestTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_manifest`."""
+
+    def setUp(self):
+        super(GentyManifestTest, self).setUp()
+        clear_reports()
+        self.addCleanup(clear_reports)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self._path = os.path.join(directory, 'manifest.json')
+
+    def _save_baseline(self, *datasets):
+        with patch.dict(os.environ, {'GENTY_MANIFEST': self._path}):
+            _build_class(*datasets)
+        save_manifest(self._path)
+        clear_reports()
+
+    def test_manifest_records_hashes_of_generated_tests(self):
+        with patch.dict(os.environ, {'GENTY_MANIFEST': self._path}):
+            _build_class(1, 2)
+
+        manifest = get_report('manifest')
+        self.assertEqual(3, len(manifest))
+        entries = [entry for test_id, entry in manifest.items() if 'test_double' in test_id]
+        self.assertNotEqual(entries[0]['dataset_hash'], entries[1]['dataset_hash'])
+        self.assertEqual(entries[0]['code_hash'], entries[1]['code_hash'])
+
+    def test_manifest_is_only_recorded_when_enabled(self):
+        with patch.dict(os.environ, {'GENTY_MANIFEST': '', 'GENTY_ONLY_CHANGED': ''}):
+            _build_class(1, 2)
+
+        self.assertEqual({}, get_report('manifest'))
+
+    def test_save_manifest_merges_into_the_file(self):
+        self._save_baseline(1)
+        self._save_baseline(2)
+
+        self.assertEqual(3, len(load_manifest(self._path)))
+
+    def test_only_changed_generates_new_datasets(self):
+        self._save_baseline(1, 2)
+
+        with patch.dict(os.environ, {'GENTY_ONLY_CHANGED': self._path}):
+            some_class = _build_class(1, 2, 3)
+
+        self.assertEqual(['test_double(3)'], list(some_class.genty_generated_tests))
+        self.assertFalse(hasattr(some_class, 'test_plain'))
+        self.assertFalse(hasattr(some_class, 'test_double'))
+
+    def test_only_changed_generates_tests_whose_code_changed(self):
+        self._save_baseline(1, 2)
+
+        with patch.dict(os.environ, {'GENTY_ONLY_CHANGED': self._path}):
+            some_class = _build_changed_class(1, 2)
+
+        self.assertEqual(['test_double(1)', 'test_double(2)'], sorted(some_class.genty_generated_tests))
+
+    def test_only_changed_generates_everything_without_a_baseline(self):
+        with patch.dict(os.environ, {'GENTY_ONLY_CHANGED': self._path}):
+            some_class = _build_class(1, 2)
+
+        self.assertEqual(3, len(some_class.genty_generated_tests))
+
+    def test_code_hash_ignores_decorators(self):
+        def build(*datasets):
+            @genty_dataset(*datasets)
+            def test_double(value):
+                return value * 2
+            return test_double
+
+        def test_double(value):
+            return value + value
+
+        self.assertEqual(code_hash([build(1)]), code_hash([build(1, 2)]))
+        self.assertNotEqual(code_hash([build(1)]), code_hash([test_double]))
+
+    def test_unhashable_datasets_always_count_as_changed(self):
+        entry = {'dataset_hash': None, 'code_hash': 'abc'}
+
+        self.assertTrue(is_changed(dict(entry), entry))
+        self.assertFalse(is_changed({'dataset_hash': 'a', 'code_hash': 'b'}, {'dataset_hash': 'a', 'code_hash': 'b'}))
+        self.assertTrue(is_changed(None, {'dataset_hash': 'a', 'code_hash': 'b'}))
@@ -39,3 +39,56 @@ def some_func():
             pass
 
         self.assertEqual(0, some_func.genty_repeat_count)   # pylint:disable=no-member
+
+    def test_repeat_until_failure_does_not_unroll_iterations(self):
+        @genty_repeat(until_failure=True, max_count=10000, time_budget=30)
+        def some_func():
+            pass
+
+        self.assertEqual(0, some_func.genty_repeat_count)   # pylint:disable=no-member
+        self.assertEqual((10000, 30), some_func.genty_repeat_until_failure)   # pylint:disable=no-member
+
+    def test_repeat_until_failure_defaults_max_count_to_count(self):
+        @genty_repeat(50, until_failure=True)
+        def some_func():
+            pass
+
+        self.assertEqual((50, None), some_func.genty_repeat_until_failure)   # pylint:disable=no-member
+
+    def test_repeat_until_failure_requires_a_limit(self):
+        with self.assertRaises(ValueError) as context:
+            genty_repeat(until_failure=True)
+
+        self.assertIn('needs a max_count or a time_budget', str(context.exception))
+
+    def test_repeat_rejects_limits_without_until_failure(self):
+        with self.assertRaises(ValueError):
+            genty_repeat(10, time_budget=5)
+
+    def test_repeat_leak_check_does_not_unroll_iterations(self):
+        @genty_repeat(20, leak_check=True, leak_threshold=512)
+        def some_func():
+            pass
+
+        self.assertEqual(0, some_func.genty_repeat_count)   # pylint:disable=no-member
+        self.assertEqual((20, 512), some_func.genty_repeat_leak_check)   # pylint:disable=no-member
+
+    def test_repeat_leak_check_needs_a_few_iterations(self):
+        with self.assertRaises(ValueError):
+            genty_repeat(2, leak_check=True)
+
+    def test_repeat_concurrency_does_not_unroll_iterations(self):
+        @genty_repeat(100, concurrency=8)
+        def some_func():
+            pass
+
+        self.assertEqual(0, some_func.genty_repeat_count)   # pylint:disable=no-member
+        self.assertEqual((100, 8, False), some_func.genty_repeat_concurrency)   # pylint:disable=no-member
+
+    def test_repeat_rejects_combined_modes(self):
+        with self.assertRaises(ValueError):
+            genty_repeat(10, leak_check=True, concurrency=2)
+
+    def test_repeat_processes_need_a_concurrency(self):
+        with self.assertRaises(ValueError):
+            genty_repeat(10, processes=True)
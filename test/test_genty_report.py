@@ -0,0 +1,43 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import io
+import json
+import os
+import shutil
+import tempfile
+from genty.genty_report import clear_reports, get_report, record, write_reports
+from test.test_case_base import TestCase
+
+
+class GentyReportTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_report`."""
+
+    def setUp(self):
+        super(GentyReportTest, self).setUp()
+        clear_reports()
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+        clear_reports()
+        super(GentyReportTest, self).tearDown()
+
+    def test_later_entries_replace_earlier_ones(self):
+        record('some_kind', 'test_id', {'value': 1})
+        record('some_kind', 'test_id', {'value': 2})
+
+        self.assertEqual({'test_id': {'value': 2}}, get_report('some_kind'))
+
+    def test_unknown_kind_has_an_empty_report(self):
+        self.assertEqual({}, get_report('unknown'))
+
+    def test_write_reports_writes_one_file_per_kind(self):
+        record('first', 'test_a', {'value': 1})
+        record('second', 'test_b', {'value': 2})
+
+        paths = write_reports(os.path.join(self._directory, 'nested'))
+
+        self.assertEqual(2, len(paths))
+        with io.open(paths[0], encoding='utf-8') as report_file:
+            self.assertEqual({'test_a': {'value': 1}}, json.load(report_file))
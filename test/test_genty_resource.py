@@ -0,0 +1,259 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+from multiprocessing.pool import ThreadPool
+import os
+import threading
+import time
+from mock import patch
+from genty import genty, genty_dataprovider, genty_dataset, genty_resource
+from genty.genty_resource import GentyResourcePool, ResourceTimeoutError, close_resource_pools, get_resource_pool
+from test.test_case_base import TestCase
+
+
+class GentyResourceTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_resource`."""
+
+    def setUp(self):
+        super(GentyResourceTest, self).setUp()
+        close_resource_pools()
+        self.addCleanup(close_resource_pools)
+
+    def test_resource_rejects_unknown_scopes(self):
+        with self.assertRaises(ValueError):
+            genty_resource('connection', object, scope='module')
+
+    def test_pool_reuses_returned_resources(self):
+        pool = GentyResourcePool(object, size=2)
+        first = pool.checkout()
+        second = pool.checkout()
+        pool.checkin(first)
+
+        self.assertIsNot(first, second)
+        self.assertIs(first, pool.checkout())
+
+    def test_pool_waits_for_a_resource_when_full(self):
+        pool = GentyResourcePool(object, size=1)
+        resource = pool.checkout()
+        timer = threading.Timer(0.05, pool.checkin, [resource])
+        timer.start()
+
+        start = time.time()
+        self.assertIs(resource, pool.checkout())
+        self.assertGreaterEqual(time.time() - start, 0.04)
+        timer.join()
+
+    def test_pool_times_out_waiting_for_a_resource(self):
+        pool = GentyResourcePool(object, size=1, timeout=0.01)
+        pool.checkout()
+
+        with self.assertRaises(ResourceTimeoutError) as context:
+            pool.checkout()
+        self.assertIn('pool_size', str(context.exception))
+
+    def test_pool_discards_resources_rejected_after_an_error(self):
+        torn_down = []
+        pool = GentyResourcePool(object, size=1, teardown=torn_down.append, validate=lambda _: False)
+        first = pool.checkout()
+        pool.checkin(first)
+        self.assertIs(first, pool.checkout())
+
+        pool.checkin(first, errored=True)
+        second = pool.checkout()
+
+        self.assertIsNot(first, second)
+        self.assertEqual([first], torn_down)
+
+    def test_pool_close_tears_down_resources(self):
+        torn_down = []
+        pool = GentyResourcePool(object, size=2, teardown=torn_down.append)
+        first = pool.checkout()
+        second = pool.checkout()
+        pool.checkin(first)
+
+        pool.close()
+
+        self.assertEqual([first, second], torn_down)
+
+    def test_resource_is_shared_by_generated_tests(self):
+        built = []
+        received = []
+
+        def connect():
+            built.append(object())
+            return built[-1]
+
+        @genty
+        class SomeClass(object):
+            @genty_resource('connection', connect)
+            @genty_dataset(1, 2, 3)
+            def test_query(self, value, connection):
+                received.append((value, connection))
+
+        instance = SomeClass()
+        for name in SomeClass.genty_generated_tests:  # pylint:disable=no-member
+            getattr(instance, name)()
+
+        self.assertEqual(1, len(built))
+        self.assertEqual([(1, built[0]), (2, built[0]), (3, built[0])], received)
+        self.assertIsNotNone(get_resource_pool('connection'))
+
+    def test_resource_is_passed_with_dataprovider_output(self):
+        received = []
+
+        @genty_dataset(5)
+        def provider(_, value):
+            return value * 2
+
+        @genty
+        class SomeClass(object):
+            @genty_resource('session', lambda: 'session')
+            @genty_dataprovider(provider)
+            def test_request(self, value, session):
+                received.append((value, session))
+
+        getattr(SomeClass(), 'test_request_provider(5)')()
+
+        self.assertEqual([(10, 'session')], received)
+
+    def test_resource_is_returned_when_the_test_fails(self):
+        @genty
+        class SomeClass(object):
+            @genty_resource('connection', object, pool_size=1)
+            def test_failing(self, connection):
+                raise AssertionError(connection)
+
+        with self.assertRaises(AssertionError) as first:
+            SomeClass().test_failing()
+        with self.assertRaises(AssertionError) as second:
+            SomeClass().test_failing()
+
+        self.assertIs(first.exception.args[0], second.exception.args[0])
+
+    def test_resource_of_an_errored_test_is_validated(self):
+        @genty
+        class SomeClass(object):
+            @genty_resource('connection', object, validate=lambda _: False)
+            def test_erroring(self, connection):
+                raise ValueError(connection)
+
+        with self.assertRaises(ValueError) as first:
+            SomeClass().test_erroring()
+        with self.assertRaises(ValueError) as second:
+            SomeClass().test_erroring()
+
+        self.assertIsNot(first.exception.args[0], second.exception.args[0])
+
+    def test_nested_checkouts_from_a_full_pool_time_out(self):
+        @genty
+        class SomeClass(object):
+            @genty_resource('connection', object, checkout_timeout=0.01)
+            def test_outer(self, connection):
+                return connection
+
+            @genty_resource('connection', object, checkout_timeout=0.01)
+            def test_nested(self, connection):  # pylint:disable=unused-argument
+                return self.test_outer()
+
+        with self.assertRaises(ResourceTimeoutError):
+            SomeClass().test_nested()
+
+    def test_resources_of_the_same_name_need_the_same_factory(self):
+        @genty
+        class SomeClass(object):
+            @genty_resource('connection', object)
+            def test_object(self, connection):
+                return connection
+
+            @genty_resource('connection', dict)
+            def test_dict(self, connection):
+                return connection
+
+        SomeClass().test_object()
+        with self.assertRaises(ValueError):
+            SomeClass().test_dict()
+
+    def test_resources_of_the_same_name_need_the_same_pool_settings(self):
+        @genty
+        class SomeClass(object):
+            @genty_resource('connection', object, pool_size=2)
+            def test_two(self, connection):
+                return connection
+
+            @genty_resource('connection', object, pool_size=3)
+            def test_three(self, connection):
+                return connection
+
+            @genty_resource('connection', object, pool_size=2, teardown=id)
+            def test_torn_down(self, connection):
+                return connection
+
+        SomeClass().test_two()
+        with self.assertRaises(ValueError):
+            SomeClass().test_three()
+        with self.assertRaises(ValueError):
+            SomeClass().test_torn_down()
+
+    def test_forked_processes_build_their_own_resources(self):
+        @genty
+        class SomeClass(object):
+            @genty_resource('connection', object)
+            def test_query(self, connection):
+                return connection
+
+        parent_connection = SomeClass().test_query()
+        with patch.object(os, 'getpid', return_value=os.getpid() + 1):
+            self.assertIsNone(get_resource_pool('connection'))
+            child_connection = SomeClass().test_query()
+            close_resource_pools()
+
+        self.assertIsNot(parent_connection, child_connection)
+        self.assertIs(parent_connection, SomeClass().test_query())
+
+    def test_pool_size_bounds_concurrent_tests(self):
+        in_use = []
+        max_in_use = []
+        lock = threading.Lock()
+
+        @genty
+        class SomeClass(object):
+            @genty_resource('connection', object, pool_size=2)
+            @genty_dataset(*range(6))
+            def test_query(self, value, connection):  # pylint:disable=unused-argument
+                with lock:
+                    in_use.append(connection)
+                    max_in_use.append(len(in_use))
+                time.sleep(0.01)
+                with lock:
+                    in_use.remove(connection)
+
+        instance = SomeClass()
+        pool = ThreadPool(6)
+        try:
+            pool.map(
+                lambda name: getattr(instance, name)(),
+                SomeClass.genty_generated_tests,  # pylint:disable=no-member
+            )
+        finally:
+            pool.close()
+            pool.join()
+
+        self.assertEqual(2, max(max_in_use))
+
+    def test_test_scoped_resource_is_torn_down_after_each_call(self):
+        torn_down = []
+
+        @genty
+        class SomeClass(object):
+            @genty_resource('directory', object, scope='test', teardown=torn_down.append)
+            @genty_dataset(1, 2)
+            def test_files(self, value, directory):  # pylint:disable=unused-argument
+                self.assertNotIn(directory, torn_down)
+
+        instance = SomeClass()
+        instance.assertNotIn = self.assertNotIn
+        for name in SomeClass.genty_generated_tests:  # pylint:disable=no-member
+            getattr(instance, name)()
+
+        self.assertEqual(2, len(torn_down))
+        self.assertIsNone(get_resource_pool('directory'))
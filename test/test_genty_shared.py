@@ -0,0 +1,143 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+from unittest import skipIf, skipUnless
+from genty import genty, genty_args, genty_dataprovider, genty_dataset, genty_shared
+from genty.genty_shared import GentyShared
+from test.test_case_base import TestCase
+
+try:
+    import numpy  # pylint:disable=import-error
+except ImportError:
+    numpy = None
+
+# Shared values need Python 3 memoryviews.
+SHARED_VALUES_SUPPORTED = hasattr(memoryview, 'cast')
+
+
+def _read_in_forked_process(shared):
+    # Runs in a forked process, which inherits the shared buffer.
+    return bytes(shared.resolve()[:5])
+
+
+@skipIf(SHARED_VALUES_SUPPORTED, 'shared values are supported')
+class GentySharedUnsupportedTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_shared` on Python 2."""
+
+    def test_shared_raises_a_clear_error(self):
+        with self.assertRaises(ValueError):
+            genty_shared(b'some payload')
+
+
+@skipUnless(SHARED_VALUES_SUPPORTED, 'shared values need Python 3')
+class GentySharedTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_shared`."""
+
+    def test_shared_resolves_to_a_read_only_view(self):
+        shared = genty_shared(b'some payload')
+
+        view = shared.resolve()
+
+        self.assertIsInstance(shared, GentyShared)
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(b'some payload', view.tobytes())
+        self.assertTrue(view.readonly)
+
+    def test_shared_is_named_after_its_label_or_size(self):
+        self.assertEqual('shared(3 bytes)', str(genty_shared(b'abc')))
+        self.assertEqual('blob', str(genty_shared(b'abc', 'blob')))
+
+    def test_shared_pickles_without_its_content(self):
+        payload = b'x' * 100000
+        shared = genty_shared(payload)
+
+        pickled = pickle.dumps(shared)
+        unpickled = pickle.loads(pickled)
+
+        self.assertLess(len(pickled), 1000)
+        self.assertEqual(payload, unpickled.resolve().tobytes())
+
+    @skipUnless(hasattr(os, 'fork'), 'os.fork is not available')
+    def test_forked_processes_read_the_shared_buffer(self):
+        shared = genty_shared(b'hello world')
+        context = multiprocessing.get_context('fork')
+        pool = context.Pool(2)
+        try:
+            self.assertEqual([b'hello'] * 2, pool.map(_read_in_forked_process, [shared] * 2))
+        finally:
+            pool.close()
+            pool.join()
+
+    def test_shared_buffer_outlives_other_processes_reading_it(self):
+        shared = genty_shared(b'hello world')
+        script = (
+            'import pickle, sys\n'
+            'shared = pickle.loads(sys.stdin.buffer.read() if hasattr(sys.stdin, "buffer") else sys.stdin.read())\n'
+            'assert shared.resolve().tobytes() == b"hello world"\n'
+        )
+        process = subprocess.Popen([sys.executable, '-c', script], stdin=subprocess.PIPE)
+        process.communicate(pickle.dumps(shared))
+
+        unpickled = pickle.loads(pickle.dumps(shared))
+        self.assertEqual(0, process.returncode)
+        self.assertEqual(b'hello world', unpickled.resolve().tobytes())
+
+    def test_shared_copies_non_contiguous_buffers(self):
+        data = memoryview(b'abcdefgh')[::2]
+
+        shared = genty_shared(data)
+
+        self.assertEqual(b'aceg', shared.resolve().tobytes())
+
+    @skipUnless(numpy is not None, 'numpy is not installed')
+    def test_shared_numpy_array_resolves_to_a_numpy_view(self):
+        array = numpy.arange(12, dtype='int32').reshape(3, 4)
+
+        view = genty_shared(array).resolve()
+
+        self.assertEqual((3, 4), view.shape)
+        self.assertEqual(array.dtype, view.dtype)
+        self.assertTrue((array == view).all())
+        self.assertFalse(view.flags.writeable)
+
+    def test_generated_tests_receive_views_of_shared_values(self):
+        received = []
+
+        @genty
+        class SomeClass(object):
+            @genty_dataset(
+                genty_shared(b'first', 'first'),
+                keyword=genty_args(1, payload=genty_shared(b'second')),
+            )
+            def test_payload(self, *args, **kwargs):
+                received.append((args, kwargs))
+
+        instance = SomeClass()
+        getattr(instance, 'test_payload(first)')()
+        getattr(instance, 'test_payload(keyword)')()
+
+        (args, _), (_, kwargs) = received
+        self.assertEqual(b'first', args[0].tobytes())
+        self.assertEqual(b'second', kwargs['payload'].tobytes())
+
+    def test_dataproviders_receive_views_of_shared_values(self):
+        received = []
+
+        @genty_dataset(genty_shared(b'payload', 'payload'))
+        def provider(_, payload):
+            return payload.tobytes().upper()
+
+        @genty
+        class SomeClass(object):
+            @genty_dataprovider(provider)
+            def test_payload(self, payload):
+                received.append(payload)
+
+        getattr(SomeClass(), 'test_payload_provider(payload)')()
+
+        self.assertEqual([b'PAYLOAD'], received)
@@ -0,0 +1,282 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import os
+import threading
+import time
+import unittest
+import warnings
+from mock import patch
+from genty import genty, genty_dataprovider, genty_dataset, genty_isolated, genty_threadsafe
+from genty.genty_loader import GentyTestLoader, get_registered_test_names
+from genty.genty_report import clear_reports, get_report, record
+from test.test_case_base import TestCase
+
+
+def _build_test_class(barrier_size):
+    # Built on demand, so that the test runner doesn't collect it.
+    started = []
+    lock = threading.Lock()
+    all_started = threading.Event()
+
+    @genty
+    class SomeTests(unittest.TestCase):
+        threads = set()
+        set_up_classes = []
+
+        @classmethod
+        def setUpClass(cls):
+            cls.set_up_classes.append(cls)
+
+        @genty_threadsafe(max_workers=barrier_size)
+        @genty_dataset(*range(barrier_size))
+        def test_concurrent(self, value):
+            with lock:
+                started.append(value)
+                if len(started) == barrier_size:
+                    all_started.set()
+            # Only returns promptly if all the tests run at the same time.
+            self.assertTrue(all_started.wait(5))
+            self.threads.add(threading.current_thread().name)
+            self.assertNotEqual(2, value)
+
+        def test_serial(self):
+            pass
+
+    return SomeTests
+
+
+def _build_prefetch_test_class():
+    # Built on demand, so that the test runner doesn't collect it.
+    provider_threads = []
+
+    @genty_dataset(1, 2, 3)
+    def provider(_, value):
+        provider_threads.append(threading.current_thread())
+        return value
+
+    @genty
+    class SomeTests(unittest.TestCase):
+        threads = provider_threads
+        received = []
+
+        @genty_dataprovider(provider, prefetch=True)
+        def test_prefetched(self, value):
+            self.received.append(value)
+
+        @unittest.skip('skipped')
+        @genty_dataprovider(provider, prefetch=True)
+        def test_skipped(self, value):
+            self.received.append(value)
+
+    return SomeTests
+
+
+_GLOBAL_STATE = []
+
+
+def _build_isolated_test_class(batch_size):
+    # Built on demand, so that the test runner doesn't collect it.
+    @genty
+    class SomeTests(unittest.TestCase):
+        set_up_pids = []
+
+        @classmethod
+        def setUpClass(cls):
+            cls.set_up_pids.append(os.getpid())
+            cls.warm_fixture = 'warm'
+
+        @genty_isolated(batch_size=batch_size, max_workers=2)
+        @genty_dataset(*range(4))
+        def test_isolated(self, value):
+            self.assertEqual('warm', self.warm_fixture)
+            self.assertNotEqual(os.getpid(), self.set_up_pids[0])
+            _GLOBAL_STATE.append(value)
+            self.assertEqual(value % batch_size + 1, len(_GLOBAL_STATE))
+            self.assertNotEqual(2, value, 'two')
+
+        @genty_isolated()
+        @genty_dataset('crash')
+        def test_crash(self, _):
+            os._exit(3)  # pylint:disable=protected-access
+
+    return SomeTests
+
+
+def _build_isolated_recording_test_class():
+    # Built on demand, so that the test runner doesn't collect it.
+    @genty
+    class SomeTests(unittest.TestCase):
+        @genty_isolated(batch_size=2)
+        @genty_dataset(*range(3))
+        def test_record(self, value):
+            record('isolated', self.id(), {'pid': os.getpid(), 'value': value})
+
+    return SomeTests
+
+
+class _OrderedResult(unittest.TestResult):
+    def __init__(self):
+        super(_OrderedResult, self).__init__()
+        self.started = []
+
+    def startTest(self, test):
+        super(_OrderedResult, self).startTest(test)
+        self.started.append(test._testMethodName)  # pylint:disable=protected-access
+
+
+class GentySuiteTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_suite`."""
+
+    def test_threadsafe_decorator_stores_max_workers(self):
+        @genty_threadsafe(max_workers=3)
+        def some_func():
+            pass
+
+        self.assertEqual(3, some_func.genty_threadsafe)  # pylint:disable=no-member
+
+    def test_threadsafe_decorator_rejects_non_positive_max_workers(self):
+        with self.assertRaises(ValueError):
+            genty_threadsafe(max_workers=0)
+
+    def test_suite_runs_threadsafe_tests_concurrently_and_reports_in_order(self):
+        test_class = _build_test_class(4)
+        suite = GentyTestLoader().loadTestsFromTestCase(test_class)
+        result = _OrderedResult()
+
+        start = time.time()
+        suite.run(result)
+
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(5, result.testsRun)
+        # The registry follows the class dict, whose order is arbitrary on Python 2.
+        self.assertEqual(get_registered_test_names(test_class), result.started)
+        self.assertEqual(1, len(result.failures))
+        self.assertEqual('test_concurrent(2)', result.failures[0][0]._testMethodName)  # pylint:disable=protected-access
+        self.assertEqual(4, len(test_class.threads))
+        self.assertEqual([test_class], test_class.set_up_classes)
+
+    def test_suite_stops_running_concurrent_tests_when_the_result_says_so(self):
+        @genty
+        class SomeTests(unittest.TestCase):
+            @genty_threadsafe(max_workers=2)
+            @genty_dataset(*range(6))
+            def test_concurrent(self, value):
+                self.assertGreater(value, 1)
+
+        suite = GentyTestLoader().loadTestsFromTestCase(SomeTests)
+        result = unittest.TestResult()
+        result.failfast = True
+
+        suite.run(result)
+
+        self.assertEqual(2, result.testsRun)
+        self.assertTrue(result.shouldStop)
+
+    def test_stand_ins_for_batches_do_not_pose_as_tests(self):
+        test_class = _build_test_class(2)
+        suite = GentyTestLoader().loadTestsFromTestCase(test_class)
+        result = unittest.TestResult()
+        stand_ins = []
+
+        def run_stand_in(stand_in, _):
+            stand_ins.append(stand_in)
+
+        with patch('genty.genty_suite._ConcurrentTests.__call__', autospec=True, side_effect=run_stand_in):
+            suite.run(result)
+
+        self.assertEqual(1, len(stand_ins))
+        self.assertNotIsInstance(stand_ins[0], test_class)
+        self.assertEqual([test_class], test_class.set_up_classes)
+
+    def test_suite_prefetches_dataproviders_in_background_threads(self):
+        test_class = _build_prefetch_test_class()
+        suite = GentyTestLoader().loadTestsFromTestCase(test_class)
+        tests = list(suite)
+        result = unittest.TestResult()
+
+        with patch.dict(os.environ, {'GENTY_PREFETCH': '2'}):
+            suite.run(result)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(3, len(result.skipped))
+        self.assertEqual([1, 2, 3], sorted(test_class.received))
+        # The dataprovider ran once per test that wasn't skipped, off the main thread.
+        self.assertEqual(3, len(test_class.threads))
+        self.assertNotIn(threading.current_thread(), test_class.threads)
+        for test in tests:
+            self.assertNotIn('genty_prefetched', vars(test))
+
+    def test_suite_calls_dataproviders_inline_without_prefetch(self):
+        test_class = _build_prefetch_test_class()
+        suite = GentyTestLoader().loadTestsFromTestCase(test_class)
+        result = unittest.TestResult()
+
+        with patch.dict(os.environ, {'GENTY_PREFETCH': ''}):
+            suite.run(result)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual([threading.current_thread()] * 3, test_class.threads)
+
+    def test_suite_does_not_prefetch_with_an_invalid_number_of_threads(self):
+        test_class = _build_prefetch_test_class()
+        suite = GentyTestLoader().loadTestsFromTestCase(test_class)
+        result = unittest.TestResult()
+
+        with patch.dict(os.environ, {'GENTY_PREFETCH': 'true'}), warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            suite.run(result)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual([threading.current_thread()] * 3, test_class.threads)
+        self.assertIn('GENTY_PREFETCH', str(caught[0].message))
+
+    def test_suite_prefetches_around_concurrent_tests_and_counts_them(self):
+        test_class = _build_test_class(2)
+        suite = GentyTestLoader().loadTestsFromTestCase(test_class)
+        result = unittest.TestResult()
+
+        with patch.dict(os.environ, {'GENTY_PREFETCH': '2'}):
+            suite.run(result)
+
+        self.assertEqual(3, result.testsRun)
+        self.assertEqual(3, suite.countTestCases())
+
+    def test_isolated_decorator_rejects_non_positive_batch_sizes(self):
+        with self.assertRaises(ValueError):
+            genty_isolated(batch_size=0)
+
+    def test_suite_runs_isolated_tests_in_forked_processes(self):
+        if not hasattr(os, 'fork'):
+            self.skipTest('os.fork is not available')
+        for batch_size in (1, 2):
+            test_class = _build_isolated_test_class(batch_size)
+            suite = GentyTestLoader().loadTestsFromTestCase(test_class)
+            result = _OrderedResult()
+
+            suite.run(result)
+
+            self.assertEqual(5, result.testsRun)
+            self.assertEqual(get_registered_test_names(test_class), result.started)
+            self.assertEqual([os.getpid()], test_class.set_up_pids)
+            self.assertEqual([], _GLOBAL_STATE)
+            self.assertEqual(1, len(result.failures))
+            failed_test, failure = result.failures[0]
+            self.assertEqual('test_isolated(2)', failed_test._testMethodName)  # pylint:disable=protected-access
+            self.assertIn('AssertionError', failure)
+            self.assertIn('two', failure)
+            self.assertEqual(1, len(result.errors))
+            self.assertIn('exited with code 3', result.errors[0][1])
+
+    def test_report_entries_of_isolated_tests_are_sent_back(self):
+        if not hasattr(os, 'fork'):
+            self.skipTest('os.fork is not available')
+        clear_reports()
+        self.addCleanup(clear_reports)
+        suite = GentyTestLoader().loadTestsFromTestCase(_build_isolated_recording_test_class())
+
+        suite.run(unittest.TestResult())
+
+        entries = list(get_report('isolated').values())
+        self.assertEqual([0, 1, 2], sorted(entry['value'] for entry in entries))
+        self.assertNotIn(os.getpid(), [entry['pid'] for entry in entries])
@@ -0,0 +1,88 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+import os
+from mock import patch
+from genty import genty, genty_args, genty_dataset, genty_tags
+from genty.genty_tags import parse_tag_expression
+from test.test_case_base import TestCase
+
+
+class GentyTagsTest(TestCase):
+    """Tests for :mod:`box.test.genty.genty_tags`."""
+
+    def _build_class(self, expression):
+        class SomeClass(object):
+            @genty_tags('network')
+            @genty_dataset(
+                fast=genty_args('example.com'),
+                slow=genty_args('example.org', _tags={'slow'}),
+            )
+            def test_resolve(self, host):
+                return host
+
+            @genty_dataset(
+                fast=(1,),
+                slow=genty_args(2, _tags='slow'),
+            )
+            def test_sort(self, size):
+                return size
+
+            @genty_tags('slow')
+            def test_plain(self):
+                return 'plain'
+
+        with patch.dict(os.environ, {'GENTY_TAGS': expression}):
+            return genty(SomeClass)
+
+    def test_parse_tag_expression_evaluates_boolean_expressions(self):
+        matches = parse_tag_expression('(network or db) and not slow')
+
+        self.assertTrue(matches({'network'}))
+        self.assertTrue(matches({'db', 'fast'}))
+        self.assertFalse(matches({'network', 'slow'}))
+        self.assertFalse(matches(set()))
+
+    def test_parse_tag_expression_gives_and_precedence_over_or(self):
+        matches = parse_tag_expression('a or b and c')
+
+        self.assertTrue(matches({'a'}))
+        self.assertFalse(matches({'b'}))
+        self.assertTrue(matches({'b', 'c'}))
+
+    def test_parse_tag_expression_rejects_invalid_expressions(self):
+        for expression in ('', 'a and', '(a or b', 'a b', 'not', 'a )'):
+            with self.assertRaises(ValueError):
+                parse_tag_expression(expression)
+
+    def test_tags_do_not_filter_when_no_expression_is_set(self):
+        some_class = self._build_class('')
+
+        self.assertEqual(5, len(some_class.genty_generated_tests))
+        self.assertTrue(hasattr(some_class, 'test_plain'))
+
+    def test_tags_exclude_datasets_before_generating_them(self):
+        some_class = self._build_class('not slow')
+
+        self.assertEqual(
+            ["test_resolve(fast)", "test_sort(fast)"],
+            sorted(some_class.genty_generated_tests),
+        )
+        self.assertEqual('example.com', getattr(some_class(), 'test_resolve(fast)')())
+        self.assertFalse(hasattr(some_class, "test_resolve(slow)"))
+        self.assertFalse(hasattr(some_class, 'test_plain'))
+
+    def test_tags_combine_method_and_dataset_tags(self):
+        some_class = self._build_class('network and slow')
+
+        self.assertEqual(["test_resolve(slow)"], list(some_class.genty_generated_tests))
+
+    def test_tags_remove_methods_whose_datasets_are_all_excluded(self):
+        some_class = self._build_class('network')
+
+        self.assertEqual(
+            ["test_resolve(fast)", "test_resolve(slow)"],
+            sorted(some_class.genty_generated_tests),
+        )
+        self.assertFalse(hasattr(some_class, 'test_sort'))
+        self.assertFalse(hasattr(some_class, 'test_plain'))